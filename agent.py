@@ -6,11 +6,27 @@ Draft 'n' Pray - Write. Send. Hope. Repeat. (Now with AI)
 import os
 import sys
 from pathlib import Path
-from langgraph.prebuilt import create_react_agent
+from agent_graph import build_agent
 from langgraph.checkpoint.memory import InMemorySaver
 from system_prompt import system_prompt
-from model import get_model
-from tools import TOOLS, initialize_vectorstore_with_cv
+from model import get_model, get_router, CHAT_MODEL, CHAT_TEMPERATURE
+from tools import TOOLS, initialize_vectorstore_with_cv, get_cv_index_hash
+from crawler import find_urls, get_crawler
+from profile_store import has_fresh_profile
+from tracing import span, span_tree, tracer
+from usage import usage_ledger
+from resilience import breaker_stats, call_stats
+from profiling import profile_run
+from pipeline import FAST_PATH_TOOLS, build_fast_path
+from variants import build_variant_drafter
+from ranking import RANK_SHORTLIST_SIZE, rank_labs
+from response_cache import (
+    TurnCache,
+    cache_stats,
+    remember_exchange,
+    replay,
+    tools_used_in_turn,
+)
 import colorama
 from rich.console import Console
 from rich.panel import Panel
@@ -20,6 +36,7 @@ from rich.prompt import Prompt, Confirm
 from rich.table import Table
 from rich.align import Align
 from rich.markdown import Markdown
+from rich.live import Live
 import typer
 import uuid
 import getpass
@@ -43,15 +60,25 @@ app = typer.Typer(
 )
 
 checkpointer = InMemorySaver()
-config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+# The session id in the run metadata is picked up by the usage ledger
+config = {
+    "configurable": {"thread_id": str(uuid.uuid4())},
+    "metadata": {"session_id": str(uuid.uuid4())},
+}
 
 
 class AgentCLI:
     def __init__(self):
         self.agent = None
+        self.fast_path = None
+        self.variants = None
         self.cv_loaded = False
         self.cv_path = None
         self.api_keys = {}
+        # Plain-text transcript, used to key the response cache
+        self.history = []
+        # URLs shortlisted by the last lab ranking
+        self.shortlist = []
 
     def print_banner(self):
         banner_text = """
@@ -254,12 +281,15 @@ class AgentCLI:
                 tools = create_tools_with_api_keys(google_api_key, firecrawl_api_key)
 
                 llm = get_model(api_key=google_api_key)
-                self.agent = create_react_agent(
+                self.agent = build_agent(
                     model=llm,
                     tools=tools,
                     prompt=system_prompt,
                     checkpointer=checkpointer,
+                    router=get_router(google_api_key),
                 )
+                self.fast_path = build_fast_path(llm, firecrawl_api_key)
+                self.variants = build_variant_drafter(llm, firecrawl_api_key)
             console.print("✅ AI Agent initialized successfully", style="green")
             return True
         except Exception as e:
@@ -321,7 +351,17 @@ class AgentCLI:
                 "Search your CV for relevant information",
                 "Ask about your skills, experience, etc.",
             ),
+            (
+                "lookup_professor",
+                "Look up a stored professor profile before crawling",
+                "Provide the professor's URL",
+            ),
             ("crawl_website", "Crawl websites for content", "Provide a URL to crawl"),
+            (
+                "fit_score",
+                "Score your fit with a professor from your CV",
+                "Provide the professor's URL",
+            ),
             (
                 "initialize_vectorstore_with_cv",
                 "Re-initialize CV knowledge base",
@@ -343,11 +383,19 @@ class AgentCLI:
 • [green]tools[/green] - Show available tools
 • [green]cv[/green] - Show CV status
 • [green]apikeys[/green] - Show API key status
+• [green]cache[/green] - Show response cache hit rates
+• [green]stats[/green] - Show where the last turns spent their time
+• [green]usage[/green] - Show token usage and cost per turn and per tool
+• [green]usage export <file.csv>[/green] - Export this session's token usage to CSV
+• [green]health[/green] - Show model call latencies, retries and backend circuit breakers
+• [green]rank <file or URLs>[/green] - Rank labs by fit with your CV (no chat model calls)
+• [green]draft shortlist[/green] - Write an email to each lab shortlisted by the last ranking
 • [green]quit[/green], [green]exit[/green], [green]bye[/green] - Exit the application
 
 [bold cyan]CLI Commands:[/bold cyan]
 • [green]python agent.py[/green] - Start the main application
 • [green]python agent.py setup-keys[/green] - Setup API keys interactively
+• [green]python agent.py rank labs.txt[/green] - Rank the labs in a file by fit with your CV
 • [green]python agent.py --help[/green] - Show CLI help
 
 [bold cyan]Example Queries:[/bold cyan]
@@ -355,6 +403,8 @@ class AgentCLI:
 • "Tell me about my work experience"
 • "Crawl https://example.com and summarize it"
 • "What programming languages do I know?"
+• "Write 3 versions of an email to https://example.edu/~prof"
+• "Give me a shorter and a more formal version"
 
 [bold cyan]API Key Management:[/bold cyan]
 • Set GOOGLE_API_KEY and FIRECRAWL_API_KEY in .env file
@@ -410,6 +460,352 @@ class AgentCLI:
         else:
             console.print("\n💡 [cyan]No session API keys loaded[/cyan]")
 
+    def show_cache_stats(self):
+        """Display response cache hit rates for this session"""
+        stats = cache_stats()
+        if not stats:
+            console.print(
+                "💡 [cyan]Response caching is disabled. Set RESPONSE_CACHE_ENABLED "
+                "or SEMANTIC_CACHE_ENABLED to enable it.[/cyan]"
+            )
+            return
+
+        stats_table = Table(
+            title="⚡ Response Cache", show_header=True, header_style="bold magenta"
+        )
+        stats_table.add_column("Cache", style="cyan", no_wrap=True)
+        stats_table.add_column("Hits", style="green", justify="right")
+        stats_table.add_column("Misses", style="yellow", justify="right")
+        stats_table.add_column("Hit Rate", style="white", justify="right")
+
+        for row in stats:
+            stats_table.add_row(
+                row["cache"],
+                str(row["hits"]),
+                str(row["misses"]),
+                f"{row['hit_rate']:.0%}",
+            )
+
+        console.print(stats_table)
+
+    def show_turn_stats(self, turns: int = 5):
+        """Display per-stage timings of the last turns in this session"""
+        thread_id = config["configurable"]["thread_id"]
+        traces = tracer.recent(turns, thread_id=thread_id)
+        if not traces:
+            console.print("💡 [cyan]No finished turns to show yet.[/cyan]")
+            return
+
+        for spans in traces:
+            ordered = span_tree(spans)
+            root = ordered[0][1]
+            stats_table = Table(
+                title=f"⏱️ Turn ({root.attributes.get('route', 'unknown')})",
+                show_header=True,
+                header_style="bold magenta",
+            )
+            stats_table.add_column("Stage", style="cyan", no_wrap=True)
+            stats_table.add_column("Time (ms)", style="white", justify="right")
+            stats_table.add_column("Share", style="yellow", justify="right")
+
+            for depth, stage in ordered:
+                name = "  " * depth + stage.name
+                if stage.error:
+                    name += " [red]✗[/red]"
+                share = stage.duration_ms / root.duration_ms if root.duration_ms else 0
+                stats_table.add_row(name, f"{stage.duration_ms:.1f}", f"{share:.0%}")
+
+            console.print(stats_table)
+
+    def show_health(self):
+        """Display chat call latencies and the circuit breaker state of each
+        backend"""
+        calls = [c for c in call_stats() if c["calls"]]
+        breakers = breaker_stats()
+        if not calls and not breakers:
+            console.print("💡 [cyan]No backend has been called yet.[/cyan]")
+            return
+
+        for call in calls:
+            console.print(
+                f"⏱️ [bold]{call['name']}:[/bold] {call['calls']} calls · "
+                f"p50 {call['p50'] or 0:.2f}s · p95 {call['p95'] or 0:.2f}s · "
+                f"p99 {call['p99'] or 0:.2f}s · {call['retries']} retries · "
+                f"{call['hedges']} hedged ({call['hedge_wins']} won) · "
+                + ", ".join(f"{n} {o}" for o, n in call["outcomes"].items())
+            )
+        if not breakers:
+            return
+
+        health_table = Table(
+            title="🩺 Backend Health", show_header=True, header_style="bold magenta"
+        )
+        health_table.add_column("Backend", style="cyan", no_wrap=True)
+        health_table.add_column("State", style="white")
+        health_table.add_column("Calls", justify="right")
+        health_table.add_column("Failures", justify="right")
+        health_table.add_column("Rejected", justify="right")
+        health_table.add_column("Last error", style="dim")
+
+        states = {"closed": "🟢 closed", "open": "🔴 open", "half-open": "🟡 probing"}
+        for breaker in breakers:
+            state = states[breaker["state"]]
+            if breaker["state"] == "open":
+                state += f" ({breaker['retry_in']:.0f}s)"
+            health_table.add_row(
+                breaker["name"],
+                state,
+                str(breaker["calls"]),
+                str(breaker["failures"]),
+                str(breaker["rejected"]),
+                (breaker["last_error"] or "-")[:60],
+            )
+        console.print(health_table)
+
+    def show_usage(self, turns: int = 5):
+        """Display token usage and estimated cost of this session"""
+        session_id = config["metadata"]["session_id"]
+        if not usage_ledger.records(session_id=session_id):
+            console.print(
+                "💡 [cyan]No model calls recorded in this session yet.[/cyan]"
+            )
+            return
+
+        [session] = usage_ledger.summarize("session_id", session_id=session_id)
+        console.print(
+            f"🪙 [bold]Session:[/bold] {session['calls']} model calls, "
+            f"{session['input_tokens']:,} input tokens "
+            f"({session['cached_tokens']:,} cached), "
+            f"{session['output_tokens']:,} output tokens, "
+            f"~${session['cost_usd']:.4f}"
+        )
+
+        # Group by turn; records come in call order, so the last turns are last
+        turn_ids = []
+        for record in usage_ledger.records(session_id=session_id):
+            if record["turn_id"] not in turn_ids:
+                turn_ids.append(record["turn_id"])
+
+        turns_table = Table(
+            title="🪙 Recent Turns", show_header=True, header_style="bold magenta"
+        )
+        turns_table.add_column("Turn", style="cyan", justify="right")
+        turns_table.add_column("Calls", justify="right")
+        turns_table.add_column("Input", style="yellow", justify="right")
+        turns_table.add_column("Cached", style="green", justify="right")
+        turns_table.add_column("Output", style="yellow", justify="right")
+        turns_table.add_column("Cost (USD)", style="white", justify="right")
+        for index, turn_id in list(enumerate(turn_ids, start=1))[-turns:]:
+            [turn] = usage_ledger.summarize("turn_id", turn_id=turn_id)
+            turns_table.add_row(
+                str(index),
+                str(turn["calls"]),
+                f"{turn['input_tokens']:,}",
+                f"{turn['cached_tokens']:,}",
+                f"{turn['output_tokens']:,}",
+                f"{turn['cost_usd']:.4f}",
+            )
+        console.print(turns_table)
+
+        tiers = usage_ledger.summarize("tier", session_id=session_id)
+        if len(tiers) > 1 or tiers[0]["tier"] != "-":
+            tiers_table = Table(
+                title="🧭 Model Tiers", show_header=True, header_style="bold magenta"
+            )
+            tiers_table.add_column("Tier", style="cyan", no_wrap=True)
+            tiers_table.add_column("Calls", justify="right")
+            tiers_table.add_column("Input", style="yellow", justify="right")
+            tiers_table.add_column("Output", style="yellow", justify="right")
+            tiers_table.add_column("Cost (USD)", style="white", justify="right")
+            for tier in tiers:
+                tiers_table.add_row(
+                    tier["tier"],
+                    str(tier["calls"]),
+                    f"{tier['input_tokens']:,}",
+                    f"{tier['output_tokens']:,}",
+                    f"{tier['cost_usd']:.4f}",
+                )
+            console.print(tiers_table)
+
+        tools_table = Table(
+            title="🧰 Prompt Tokens from Tool Results",
+            show_header=True,
+            header_style="bold magenta",
+        )
+        tools_table.add_column("Tool", style="cyan", no_wrap=True)
+        tools_table.add_column("Calls", justify="right")
+        tools_table.add_column("Input Tokens", style="yellow", justify="right")
+        tools_table.add_column("Cost (USD)", style="white", justify="right")
+        for row in usage_ledger.by_tool(session_id=session_id):
+            tools_table.add_row(
+                row["tool"],
+                str(row["calls"]),
+                f"{row['input_tokens']:,}",
+                f"{row['cost_usd']:.4f}",
+            )
+        console.print(tools_table)
+
+    def export_usage(self, path: str):
+        """Write this session's usage records to a CSV file"""
+        session_id = config["metadata"]["session_id"]
+        try:
+            Path(path).write_text(
+                usage_ledger.to_csv(session_id=session_id), encoding="utf-8"
+            )
+            console.print(f"💾 Usage exported to {path}", style="green")
+        except OSError as e:
+            console.print(f"❌ Could not write {path}: {str(e)}", style="red")
+
+    def rank_labs(self, source: str, top: int = RANK_SHORTLIST_SIZE):
+        """Rank the labs in a file (or a list of URLs) by fit with the CV,
+        show the ranking and remember the shortlist
+
+        Args:
+            source: Path of a file containing the labs' URLs, or the URLs
+            top: Number of labs shortlisted for drafting
+        """
+        path = Path(source)
+        urls = find_urls(path.read_text(encoding="utf-8") if path.is_file() else source)
+        if not urls:
+            console.print(f"❌ No URLs found in {source}", style="red")
+            return None
+
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            console=console,
+        ) as progress:
+            task = progress.add_task(f"🔥 Crawling {len(urls)} labs...", total=None)
+
+            def report(stage: str, done: int, total: int):
+                what = "Crawled" if stage == "crawl" else "Embedded topics"
+                progress.update(task, description=f"{what}: {done}/{total}")
+
+            try:
+                ranking = rank_labs(
+                    urls, os.getenv("FIRECRAWL_API_KEY"), progress=report
+                )
+            except ValueError as e:
+                progress.update(task, description=f"❌ {str(e)}")
+                return None
+            except Exception as e:
+                progress.update(task, description="❌ Ranking failed")
+                console.print(
+                    Panel(
+                        f"❌ Error: {str(e)}",
+                        title="Error",
+                        border_style="red",
+                        padding=(1, 2),
+                    )
+                )
+                return None
+
+        ranking_table = Table(
+            title=f"🏆 Lab Ranking ({len(ranking.labs)} labs)",
+            show_header=True,
+            header_style="bold magenta",
+        )
+        ranking_table.add_column("#", style="white", justify="right")
+        ranking_table.add_column("Fit", style="green", justify="right")
+        ranking_table.add_column("Professor", style="cyan")
+        ranking_table.add_column("Position", style="white")
+        ranking_table.add_column("Top matching topic", style="yellow")
+        ranking_table.add_column("URL", style="blue", overflow="fold")
+        for rank, lab in enumerate(ranking.labs, start=1):
+            topic = lab.fit.evidence[0]["topic"] if lab.fit.evidence else ""
+            ranking_table.add_row(
+                str(rank),
+                f"{lab.fit.score}%",
+                lab.name,
+                lab.profile.get("position", ""),
+                topic[:60],
+                lab.url,
+            )
+        console.print(ranking_table)
+
+        for url, error in ranking.failed:
+            console.print(f"❌ {url}: {error}", style="red")
+        console.print(
+            f"⏱️ crawl {ranking.timings['crawl']:.1f}s · embed "
+            f"{ranking.timings['embed']:.1f}s · score "
+            f"{ranking.timings['score'] * 1000:.0f}ms",
+            style="dim",
+        )
+
+        self.shortlist = ranking.shortlist(top)
+        if self.shortlist:
+            console.print(
+                f"📋 Shortlisted {len(self.shortlist)} labs. In chat, type "
+                "[green]draft shortlist[/green] to write an email to each.",
+                style="cyan",
+            )
+        return ranking
+
+    def draft_shortlist(self):
+        """Write an email to each lab shortlisted by the last ranking"""
+        if not self.shortlist:
+            console.print(
+                "💡 [cyan]Nothing shortlisted yet. Run rank <file> first.[/cyan]"
+            )
+            return
+
+        for number, url in enumerate(self.shortlist, start=1):
+            message = f"Write an email to {url}"
+            console.print(
+                f"\n✍️ [bold yellow]Drafting {number}/{len(self.shortlist)}: "
+                f"{url}[/bold yellow]"
+            )
+            thread_id = config["configurable"]["thread_id"]
+            with span("turn", thread_id=thread_id, ui="cli", route="shortlist"):
+                with console.status("[bold green]Processing...", spinner="dots"):
+                    if self.fast_path is not None:
+                        agent_response = self.fast_path.invoke(
+                            message, self.agent, config
+                        )
+                    else:
+                        response = self.agent.invoke(
+                            {"messages": [{"role": "user", "content": message}]},
+                            config=config,
+                        )
+                        agent_response = response["messages"][-1].content
+            self.history += [
+                {"role": "user", "content": message},
+                {"role": "assistant", "content": str(agent_response)},
+            ]
+            self.render_markdown_response(agent_response)
+
+    def render_variants(self, turn) -> str:
+        """Stream email variants side by side and return them as one answer"""
+
+        def panels():
+            grid = Table.grid(expand=True, padding=(0, 1))
+            for _ in turn.labels:
+                grid.add_column(ratio=1)
+            grid.add_row(
+                *[
+                    Panel(
+                        Markdown(draft or "✍️ ..."),
+                        title=f"{number}. {label}",
+                        border_style="green",
+                        padding=(1, 2),
+                    )
+                    for number, (label, draft) in enumerate(
+                        zip(turn.labels, turn.drafts), start=1
+                    )
+                ]
+            )
+            return grid
+
+        with Live(
+            panels(),
+            console=console,
+            refresh_per_second=8,
+            vertical_overflow="visible",
+        ) as live:
+            for _ in turn.stream():
+                live.update(panels())
+        return turn.text()
+
     def render_markdown_response(self, markdown_text: str):
         """Render markdown response with proper formatting"""
         try:
@@ -467,21 +863,121 @@ class AgentCLI:
                 elif message.lower() == "apikeys":
                     self.show_api_keys_status()
                     continue
+                elif message.lower() == "cache":
+                    self.show_cache_stats()
+                    continue
+                elif message.lower() == "stats":
+                    self.show_turn_stats()
+                    continue
+                elif message.lower() == "health":
+                    self.show_health()
+                    continue
+                elif message.lower() == "usage":
+                    self.show_usage()
+                    continue
+                elif message.lower().startswith("rank "):
+                    self.rank_labs(message.strip()[len("rank ") :].strip())
+                    continue
+                elif message.lower() == "draft shortlist":
+                    self.draft_shortlist()
+                    continue
+                elif message.lower().startswith("usage export"):
+                    path = message.strip()[len("usage export") :].strip()
+                    self.export_usage(path or "usage.csv")
+                    continue
                 elif not message.strip():
                     continue
 
                 # Process with AI agent
                 console.print("\n🤖 [bold yellow]Agent is thinking...[/bold yellow]")
 
-                with console.status("[bold green]Processing...", spinner="dots"):
-                    response = self.agent.invoke(
-                        {"messages": [{"role": "user", "content": message}]},
-                        config=config,
+                thread_id = config["configurable"]["thread_id"]
+                with span("turn", thread_id=thread_id, ui="cli") as turn_span:
+                    history = self.history + [{"role": "user", "content": message}]
+                    variant_turn = None
+                    if self.variants is not None:
+                        variant_turn = self.variants.plan(message, self.agent, config)
+                    if variant_turn is not None:
+                        # Several drafts from one shared context, side by side
+                        turn_span.set(route="variants")
+                        agent_response = self.render_variants(variant_turn)
+                    else:
+                        turn_cache = TurnCache(
+                            CHAT_MODEL,
+                            CHAT_TEMPERATURE,
+                            system_prompt,
+                            get_cv_index_hash(),
+                            history,
+                            api_key=os.getenv("GOOGLE_API_KEY"),
+                        )
+                        cached = turn_cache.lookup()
+
+                        if cached is not None:
+                            turn_span.set(route=f"{turn_cache.source}_cache")
+                            agent_response = "".join(replay(cached))
+                            remember_exchange(
+                                self.agent, config, message, agent_response
+                            )
+                            console.print(
+                                f"⚡ Served from {turn_cache.source} response cache",
+                                style="dim",
+                            )
+                        else:
+                            # Start crawling any pasted URL while the model plans
+                            firecrawl_api_key = os.getenv("FIRECRAWL_API_KEY")
+                            if firecrawl_api_key:
+                                get_crawler(firecrawl_api_key).prefetch_from_text(
+                                    message, skip=has_fresh_profile
+                                )
+
+                            with console.status(
+                                "[bold green]Processing...", spinner="dots"
+                            ):
+                                if (
+                                    self.fast_path is not None
+                                    and self.fast_path.matches(message)
+                                ):
+                                    # Crawl, CV lookup and drafting without agent steps
+                                    turn_span.set(route="fast_path")
+                                    agent_response = self.fast_path.invoke(
+                                        message, self.agent, config
+                                    )
+                                    tools_used = FAST_PATH_TOOLS
+                                else:
+                                    turn_span.set(route="agent")
+                                    response = self.agent.invoke(
+                                        {
+                                            "messages": [
+                                                {"role": "user", "content": message}
+                                            ]
+                                        },
+                                        config=config,
+                                    )
+                                    agent_response = response["messages"][-1].content
+                                    tools_used = tools_used_in_turn(
+                                        response["messages"]
+                                    )
+                            turn_cache.store([agent_response], tools_used)
+
+                self.history = history + [
+                    {"role": "assistant", "content": str(agent_response)}
+                ]
+
+                # Render the response as markdown (variants were shown live)
+                if variant_turn is None:
+                    self.render_markdown_response(agent_response)
+
+                turn_usage = usage_ledger.summarize(
+                    "turn_id", turn_id=turn_span.trace_id
+                )
+                if turn_usage:
+                    console.print(
+                        f"🪙 {turn_usage[0]['input_tokens']:,} input "
+                        f"({turn_usage[0]['cached_tokens']:,} cached) · "
+                        f"{turn_usage[0]['output_tokens']:,} output tokens · "
+                        f"~${turn_usage[0]['cost_usd']:.4f}",
+                        style="dim",
                     )
-                    agent_response = response["messages"][-1].content
-
-                # Render the response as markdown
-                self.render_markdown_response(agent_response)
 
             except KeyboardInterrupt:
                 console.print("\n\n⚠️  [yellow]Interrupted by user[/yellow]")
@@ -539,11 +1035,36 @@ class AgentCLI:
             self.save_api_keys_to_env_file()
 
 
+def run_command(func, profile: bool, profile_dir: Path):
+    """Run a command, wrapped in the CPU and allocation profilers if asked"""
+    if not profile:
+        return func()
+
+    report_dir = None
+    try:
+        with profile_run(profile_dir) as report_dir:
+            return func()
+    finally:
+        if report_dir is not None:
+            console.print(
+                f"\n📈 Profile written to [cyan]{report_dir}[/cyan] "
+                "(hotspots.txt, stacks.collapsed, allocations.txt, run.pstats)"
+            )
+
+
+PROFILE_OPTION = typer.Option(
+    False, "--profile", help="Profile CPU time and allocations of this run"
+)
+PROFILE_DIR_OPTION = typer.Option(
+    Path("profiles"), "--profile-dir", help="Folder for the profile reports"
+)
+
+
 @app.command()
-def main():
+def main(profile: bool = PROFILE_OPTION, profile_dir: Path = PROFILE_DIR_OPTION):
     """Start the Draft 'n' Pray Agent"""
     agent_cli = AgentCLI()
-    agent_cli.run()
+    run_command(agent_cli.run, profile, profile_dir)
 
 
 @app.command()
@@ -574,6 +1095,52 @@ def check_keys():
     agent_cli.show_api_keys_status()
 
 
+@app.command()
+def rank(
+    labs: Path = typer.Argument(
+        ..., help="File with the professors' URLs (one per line, or any text)"
+    ),
+    cv: Path = typer.Option(
+        None, "--cv", help="CV to rank against (default: CV_PATH or cv.pdf)"
+    ),
+    top: int = typer.Option(RANK_SHORTLIST_SIZE, "--top", help="Labs in the shortlist"),
+    output: Path = typer.Option(
+        None, "--output", help="Write the full ranking to this CSV file"
+    ),
+    shortlist: Path = typer.Option(
+        None, "--shortlist", help="Write the shortlisted URLs to this file"
+    ),
+    profile: bool = PROFILE_OPTION,
+    profile_dir: Path = PROFILE_DIR_OPTION,
+):
+    """Rank professors' labs by fit with your CV, without the chat model"""
+    agent_cli = AgentCLI()
+
+    def run_ranking():
+        cv_path = str(cv or os.getenv("CV_PATH") or "cv.pdf")
+        if not Path(cv_path).exists():
+            console.print(f"❌ CV file not found: {cv_path}", style="red")
+            sys.exit(1)
+        if not initialize_vectorstore_with_cv(
+            cv_path, api_key=os.getenv("GOOGLE_API_KEY")
+        ):
+            sys.exit(1)
+
+        ranking = agent_cli.rank_labs(str(labs), top)
+        if ranking is None:
+            sys.exit(1)
+        if output:
+            output.write_text(ranking.to_csv(), encoding="utf-8")
+            console.print(f"💾 Ranking written to {output}", style="green")
+        if shortlist:
+            shortlist.write_text(
+                "\n".join(agent_cli.shortlist) + "\n", encoding="utf-8"
+            )
+            console.print(f"💾 Shortlist written to {shortlist}", style="green")
+
+    run_command(run_ranking, profile, profile_dir)
+
+
 @app.command()
 def version():
     """Show version information"""
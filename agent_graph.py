@@ -0,0 +1,251 @@
+"""
+ReAct agent graph with a parallel tool executor.
+
+Mirrors LangGraph's prebuilt ``create_react_agent`` (an "agent" node that
+calls the model and a "tools" node that runs the requested tools), but the
+tool calls of one model message run concurrently with per-tool timeouts. A
+step that asks for ``crawl_website`` and ``kb_tool`` together therefore takes
+as long as the slower tool instead of the sum of both.
+"""
+
+import os
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
+from langgraph.constants import TAG_NOSTREAM
+from langgraph.graph import StateGraph, MessagesState, START, END
+from resilience import CHAT_HEDGE_ENABLED
+from tracing import span
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Fallback timeout for tools without an explicit entry below
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "120"))
+# Threads running tool calls, shared by every agent
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+
+# Per-tool timeouts in seconds
+DEFAULT_TOOL_TIMEOUTS = {
+    "crawl_website": 180.0,
+    "kb_tool": 30.0,
+    "fit_score": 180.0,
+}
+
+# One pool for all agents: a rebuilt or evicted agent leaves no threads behind
+_pool = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+
+
+class ParallelToolExecutor:
+    """Graph node that runs all tool calls of the last AI message concurrently.
+
+    Results are returned in the order the model requested them, whatever order
+    they finish in. A call that exceeds its timeout, raises, or names an
+    unknown tool produces an error ToolMessage instead of failing the step, so
+    the model can recover on its next turn.
+
+    Args:
+        tools: Tools the agent can call
+        timeouts: Per-tool timeouts in seconds, merged over DEFAULT_TOOL_TIMEOUTS
+        default_timeout: Timeout for tools without an entry in ``timeouts``
+    """
+
+    def __init__(
+        self,
+        tools: list,
+        timeouts: dict = None,
+        default_timeout: float = TOOL_TIMEOUT_SECONDS,
+    ):
+        self.tools_by_name = {tool.name: tool for tool in tools}
+        self.timeouts = {**DEFAULT_TOOL_TIMEOUTS, **(timeouts or {})}
+        self.default_timeout = default_timeout
+
+    def timeout_for(self, tool_name: str) -> float:
+        return self.timeouts.get(tool_name, self.default_timeout)
+
+    def _run_one(self, tool_call: dict, config: RunnableConfig) -> ToolMessage:
+        tool = self.tools_by_name.get(tool_call["name"])
+        if tool is None:
+            return ToolMessage(
+                content=f"## ❌ Error\n\nUnknown tool: {tool_call['name']}",
+                name=tool_call["name"],
+                tool_call_id=tool_call["id"],
+                status="error",
+            )
+
+        try:
+            with span(f"tool.{tool_call['name']}"):
+                # Invoking with a ToolCall returns a ready ToolMessage
+                return tool.invoke({**tool_call, "type": "tool_call"}, config)
+        except Exception as e:
+            return ToolMessage(
+                content=f"## ❌ Error\n\nError running {tool_call['name']}: {str(e)}",
+                name=tool_call["name"],
+                tool_call_id=tool_call["id"],
+                status="error",
+            )
+
+    def run(self, tool_calls: list[dict], config: RunnableConfig = None):
+        """Run tool calls concurrently and return their ToolMessages in order"""
+        started = time.monotonic()
+        futures = [
+            # Copy the context so callbacks and tracing follow the call
+            _pool.submit(contextvars.copy_context().run, self._run_one, call, config)
+            for call in tool_calls
+        ]
+
+        results = []
+        for call, future in zip(tool_calls, futures):
+            timeout = self.timeout_for(call["name"])
+            remaining = max(0.0, started + timeout - time.monotonic())
+            try:
+                results.append(future.result(timeout=remaining))
+            except FutureTimeoutError:
+                # The worker cannot be interrupted; its result is discarded
+                future.cancel()
+                results.append(
+                    ToolMessage(
+                        content=(
+                            f"## ❌ Error\n\n{call['name']} timed out after "
+                            f"{timeout:.0f}s"
+                        ),
+                        name=call["name"],
+                        tool_call_id=call["id"],
+                        status="error",
+                    )
+                )
+        return results
+
+    def __call__(self, state: MessagesState, config: RunnableConfig):
+        tool_calls = state["messages"][-1].tool_calls
+        return {"messages": self.run(tool_calls, config)}
+
+
+def build_agent(
+    model,
+    tools: list,
+    prompt: str,
+    checkpointer=None,
+    tool_timeouts: dict = None,
+    hedge_tool_steps: bool = CHAT_HEDGE_ENABLED,
+    router=None,
+):
+    """Build the ReAct agent graph.
+
+    Args:
+        model: Chat model that supports tool calling
+        tools: Tools the agent can call
+        prompt: System prompt prepended to every model call
+        checkpointer: LangGraph checkpointer for conversation memory
+        tool_timeouts: Per-tool timeouts in seconds
+        hedge_tool_steps: Don't stream the step answering a user message, so
+            the model's call policy can hedge it (it usually only picks tools)
+        router: Optional ModelRouter choosing a model tier per step; ``model``
+            is then ignored
+
+    Returns:
+        The compiled graph, with nodes named "agent" and "tools" like the
+        prebuilt ReAct agent
+    """
+    models = router.models if router is not None else {"main": model}
+    bound_models = {tier: m.bind_tools(tools) for tier, m in models.items()}
+    system_message = SystemMessage(content=prompt)
+
+    def call_model(state: MessagesState, config: RunnableConfig):
+        messages = [system_message] + state["messages"]
+        tier, escalate = ("main", False)
+        if router is not None:
+            tier, escalate = router.route(state["messages"])
+
+        kwargs = {}
+        if hedge_tool_steps and isinstance(state["messages"][-1], HumanMessage):
+            kwargs["stream"] = False
+        step_config = config
+        if escalate:
+            # Keep the step out of the token stream until we know it is kept;
+            # a kept message is still streamed whole when the node ends
+            step_config = merge_configs(config, {"tags": [TAG_NOSTREAM]})
+
+        with span("llm.call", node="agent", tier=tier, messages=len(messages)):
+            response = bound_models[tier].invoke(messages, step_config, **kwargs)
+
+        if escalate and not response.tool_calls:
+            # The fast tier answered a drafting request itself: the main tier
+            # writes the answer instead
+            tier = router.main_tier
+            with span("llm.call", node="agent", tier=tier, escalated=True):
+                response = bound_models[tier].invoke(messages, config)
+        return {"messages": [response]}
+
+    def route_after_model(state: MessagesState):
+        last_message = state["messages"][-1]
+        if getattr(last_message, "tool_calls", None):
+            return "tools"
+        return END
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("agent", call_model)
+    graph.add_node("tools", ParallelToolExecutor(tools, timeouts=tool_timeouts))
+    graph.add_edge(START, "agent")
+    graph.add_conditional_edges("agent", route_after_model, ["tools", END])
+    graph.add_edge("tools", "agent")
+
+    return graph.compile(checkpointer=checkpointer)
+
+
+def append_to_thread(agent, config: dict, messages: list):
+    """Append messages produced outside the agent to its conversation thread.
+
+    Recorded as if the "agent" node had produced them, so the next turn starts
+    from a finished step. The last message should be an AIMessage without tool
+    calls.
+    """
+    agent.update_state(config, {"messages": messages}, as_node="agent")
+
+
+def thread_messages(agent, config: dict) -> list:
+    """Messages of the agent's conversation thread ([] for a new thread)"""
+    return agent.get_state(config).values.get("messages", [])
+
+
+def thread_size_bytes(agent, config: dict) -> int:
+    """Approximate bytes an InMemorySaver holds for the thread (0 otherwise)"""
+    checkpointer = agent.checkpointer
+    if not hasattr(checkpointer, "blobs"):
+        return 0
+    thread_id = config["configurable"]["thread_id"]
+    size = sum(
+        len(blob[1]) for key, blob in checkpointer.blobs.items() if key[0] == thread_id
+    )
+    for checkpoints in checkpointer.storage.get(thread_id, {}).values():
+        size += sum(
+            len(saved[1]) + len(meta[1]) for saved, meta, _ in checkpoints.values()
+        )
+    for key, writes in checkpointer.writes.items():
+        if key[0] == thread_id:
+            size += sum(len(write[2][1]) for write in writes.values())
+    return size
+
+
+def compact_thread(agent, config: dict, keep_messages: int = None):
+    """Replace a thread's checkpoint history with a single checkpoint.
+
+    InMemorySaver keeps every step's checkpoint, each with a full copy of the
+    message list, so a thread grows quadratically with its length. Only the
+    latest messages matter for the next turn. With ``keep_messages`` the
+    thread is also cut to its most recent messages, starting at a user
+    message so no tool result loses its tool call.
+    """
+    messages = thread_messages(agent, config)
+    if keep_messages is not None and len(messages) > keep_messages:
+        messages = messages[-keep_messages:]
+        while messages and messages[0].type != "human":
+            messages = messages[1:]
+
+    agent.checkpointer.delete_thread(config["configurable"]["thread_id"])
+    if messages:
+        append_to_thread(agent, config, messages)
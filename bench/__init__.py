@@ -0,0 +1,12 @@
+"""
+Offline benchmark harness for Draft 'n' Pray.
+
+Everything that normally talks to Google or Firecrawl is replaced by a local
+stand-in with configurable latency, so runs are deterministic, free and work
+without network access:
+
+- fakes.py           - fake chat model and fake embedding engine
+- firecrawl_stub.py  - local HTTP server speaking the Firecrawl crawl API
+- cv_fixtures.py     - synthetic CV PDFs of any size
+- run.py             - the benchmark command (python -m bench.run --help)
+"""
@@ -0,0 +1,120 @@
+"""
+Synthetic CV PDFs of any size.
+
+The PDFs are written by hand (one Helvetica text stream per page), so no PDF
+library is needed to produce them, and the content is seeded so every run
+indexes the same text.
+"""
+
+import random
+from pathlib import Path
+
+LINES_PER_PAGE = 50
+
+TOPICS = [
+    "machine learning",
+    "graph neural networks",
+    "robust optimization",
+    "natural language processing",
+    "computer vision",
+    "reinforcement learning",
+    "distributed systems",
+    "bioinformatics",
+    "representation learning",
+    "probabilistic inference",
+]
+ROLES = ["Research Assistant", "Software Engineer", "Teaching Assistant", "Intern"]
+PLACES = ["Example University", "Acme Labs", "Institute of Science", "Data Corp"]
+SKILLS = ["Python", "PyTorch", "C++", "SQL", "JAX", "Rust", "Docker", "LaTeX"]
+
+
+def synthetic_cv_lines(pages: int, seed: int = 7) -> list[str]:
+    """Return CV text lines filling roughly ``pages`` pages"""
+    rng = random.Random(seed)
+    lines = ["Jane Candidate", "jane.candidate@example.com", ""]
+    sections = ["EDUCATION", "EXPERIENCE", "PUBLICATIONS", "PROJECTS", "SKILLS"]
+    target = pages * LINES_PER_PAGE
+
+    while len(lines) < target:
+        for section in sections:
+            lines += ["", section]
+            for _ in range(rng.randint(3, 6)):
+                topic = rng.choice(TOPICS)
+                year = rng.randint(2012, 2025)
+                if section == "EDUCATION":
+                    place = rng.choice(PLACES)
+                    lines.append(f"MSc in Computer Science, {place}, {year}")
+                    lines.append(f"  Thesis on {topic}")
+                elif section == "EXPERIENCE":
+                    lines.append(f"{rng.choice(ROLES)}, {rng.choice(PLACES)}, {year}")
+                    lines.append(f"  - Built systems for {topic} used by 10k users")
+                    lines.append(f"  - Published results on {rng.choice(TOPICS)}")
+                elif section == "PUBLICATIONS":
+                    lines.append(
+                        f"[{year}] Advances in {topic.title()} at Scale. "
+                        f"Conference on {rng.choice(TOPICS).title()}"
+                    )
+                elif section == "PROJECTS":
+                    lines.append(f"Open-source toolkit for {topic} ({year})")
+                else:
+                    lines.append(", ".join(rng.sample(SKILLS, 4)))
+    return lines[:target]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_pdf(pages: list[list[str]]) -> bytes:
+    """Build a minimal PDF with one page per list of text lines"""
+    objects = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    page_ids = []
+    next_id = 4
+    for lines in pages:
+        text = " ".join(f"({_escape(line)}) Tj T*" for line in lines)
+        stream = f"BT /F1 10 Tf 14 TL 50 760 Td {text} ET"
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects[content_id] = (
+            f"<< /Length {len(stream.encode('latin-1'))} >>\n"
+            f"stream\n{stream}\nendstream"
+        )
+        objects[page_id] = (
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        page_ids.append(page_id)
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[2] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(out)
+        out += f"{object_id} 0 obj\n{objects[object_id]}\nendobj\n".encode("latin-1")
+
+    xref_offset = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for object_id in sorted(objects):
+        out += f"{offsets[object_id]:010d} 00000 n \n".encode("latin-1")
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode("latin-1")
+    return bytes(out)
+
+
+def write_synthetic_cv(path: Path, pages: int, seed: int = 7) -> Path:
+    """Write a synthetic CV of ``pages`` pages to ``path``"""
+    lines = synthetic_cv_lines(pages, seed)
+    chunks = [
+        lines[start : start + LINES_PER_PAGE]
+        for start in range(0, len(lines), LINES_PER_PAGE)
+    ]
+    path = Path(path)
+    path.write_bytes(build_pdf(chunks))
+    return path
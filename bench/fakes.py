@@ -0,0 +1,196 @@
+"""
+Deterministic stand-ins for the Gemini chat model and embedding engine.
+"""
+
+import json
+import re
+import time
+import uuid
+import zlib
+from typing import Any, Iterator, Optional
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+URL_PATTERN = re.compile(r"https?://\S+")
+
+WORDS = (
+    "Dear Professor, I am writing to express my interest in joining your lab. "
+    "My background in machine learning and my recent publications align well "
+    "with your work on representation learning and robust optimization. "
+).split()
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeChatModel(BaseChatModel):
+    """Scripted chat model with configurable latency and token rate.
+
+    With tools bound, a fresh user message containing a URL gets a single step
+    calling ``crawl_website`` and ``kb_tool`` together; any other fresh user
+    message gets a ``kb_tool`` call. Once tool results are in (or when no
+    tools are bound) it writes a canned email of ``response_tokens`` words.
+
+    Attributes:
+        latency: Seconds before the first token of every call
+        tokens_per_second: Streaming rate of the answer
+        response_tokens: Length of the answer in words
+    """
+
+    latency: float = 0.3
+    tokens_per_second: float = 80.0
+    response_tokens: int = 120
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tool_names=[tool.name for tool in tools])
+
+    def _plan(self, messages: list[BaseMessage], tool_names: list[str] = None):
+        """Return the tool calls for this step, or [] to answer"""
+        last = messages[-1]
+        if not tool_names or last.type != "human":
+            return []
+
+        calls = []
+        match = URL_PATTERN.search(str(last.content))
+        if match and "crawl_website" in tool_names:
+            calls.append(
+                {
+                    "name": "crawl_website",
+                    "args": {"url": match.group(0)},
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                }
+            )
+        if "kb_tool" in tool_names:
+            calls.append(
+                {
+                    "name": "kb_tool",
+                    "args": {"query": str(last.content)[:200]},
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                }
+            )
+        return calls
+
+    def _answer_words(self) -> list[str]:
+        return [WORDS[i % len(WORDS)] for i in range(self.response_tokens)]
+
+    def _usage(self, messages: list[BaseMessage], output: str) -> dict:
+        input_tokens = sum(_approx_tokens(str(m.content)) for m in messages)
+        output_tokens = _approx_tokens(output)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        tool_names: list[str] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        calls = self._plan(messages, tool_names)
+        if calls:
+            message = AIMessage(
+                content="", tool_calls=calls, usage_metadata=self._usage(messages, "")
+            )
+        else:
+            words = self._answer_words()
+            time.sleep(len(words) / self.tokens_per_second)
+            text = " ".join(words)
+            message = AIMessage(
+                content=text, usage_metadata=self._usage(messages, text)
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        tool_names: list[str] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        calls = self._plan(messages, tool_names)
+        if calls:
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        {
+                            "name": call["name"],
+                            "args": json.dumps(call["args"]),
+                            "id": call["id"],
+                            "index": index,
+                        }
+                        for index, call in enumerate(calls)
+                    ],
+                    usage_metadata=self._usage(messages, ""),
+                )
+            )
+            return
+
+        words = self._answer_words()
+        for index, word in enumerate(words):
+            time.sleep(1.0 / self.tokens_per_second)
+            chunk = AIMessageChunk(content=word + " ")
+            if index == len(words) - 1:
+                chunk.usage_metadata = self._usage(messages, " ".join(words))
+            yield ChatGenerationChunk(message=chunk)
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-words embeddings with simulated API latency.
+
+    Vectors are deterministic, L2-normalised and share dimensions for shared
+    words, so similarity search still ranks sensibly.
+
+    Args:
+        dimension: Vector size
+        latency: Seconds per API call
+        per_text_latency: Additional seconds per embedded text
+    """
+
+    def __init__(
+        self,
+        dimension: int = 768,
+        latency: float = 0.05,
+        per_text_latency: float = 0.002,
+    ):
+        self.dimension = dimension
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.calls = 0
+
+    def _vector(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = zlib.crc32(word.encode("utf-8"))
+            sign = 1.0 if digest & 1 else -1.0
+            vector[(digest >> 1) % self.dimension] += sign
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        time.sleep(self.latency + self.per_text_latency * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.calls += 1
+        time.sleep(self.latency + self.per_text_latency)
+        return self._vector(text)
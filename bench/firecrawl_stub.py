@@ -0,0 +1,132 @@
+"""
+Local HTTP stand-in for the Firecrawl crawl API.
+
+Implements just enough of ``POST /v{1,2}/crawl`` and ``GET /v{1,2}/crawl/<id>``
+for the Firecrawl SDK's ``crawl`` call to complete on its first status poll.
+Point the app at it with FIRECRAWL_API_URL.
+"""
+
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROFESSOR_PAGE = """# Prof. Ada Example
+
+Associate Professor, Department of Computer Science, Example University
+
+Email: ada.example@example.edu | Phone: +1 555 0100
+
+## Research Interests
+
+Representation learning, robust optimization, graph neural networks and
+machine learning for scientific discovery.
+
+## Recent Publications
+
+1. Robust Representation Learning under Distribution Shift (NeurIPS)
+   We study how self-supervised objectives behave when test data drifts.
+2. Graph Neural Networks for Molecular Property Prediction (ICML)
+   A message-passing architecture with provable expressiveness guarantees.
+3. Scalable Second-Order Optimization for Deep Networks (ICLR)
+   Low-rank curvature approximations that train large models faster.
+"""
+
+
+class FirecrawlStub:
+    """Threaded local Firecrawl stand-in, usable as a context manager.
+
+    Args:
+        latency: Seconds each crawl takes to "complete"
+        pages: Number of pages returned per crawl
+        port: Port to bind (0 picks a free one)
+    """
+
+    def __init__(self, latency: float = 0.5, pages: int = 3, port: int = 0):
+        self.latency = latency
+        self.pages = pages
+        self.crawls = 0
+        self._jobs = {}
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _page(self, url: str, index: int) -> dict:
+        return {
+            "markdown": PROFESSOR_PAGE + f"\n\n(page {index + 1} of {url})",
+            "metadata": {"sourceURL": f"{url}/page-{index + 1}", "statusCode": 200},
+        }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, payload: dict, status: int = 200):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/crawl"):
+                    self._send({"success": False, "error": "Not found"}, 404)
+                    return
+
+                job_id = str(uuid.uuid4())
+                stub._jobs[job_id] = (request.get("url", ""), time.monotonic())
+                stub.crawls += 1
+                self._send({"success": True, "id": job_id, "url": request.get("url")})
+
+            def do_GET(self):
+                job_id = self.path.rstrip("/").rsplit("/", 1)[-1]
+                if job_id not in stub._jobs:
+                    self._send({"success": False, "error": "Job not found"}, 404)
+                    return
+
+                url, started = stub._jobs[job_id]
+                # Block until the simulated crawl is done so one poll suffices
+                remaining = stub.latency - (time.monotonic() - started)
+                if remaining > 0:
+                    time.sleep(remaining)
+
+                data = [stub._page(url, index) for index in range(stub.pages)]
+                self._send(
+                    {
+                        "success": True,
+                        "status": "completed",
+                        "total": len(data),
+                        "completed": len(data),
+                        "creditsUsed": len(data),
+                        "expiresAt": "2099-01-01T00:00:00Z",
+                        "next": None,
+                        "data": data,
+                    }
+                )
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
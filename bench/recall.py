@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Recall, memory and speed of quantized storage and of the ANN index.
+
+Every dtype of QuantizedVectorStore is filled with the same vectors and
+queried with the same queries. An nprobe sweep then shows what the IVF
+index trades for speed. Recall@k is the overlap of each top-k with the
+exact float32 top-k.
+
+Usage:
+    python -m bench.recall
+    python -m bench.recall --vectors embeddings.npy   # real exported vectors
+"""
+
+import statistics
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from langchain_core.documents import Document
+from rich.console import Console
+from rich.table import Table
+import typer
+
+from bench.cv_fixtures import synthetic_cv_lines
+from bench.fakes import FakeEmbeddings
+from vectorstore import DTYPES, QuantizedVectorStore
+
+console = Console()
+
+app = typer.Typer(
+    name="Draft 'n' Pray recall benchmark",
+    help="🎯 Recall@k and memory of float16/int8 vector storage vs float32",
+    add_completion=False,
+)
+
+
+def python_list_bytes(count: int, dimension: int) -> int:
+    """Memory of ``count`` vectors kept as Python lists of floats"""
+    row = sys.getsizeof([0.0] * dimension) + dimension * sys.getsizeof(1.5)
+    return count * row
+
+
+def clustered_vectors(count: int, dimension: int, seed: int) -> np.ndarray:
+    """Dense vectors drawn around a few topics, like sentence embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, count // 20), dimension))
+    labels = rng.integers(0, len(centers), size=count)
+    return (centers[labels] + 0.6 * rng.normal(size=(count, dimension))).astype(
+        np.float32
+    )
+
+
+def perturbed_queries(corpus: np.ndarray, count: int, seed: int) -> np.ndarray:
+    """Noisy copies of corpus rows, standing in for queries about stored chunks"""
+    rng = np.random.default_rng(seed)
+    picked = corpus[rng.integers(0, len(corpus), size=count)]
+    noise = rng.normal(scale=picked.std(), size=picked.shape)
+    return (picked + 0.5 * noise).astype(np.float32)
+
+
+def cv_vectors(pages: int, queries: int, dimension: int):
+    """Hashed bag-of-words vectors of a synthetic CV and of CV-line queries"""
+    embeddings = FakeEmbeddings(dimension=dimension, latency=0, per_text_latency=0)
+    lines = synthetic_cv_lines(pages)
+    chunks = [
+        "\n".join(lines[start : start + 10]) for start in range(0, len(lines), 10)
+    ]
+    rng = np.random.default_rng(0)
+    picked = rng.choice([line for line in lines if line.strip()], size=queries)
+    return (
+        np.asarray(embeddings.embed_documents(chunks), dtype=np.float32),
+        np.asarray(embeddings.embed_documents(list(picked)), dtype=np.float32),
+    )
+
+
+def evaluate(corpus: np.ndarray, queries: np.ndarray, k: int) -> list[dict]:
+    documents = [Document(page_content=str(i)) for i in range(len(corpus))]
+    stores = {}
+    for dtype in DTYPES:
+        store = QuantizedVectorStore(embedding=None, dtype=dtype)
+        store.add_embeddings(corpus.tolist(), documents)
+        stores[dtype] = store
+
+    exact = [
+        set(
+            doc.page_content
+            for doc in stores["float32"].similarity_search_by_vector(q, k)
+        )
+        for q in queries
+    ]
+    exact_scores = [stores["float32"].scores(q) for q in queries]
+
+    rows = [
+        {
+            "storage": "python lists",
+            "bytes": python_list_bytes(len(corpus), corpus.shape[1]),
+        }
+    ]
+    for dtype, store in stores.items():
+        recalls, errors, latencies = [], [], []
+        for query, truth, truth_scores in zip(queries, exact, exact_scores):
+            started = time.perf_counter()
+            found = store.similarity_search_by_vector(query, k)
+            latencies.append(time.perf_counter() - started)
+            recalls.append(len(truth & {doc.page_content for doc in found}) / k)
+            errors.append(float(np.abs(store.scores(query) - truth_scores).mean()))
+        rows.append(
+            {
+                "storage": dtype,
+                "bytes": store.memory_bytes(),
+                "recall": statistics.mean(recalls),
+                "score_error": statistics.mean(errors),
+                "search_ms": statistics.median(latencies) * 1000,
+            }
+        )
+    return rows
+
+
+def evaluate_ann(
+    corpus: np.ndarray, queries: np.ndarray, k: int, nprobes: list[int]
+) -> tuple[list[dict], float]:
+    """Recall@k and latency of the IVF index for each nprobe, against exact
+    search. Returns the rows and the median exact search time in ms"""
+    documents = [Document(page_content=str(i)) for i in range(len(corpus))]
+    store = QuantizedVectorStore(embedding=None, dtype="float32", ann_min_chunks=0)
+    started = time.perf_counter()
+    store.add_embeddings(corpus.tolist(), documents)
+    build_s = time.perf_counter() - started
+
+    exact, exact_latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        found = store.similarity_search_by_vector(query, k, exact=True)
+        exact_latencies.append(time.perf_counter() - started)
+        exact.append({doc.page_content for doc in found})
+    exact_ms = statistics.median(exact_latencies) * 1000
+
+    rows = [{"nprobe": "exact", "recall": 1.0, "search_ms": exact_ms}]
+    for nprobe in nprobes:
+        recalls, latencies = [], []
+        for query, truth in zip(queries, exact):
+            started = time.perf_counter()
+            found = store.similarity_search_by_vector(query, k, nprobe=nprobe)
+            latencies.append(time.perf_counter() - started)
+            recalls.append(len(truth & {doc.page_content for doc in found}) / k)
+        rows.append(
+            {
+                "nprobe": str(nprobe),
+                "recall": statistics.mean(recalls),
+                "search_ms": statistics.median(latencies) * 1000,
+            }
+        )
+    console.print(
+        f"🏗️  Index build: {build_s:.2f}s for {len(corpus)} vectors "
+        f"({len(store.ann_index.centroids)} lists)",
+        style="blue",
+    )
+    return rows, exact_ms
+
+
+def print_ann_rows(title: str, rows: list[dict], exact_ms: float, k: int):
+    table = Table(title=title, header_style="bold magenta")
+    table.add_column("nprobe", style="cyan", justify="right")
+    table.add_column(f"Recall@{k}", justify="right")
+    table.add_column("Search p50 (ms)", justify="right")
+    table.add_column("Speed-up", justify="right")
+    for row in rows:
+        table.add_row(
+            row["nprobe"],
+            f"{row['recall']:.3f}",
+            f"{row['search_ms']:.2f}",
+            f"{exact_ms / row['search_ms']:.1f}x",
+        )
+    console.print(table)
+
+
+def print_rows(title: str, rows: list[dict], k: int):
+    table = Table(title=title, header_style="bold magenta")
+    table.add_column("Storage", style="cyan")
+    table.add_column("Memory (MiB)", justify="right")
+    table.add_column(f"Recall@{k}", justify="right")
+    table.add_column("Mean |Δscore|", justify="right")
+    table.add_column("Search p50 (ms)", justify="right")
+    for row in rows:
+        table.add_row(
+            row["storage"],
+            f"{row['bytes'] / 1024 / 1024:.2f}",
+            f"{row['recall']:.3f}" if "recall" in row else "-",
+            f"{row['score_error']:.5f}" if "score_error" in row else "-",
+            f"{row['search_ms']:.2f}" if "search_ms" in row else "-",
+        )
+    console.print(table)
+
+
+@app.command()
+def run(
+    chunks: int = typer.Option(5000, help="Size of the dense synthetic corpus"),
+    dimension: int = typer.Option(768, help="Embedding dimension"),
+    queries: int = typer.Option(200, help="Queries per corpus"),
+    k: int = typer.Option(10, help="Results per query"),
+    cv_pages: int = typer.Option(40, help="Size of the synthetic CV corpus"),
+    vectors: Path = typer.Option(
+        None, help=".npy file of real embeddings (rows) to evaluate instead"
+    ),
+    nprobe: str = typer.Option(
+        "1,4,8,16,32", help="Comma-separated ANN nprobe values to sweep"
+    ),
+    seed: int = typer.Option(7, help="Random seed"),
+):
+    """Compare float32, float16 and int8 storage and sweep ANN nprobe"""
+    nprobes = [int(n) for n in nprobe.split(",") if n.strip()]
+    if vectors is not None:
+        corpus = np.load(vectors).astype(np.float32)
+        corpus_queries = perturbed_queries(corpus, queries, seed)
+        title = f"{vectors.name} ({len(corpus)} vectors)"
+    else:
+        corpus = clustered_vectors(chunks, dimension, seed)
+        corpus_queries = perturbed_queries(corpus, queries, seed)
+        title = f"Dense clustered vectors ({chunks} x {dimension})"
+
+    print_rows(f"🎯 {title}", evaluate(corpus, corpus_queries, k), k)
+    if nprobes:
+        rows, exact_ms = evaluate_ann(corpus, corpus_queries, k, nprobes)
+        print_ann_rows(f"🧭 IVF index, {title}", rows, exact_ms, k)
+    if vectors is not None:
+        return
+
+    cv_corpus, cv_queries = cv_vectors(cv_pages, queries, dimension)
+    print_rows(
+        f"🎯 Synthetic CV, {cv_pages} pages ({len(cv_corpus)} chunks)",
+        evaluate(cv_corpus, cv_queries, k),
+        k,
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Retrieval quality against cost for chunking, embedding dimension and k.
+
+A labelled query set is run against a CV for every combination of chunker,
+embedding dimension and k. Each query names the CV text that answers it; a
+chunk containing that text is relevant. Reported per setting:
+
+- Recall@k: share of queries with a relevant chunk in the top k
+- MRR: mean reciprocal rank of the first relevant chunk (over all chunks)
+- Context: characters of the top k chunks, i.e. what the model has to read
+- Index memory, ingestion time (chunking, embedding and indexing) and query
+  latency (query embedding plus search)
+
+Documents are embedded once per chunker at the largest dimension; smaller
+dimensions keep the leading components and are renormalized, which is how
+Matryoshka models such as gemini-embedding-001 are truncated. Backends that
+cannot be truncated that way (the local hashing embedder) are evaluated at
+their own dimension only.
+
+Usage:
+    python -m bench.retrieval                                 # offline, synthetic CV
+    python -m bench.retrieval --cv my_cv.pdf --labels q.jsonl --backend google
+"""
+
+import json
+import random
+import re
+import statistics
+import time
+from pathlib import Path
+import numpy as np
+from langchain_community.document_loaders.parsers import PyPDFParser
+from langchain_core.documents import Document
+from langchain_core.documents.base import Blob
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from rich.console import Console
+from rich.table import Table
+import typer
+
+from bench.cv_fixtures import LINES_PER_PAGE, build_pdf, synthetic_cv_lines
+from cv_chunker import (
+    CV_MAX_CHUNK_CHARS,
+    CV_MIN_CHUNK_CHARS,
+    heading_section,
+    split_cv,
+)
+from vectorstore import VECTOR_STORE_DTYPE, QuantizedVectorStore
+
+console = Console()
+
+app = typer.Typer(
+    name="Draft 'n' Pray retrieval evaluation",
+    help="🔬 Recall@k, MRR, memory and latency across chunking, dimension and k",
+    add_completion=False,
+)
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def load_pdf(data: bytes, name: str) -> list[Document]:
+    """Parse a PDF into pages the way the app does"""
+    blob = Blob.from_data(data, path=name, mime_type="application/pdf")
+    return list(PyPDFParser().lazy_parse(blob))
+
+
+def synthetic_labels(lines: list[str], count: int, seed: int) -> list[dict]:
+    """Queries made from CV lines: a random ~60% of a line's words, in order,
+    labelled with the line itself"""
+    rng = random.Random(seed)
+    candidates = list(
+        dict.fromkeys(
+            line.strip()
+            for line in lines
+            if len(line.split()) >= 4 and heading_section(line) is None
+        )
+    )
+    labels = []
+    for line in rng.sample(candidates, min(count, len(candidates))):
+        words = re.findall(r"[A-Za-z+#]+", line)
+        keep = sorted(rng.sample(range(len(words)), max(2, int(len(words) * 0.6))))
+        labels.append({"query": " ".join(words[i] for i in keep), "answer": line})
+    return labels
+
+
+def load_labels(path: Path) -> list[dict]:
+    """JSON lines of {"query": ..., "answer": text found in the relevant chunk}"""
+    labels = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            record = json.loads(line)
+            labels.append({"query": record["query"], "answer": record["answer"]})
+    return labels
+
+
+def parse_chunkers(spec: str) -> list[tuple[str, int, int]]:
+    """Parse e.g. ``sections:300:1500,window:1000:200`` into (kind, a, b)"""
+    chunkers = []
+    for item in spec.split(","):
+        kind, first, second = item.strip().split(":")
+        if kind not in ("sections", "window"):
+            raise typer.BadParameter(f"Unknown chunker {kind!r}")
+        chunkers.append((kind, int(first), int(second)))
+    return chunkers
+
+
+def chunk(documents: list[Document], kind: str, first: int, second: int):
+    """Chunk with the section chunker (min, max chars) or fixed windows
+    (size, overlap)"""
+    if kind == "sections":
+        return split_cv(documents, min_chars=first, max_chars=second)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=first, chunk_overlap=second)
+    return splitter.split_documents(documents)
+
+
+def truncate(vectors: np.ndarray, dimension: int) -> np.ndarray:
+    """Keep the leading components and renormalize (Matryoshka truncation)"""
+    vectors = vectors[:, :dimension]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def evaluate_chunker(
+    documents: list[Document],
+    labels: list[dict],
+    engine,
+    chunker: tuple[str, int, int],
+    dimensions: list[int],
+    ks: list[int],
+    dtype: str,
+) -> list[dict]:
+    kind, first, second = chunker
+    name = f"{kind} {first}/{second}"
+
+    started = time.perf_counter()
+    chunks = chunk(documents, kind, first, second)
+    chunk_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    doc_vectors = np.asarray(
+        engine.embed_documents([c.page_content for c in chunks]), dtype=np.float32
+    )
+    embed_s = time.perf_counter() - started
+
+    query_vectors, embed_latencies = [], []
+    for label in labels:
+        started = time.perf_counter()
+        query_vectors.append(engine.embed_query(label["query"]))
+        embed_latencies.append(time.perf_counter() - started)
+    query_vectors = np.asarray(query_vectors, dtype=np.float32)
+
+    texts = [_normalize_text(c.page_content) for c in chunks]
+    relevant = [
+        [i for i, text in enumerate(texts) if _normalize_text(label["answer"]) in text]
+        for label in labels
+    ]
+    unanswerable = sum(1 for rows in relevant if not rows)
+    if unanswerable:
+        console.print(
+            f"⚠️  {name}: {unanswerable} answers not found in any chunk "
+            "(counted as misses)",
+            style="yellow",
+        )
+
+    rows = []
+    for dimension in dimensions:
+        if dimension > doc_vectors.shape[1]:
+            console.print(
+                f"⚠️  Skipping {dimension} dimensions: the engine returns "
+                f"{doc_vectors.shape[1]}",
+                style="yellow",
+            )
+            continue
+        store = QuantizedVectorStore(embedding=None, dtype=dtype)
+        started = time.perf_counter()
+        store.add_embeddings(truncate(doc_vectors, dimension).tolist(), chunks)
+        index_s = time.perf_counter() - started
+        queries = truncate(query_vectors, dimension)
+
+        ranks = []
+        for query, rows_relevant in zip(queries, relevant):
+            order = np.argsort(-store.scores(query), kind="stable")
+            hits = np.flatnonzero(np.isin(order, rows_relevant))
+            ranks.append(int(hits[0]) + 1 if len(hits) else None)
+        mrr = statistics.mean(1 / rank if rank else 0.0 for rank in ranks)
+
+        for k in ks:
+            latencies, context = [], []
+            for query, embed_latency in zip(queries, embed_latencies):
+                started = time.perf_counter()
+                found = store.similarity_search_by_vector(query, k)
+                latencies.append(embed_latency + time.perf_counter() - started)
+                context.append(sum(len(doc.page_content) for doc in found))
+            rows.append(
+                {
+                    "chunker": name,
+                    "chunks": len(chunks),
+                    "dimension": dimension,
+                    "k": k,
+                    "recall": statistics.mean(
+                        1.0 if rank and rank <= k else 0.0 for rank in ranks
+                    ),
+                    "mrr": mrr,
+                    "context_chars": statistics.mean(context),
+                    "bytes": store.memory_bytes(),
+                    "ingest_s": chunk_s + embed_s + index_s,
+                    "query_ms": statistics.median(latencies) * 1000,
+                }
+            )
+    return rows
+
+
+def print_rows(title: str, rows: list[dict]):
+    table = Table(title=title, header_style="bold magenta")
+    table.add_column("Chunker", style="cyan")
+    table.add_column("Chunks", justify="right")
+    table.add_column("Dim", justify="right")
+    table.add_column("k", justify="right")
+    table.add_column("Recall@k", justify="right")
+    table.add_column("MRR", justify="right")
+    table.add_column("Context", justify="right")
+    table.add_column("Index (KiB)", justify="right")
+    table.add_column("Ingest (s)", justify="right")
+    table.add_column("Query p50 (ms)", justify="right")
+    for row in rows:
+        table.add_row(
+            row["chunker"],
+            str(row["chunks"]),
+            str(row["dimension"]),
+            str(row["k"]),
+            f"{row['recall']:.3f}",
+            f"{row['mrr']:.3f}",
+            f"{row['context_chars']:.0f}",
+            f"{row['bytes'] / 1024:.1f}",
+            f"{row['ingest_s']:.2f}",
+            f"{row['query_ms']:.2f}",
+        )
+    console.print(table)
+
+
+def recommend(rows: list[dict], tolerance: float):
+    """The setting with the least context (then index memory) whose recall
+    is within ``tolerance`` of the best"""
+    best = max(row["recall"] for row in rows)
+    candidates = [row for row in rows if row["recall"] >= best - tolerance]
+    pick = min(
+        candidates,
+        key=lambda r: (r["context_chars"], r["bytes"], r["query_ms"], -r["mrr"]),
+    )
+    console.print(
+        f"💡 Leanest setting within {tolerance:.2f} of the best recall "
+        f"({best:.3f}): {pick['chunker']}, {pick['dimension']} dimensions, "
+        f"k={pick['k']} (recall {pick['recall']:.3f}, MRR {pick['mrr']:.3f}, "
+        f"{pick['context_chars']:.0f} characters of context)",
+        style="green",
+    )
+
+
+def _int_list(spec: str) -> list[int]:
+    return [int(value) for value in spec.split(",") if value.strip()]
+
+
+@app.command()
+def run(
+    cv: Path = typer.Option(None, help="CV PDF to evaluate (synthetic by default)"),
+    labels: Path = typer.Option(
+        None, help='JSON lines of {"query", "answer"} (generated for the synthetic CV)'
+    ),
+    cv_pages: int = typer.Option(4, help="Size of the synthetic CV"),
+    queries: int = typer.Option(100, help="Generated queries for the synthetic CV"),
+    chunkers: str = typer.Option(
+        f"sections:{CV_MIN_CHUNK_CHARS}:{CV_MAX_CHUNK_CHARS},sections:0:800,"
+        "window:1000:200,window:500:100",
+        help="Comma-separated sections:<min>:<max> or window:<size>:<overlap>",
+    ),
+    dimensions: str = typer.Option("768,512,256", help="Embedding dimensions"),
+    k: str = typer.Option("3,5,10", help="Comma-separated k values"),
+    backend: str = typer.Option(
+        "local", help="Embedding backend (see EMBEDDING_BACKEND); google needs a key"
+    ),
+    api_key: str = typer.Option(
+        None, envvar="GOOGLE_API_KEY", help="Google API key for google backends"
+    ),
+    dtype: str = typer.Option(VECTOR_STORE_DTYPE, help="Vector storage precision"),
+    tolerance: float = typer.Option(
+        0.02, help="Recall a recommended setting may lose against the best"
+    ),
+    output: Path = typer.Option(None, help="Write the rows to this JSON file"),
+    seed: int = typer.Option(7, help="Random seed"),
+):
+    """Evaluate retrieval settings on a labelled query set"""
+    from model import engine_backend_id, get_langchain_embedding_engine
+
+    dims = sorted(_int_list(dimensions), reverse=True)
+    ks = _int_list(k)
+
+    if cv is not None:
+        if labels is None:
+            raise typer.BadParameter("--labels is required with --cv")
+        documents = load_pdf(cv.read_bytes(), cv.name)
+        label_set = load_labels(labels)
+        title = f"{cv.name}, {len(label_set)} queries"
+    else:
+        lines = synthetic_cv_lines(cv_pages, seed)
+        pages = [
+            lines[start : start + LINES_PER_PAGE]
+            for start in range(0, len(lines), LINES_PER_PAGE)
+        ]
+        documents = load_pdf(build_pdf(pages), "synthetic_cv.pdf")
+        label_set = load_labels(labels) if labels else None
+        label_set = label_set or synthetic_labels(lines, queries, seed)
+        title = f"Synthetic CV, {cv_pages} pages, {len(label_set)} queries"
+
+    engine = get_langchain_embedding_engine(api_key, backend)
+    console.print(f"🧠 Embedding backend: {engine_backend_id(engine)}", style="blue")
+    if hasattr(engine, "output_dimensionality"):
+        # Embed at the largest dimension so smaller ones can be truncated from it
+        engine.output_dimensionality = dims[0]
+    else:
+        # Leading components of other backends are not a smaller embedding
+        native = len(engine.embed_query("dimension"))
+        if dims != [native]:
+            console.print(
+                f"⚠️  {engine_backend_id(engine)} vectors cannot be truncated; "
+                f"evaluating {native} dimensions only",
+                style="yellow",
+            )
+        dims = [native]
+
+    rows = []
+    for chunker in parse_chunkers(chunkers):
+        console.print(f"✂️  Evaluating {chunker[0]} {chunker[1]}/{chunker[2]}...")
+        rows += evaluate_chunker(documents, label_set, engine, chunker, dims, ks, dtype)
+
+    print_rows(f"🔬 {title}", rows)
+    if rows:
+        recommend(rows, tolerance)
+    if output is not None:
+        output.write_text(json.dumps(rows, indent=2))
+        console.print(f"💾 Results written to {output}", style="green")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for ingestion, retrieval and chat turns.
+
+Usage:
+    python -m bench.run --output bench_results.json
+    python -m bench.run --baseline bench_results.json
+"""
+
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from rich.console import Console
+from rich.markup import escape
+from rich.table import Table
+import typer
+
+from bench.cv_fixtures import write_synthetic_cv
+from bench.fakes import FakeChatModel, FakeEmbeddings
+from bench.firecrawl_stub import FirecrawlStub
+
+console = Console()
+
+app = typer.Typer(
+    name="Draft 'n' Pray benchmarks",
+    help="📊 Offline benchmarks with fake LLM, fake embeddings and a local Firecrawl",
+    add_completion=False,
+)
+
+RETRIEVAL_QUERIES = [
+    "What are my programming languages?",
+    "Summarize my research experience",
+    "Which publications do I have on graph neural networks?",
+    "What did I study?",
+    "Projects related to reinforcement learning",
+]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bench_ingestion(cv_path: Path, embeddings: FakeEmbeddings) -> float:
+    import tools
+
+    # Start from an empty store that uses the fake engine, with no index to reuse
+    tools.default_kb.activate(None, None, None, [])
+    tools.clear_cv_index_cache()
+    tools.embedding_engine = embeddings
+    started = time.perf_counter()
+    if not tools.initialize_vectorstore_with_cv(str(cv_path)):
+        raise RuntimeError(f"Ingestion failed for {cv_path}")
+    return time.perf_counter() - started
+
+
+def bench_retrieval(queries: int) -> list[float]:
+    from tools import search_cv
+
+    latencies = []
+    for index in range(queries):
+        query = RETRIEVAL_QUERIES[index % len(RETRIEVAL_QUERIES)]
+        started = time.perf_counter()
+        search_cv(query, k=10)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def bench_turns(stream_turn, turns: int, stub_url: str) -> tuple[list, list]:
+    """Time ``turns`` email requests; returns (turn latencies, TTFTs)"""
+    latencies, ttfts = [], []
+    for index in range(turns):
+        # A fresh URL per turn so no crawl is served from the crawl cache
+        message = f"Crawl {stub_url}/lab-{uuid.uuid4().hex[:8]} and write an email"
+        started = time.perf_counter()
+        first_token = None
+        for token, _ in stream_turn(message):
+            if (
+                first_token is None
+                and getattr(token, "type", None) == "AIMessageChunk"
+                and token.content
+            ):
+                first_token = time.perf_counter() - started
+        latencies.append(time.perf_counter() - started)
+        ttfts.append(first_token if first_token is not None else latencies[-1])
+    return latencies, ttfts
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """Print a comparison table; returns True when nothing regressed"""
+    table = Table(title="📊 Baseline Comparison", header_style="bold magenta")
+    table.add_column("Metric", style="cyan")
+    table.add_column("Baseline", justify="right")
+    table.add_column("Current", justify="right")
+    table.add_column("Change", justify="right")
+
+    ok = True
+    for name, value in results["metrics"].items():
+        base = baseline.get("metrics", {}).get(name)
+        if base is None:
+            table.add_row(escape(name), "-", f"{value:.4f}", "new")
+            continue
+        change = (value - base) / base if base else 0.0
+        # Every metric is lower-is-better
+        regressed = change > tolerance
+        ok = ok and not regressed
+        style = "red" if regressed else ("green" if change < -tolerance else "white")
+        table.add_row(
+            escape(name),
+            f"{base:.4f}",
+            f"{value:.4f}",
+            f"[{style}]{change:+.1%}[/{style}]",
+        )
+
+    console.print(table)
+    return ok
+
+
+@app.command()
+def run(
+    cv_pages: str = typer.Option("1,4,16", help="Comma-separated CV sizes in pages"),
+    queries: int = typer.Option(50, help="Retrieval queries per CV size"),
+    turns: int = typer.Option(5, help="Chat turns per entry point"),
+    llm_latency: float = typer.Option(0.3, help="Fake LLM seconds to first token"),
+    token_rate: float = typer.Option(80.0, help="Fake LLM tokens per second"),
+    embed_latency: float = typer.Option(0.05, help="Fake embedding seconds per call"),
+    crawl_latency: float = typer.Option(0.5, help="Fake Firecrawl seconds per crawl"),
+    output: Path = typer.Option(Path("bench_results.json"), help="Results file"),
+    baseline: Path = typer.Option(None, help="Earlier results file to compare to"),
+    tolerance: float = typer.Option(0.15, help="Allowed slowdown before failing"),
+    profile: bool = typer.Option(
+        False, "--profile", help="Profile CPU time and allocations of the run"
+    ),
+    profile_dir: Path = typer.Option(
+        Path("profiles"), "--profile-dir", help="Folder for the profile reports"
+    ),
+):
+    """Run the offline benchmark suite"""
+    settings = dict(
+        cv_pages=cv_pages,
+        queries=queries,
+        turns=turns,
+        llm_latency=llm_latency,
+        token_rate=token_rate,
+        embed_latency=embed_latency,
+        crawl_latency=crawl_latency,
+        output=output,
+        baseline=baseline,
+        tolerance=tolerance,
+    )
+    if not profile:
+        run_suite(**settings)
+        return
+
+    from profiling import profile_run
+
+    report_dir = None
+    try:
+        with profile_run(profile_dir) as report_dir:
+            run_suite(**settings)
+    finally:
+        # The reports are written when the profiling context exits
+        if report_dir is not None:
+            console.print(f"📈 Profile written to {report_dir}", style="cyan")
+
+
+def run_suite(
+    cv_pages: str,
+    queries: int,
+    turns: int,
+    llm_latency: float,
+    token_rate: float,
+    embed_latency: float,
+    crawl_latency: float,
+    output: Path,
+    baseline: Path,
+    tolerance: float,
+):
+    """Run the benchmarks and write (and optionally compare) the results"""
+    # Read first: the baseline may be the file this run overwrites
+    baseline_results = json.loads(baseline.read_text()) if baseline else None
+
+    stub = FirecrawlStub(latency=crawl_latency).start()
+    # Must be set before the app modules read their configuration
+    os.environ["FIRECRAWL_API_URL"] = stub.url
+    os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
+    # Keep the stub's pages out of the real profile store
+    os.environ["PROFILE_STORE_ENABLED"] = "false"
+
+    from agent_graph import build_agent
+    from langgraph.checkpoint.memory import InMemorySaver
+    from pipeline import FastPathPipeline
+    from system_prompt import system_prompt
+    from tools import create_tools_with_api_keys
+
+    metrics = {}
+    embeddings = FakeEmbeddings(latency=embed_latency)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for pages in [int(p) for p in cv_pages.split(",") if p.strip()]:
+                cv_path = write_synthetic_cv(Path(tmp) / f"cv_{pages}.pdf", pages)
+                console.print(f"📄 Benchmarking {pages}-page CV...", style="blue")
+                metrics[f"ingest_s[pages={pages}]"] = bench_ingestion(
+                    cv_path, embeddings
+                )
+                latencies = bench_retrieval(queries)
+                metrics[f"retrieval_p50_ms[pages={pages}]"] = (
+                    statistics.median(latencies) * 1000
+                )
+                metrics[f"retrieval_p95_ms[pages={pages}]"] = (
+                    percentile(latencies, 95) * 1000
+                )
+
+        llm = FakeChatModel(latency=llm_latency, tokens_per_second=token_rate)
+        tools = create_tools_with_api_keys("bench-google-key", "bench-firecrawl-key")
+        agent = build_agent(llm, tools, system_prompt, checkpointer=InMemorySaver())
+        fast_path = FastPathPipeline(llm, "bench-firecrawl-key")
+
+        def agent_turn(message):
+            config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+            return agent.stream(
+                {"messages": [{"role": "user", "content": message}]},
+                config,
+                stream_mode="messages",
+            )
+
+        def fast_path_turn(message):
+            config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+            return fast_path.stream(message, agent, config)
+
+        console.print("🤖 Benchmarking chat turns...", style="blue")
+        for name, stream_turn in [("agent", agent_turn), ("fast_path", fast_path_turn)]:
+            latencies, ttfts = bench_turns(stream_turn, turns, stub.url)
+            metrics[f"turn_p50_s[{name}]"] = statistics.median(latencies)
+            metrics[f"turn_p95_s[{name}]"] = percentile(latencies, 95)
+            metrics[f"ttft_p50_s[{name}]"] = statistics.median(ttfts)
+    finally:
+        stub.stop()
+
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "llm_latency": llm_latency,
+            "token_rate": token_rate,
+            "embed_latency": embed_latency,
+            "crawl_latency": crawl_latency,
+        },
+        "metrics": metrics,
+    }
+
+    table = Table(title="📊 Benchmark Results", header_style="bold magenta")
+    table.add_column("Metric", style="cyan")
+    table.add_column("Value", justify="right")
+    for name, value in metrics.items():
+        table.add_row(escape(name), f"{value:.4f}")
+    console.print(table)
+
+    output.write_text(json.dumps(results, indent=2))
+    console.print(f"💾 Results written to {output}", style="green")
+
+    if baseline_results is not None:
+        if not compare(results, baseline_results, tolerance):
+            console.print("❌ Regression beyond tolerance", style="red")
+            raise typer.Exit(code=1)
+        console.print("✅ No regressions beyond tolerance", style="green")
+
+
+if __name__ == "__main__":
+    app()
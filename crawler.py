@@ -0,0 +1,205 @@
+"""
+Firecrawl access with speculative prefetch and in-flight de-duplication.
+
+When a user message contains a URL the crawl is started in the background
+straight away, while the model is still deciding what to do. When the model
+then calls ``crawl_website`` for the same page the tool picks up the running
+(or finished) crawl instead of starting a new one, taking a full LLM round
+trip off the critical path.
+"""
+
+import contextvars
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+from firecrawl import Firecrawl
+from tracing import span
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CRAWL_PAGE_LIMIT = 10
+CRAWL_PREFETCH_ENABLED = os.getenv("CRAWL_PREFETCH_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# How long a finished crawl is reused before the site is crawled again
+CRAWL_CACHE_TTL = int(os.getenv("CRAWL_CACHE_TTL", "3600"))
+CRAWL_CACHE_MAX_ENTRIES = int(os.getenv("CRAWL_CACHE_MAX_ENTRIES", "64"))
+# Sites crawled at the same time (ranking a list of labs crawls many at once)
+CRAWL_MAX_WORKERS = int(os.getenv("CRAWL_MAX_WORKERS", "4"))
+# Alternative Firecrawl endpoint, e.g. a self-hosted instance or the
+# benchmark stand-in in bench/firecrawl_stub.py
+FIRECRAWL_API_URL = os.getenv("FIRECRAWL_API_URL")
+
+URL_PATTERN = re.compile(r"(?:https?://|www\.)[^\s<>\"'()\[\]]+", re.IGNORECASE)
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so the user's and the model's spelling share a crawl"""
+    url = url.strip().rstrip(".,;:!?")
+    if not re.match(r"^https?://", url, re.IGNORECASE):
+        url = f"https://{url}"
+    parts = urlsplit(url)
+    path = parts.path.rstrip("/")
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), path, parts.query, "")
+    )
+
+
+def find_urls(text: str) -> list[str]:
+    """Return the distinct canonical URLs mentioned in a message, in order"""
+    urls = []
+    for match in URL_PATTERN.findall(text or ""):
+        url = canonicalize_url(match)
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+
+def crawl_result_to_text(result, max_chars: int = 20000) -> str:
+    """Flatten a Firecrawl crawl result into markdown text for a prompt"""
+    if result is None:
+        return ""
+    if isinstance(result, str):
+        return result[:max_chars]
+
+    # Crawl jobs expose their pages as .data (SDK objects) or ["data"] (dicts)
+    pages = getattr(result, "data", None)
+    if pages is None and isinstance(result, dict):
+        pages = result.get("data")
+    if pages is None:
+        pages = result if isinstance(result, list) else [result]
+
+    parts = []
+    for page in pages:
+        text = getattr(page, "markdown", None)
+        if text is None and isinstance(page, dict):
+            text = page.get("markdown") or page.get("content")
+        parts.append(text if text else str(page))
+    return "\n\n---\n\n".join(parts)[:max_chars]
+
+
+class Crawler:
+    """Crawls sites with Firecrawl and shares results between callers.
+
+    Args:
+        api_key: Firecrawl API key
+        limit: Maximum number of pages per crawl
+        ttl: Seconds a finished crawl is reused
+        max_entries: Number of crawls kept before the oldest are dropped
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        limit: int = CRAWL_PAGE_LIMIT,
+        ttl: int = CRAWL_CACHE_TTL,
+        max_entries: int = CRAWL_CACHE_MAX_ENTRIES,
+    ):
+        self.api_key = api_key
+        self.limit = limit
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # canonical url -> (future, started_at)
+        self._crawls = {}
+        self._pool = ThreadPoolExecutor(
+            max_workers=CRAWL_MAX_WORKERS, thread_name_prefix="crawl"
+        )
+
+    def _crawl(self, url: str):
+        with span("crawl.firecrawl", url=url, limit=self.limit):
+            if FIRECRAWL_API_URL:
+                firecrawl = Firecrawl(api_key=self.api_key, api_url=FIRECRAWL_API_URL)
+            else:
+                firecrawl = Firecrawl(api_key=self.api_key)
+            return firecrawl.crawl(url=url, limit=self.limit)
+
+    def _prune(self, now: float):
+        expired = [
+            url
+            for url, (future, started_at) in self._crawls.items()
+            if future.done() and now - started_at > self.ttl
+        ]
+        for url in expired:
+            del self._crawls[url]
+
+        # Drop the oldest finished crawls beyond the size limit
+        finished = sorted(
+            (started_at, url)
+            for url, (future, started_at) in self._crawls.items()
+            if future.done()
+        )
+        for _, url in finished[: max(0, len(self._crawls) - self.max_entries)]:
+            del self._crawls[url]
+
+    def _forget_failure(self, url: str, future: Future):
+        # Failed crawls are not cached so the model can retry them
+        if future.exception() is not None:
+            with self._lock:
+                if self._crawls.get(url, (None,))[0] is future:
+                    del self._crawls[url]
+
+    def is_pending_or_cached(self, url: str) -> bool:
+        with self._lock:
+            return canonicalize_url(url) in self._crawls
+
+    def prefetch(self, url: str) -> Future:
+        """Start crawling a URL in the background unless it already is"""
+        url = canonicalize_url(url)
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            entry = self._crawls.get(url)
+            if entry is not None:
+                return entry[0]
+
+            # Copy the context so the crawl is traced under the current turn
+            future = self._pool.submit(contextvars.copy_context().run, self._crawl, url)
+            self._crawls[url] = (future, now)
+
+        future.add_done_callback(lambda f: self._forget_failure(url, f))
+        return future
+
+    def prefetch_from_text(self, text: str, skip=None) -> list[str]:
+        """Start background crawls for every URL in a user message
+
+        Args:
+            text: The user's message
+            skip: Optional predicate for URLs that need no crawl, e.g. ones
+                with a stored profile
+        """
+        if not CRAWL_PREFETCH_ENABLED or not self.api_key:
+            return []
+
+        urls = [url for url in find_urls(text) if skip is None or not skip(url)]
+        for url in urls:
+            self.prefetch(url)
+        return urls
+
+    def crawl(self, url: str, timeout: float = None):
+        """Return the crawl result for a URL, waiting on a prefetch if one runs
+
+        Args:
+            url: The site to crawl
+            timeout: Seconds to wait before raising TimeoutError; the crawl
+                itself keeps running and is cached when it finishes
+        """
+        return self.prefetch(url).result(timeout=timeout)
+
+
+_crawlers = {}
+_crawlers_lock = threading.Lock()
+
+
+def get_crawler(api_key: str) -> Crawler:
+    """Return the shared crawler for a Firecrawl API key"""
+    with _crawlers_lock:
+        if api_key not in _crawlers:
+            _crawlers[api_key] = Crawler(api_key)
+    return _crawlers[api_key]
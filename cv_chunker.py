@@ -0,0 +1,271 @@
+"""
+Section-aware chunking of CV text.
+
+A CV is a list of sections ("Education", "Experience", ...) made of entries
+(a degree, a position, a publication). Fixed-size character windows cut
+across both, so here each entry becomes one chunk, tagged with its section.
+
+Cues used, from the text pypdf extracts:
+
+- Headings: short lines that are either a known section name (in any case,
+  with or without a trailing colon) or written in capitals. The CV's first
+  line only counts when it is a known section name, since a capitalized
+  first line is usually the owner's name ("JANE DOE").
+- Entries: a line at the left margin starts a new entry once the current
+  one has body lines (indented or bulleted), or when it carries a date or a
+  list marker like "[3]" or "3.". Indented and bulleted lines, and other
+  margin lines, continue the current entry.
+
+Entries shorter than CV_MIN_CHUNK_CHARS are merged with the next entries
+of the same section (e.g. one-line skills or publications), and entries
+longer than CV_MAX_CHUNK_CHARS are split at line boundaries. Chunks do not
+overlap.
+"""
+
+import os
+import re
+from langchain_core.documents import Document
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Entries shorter than this are merged with their neighbours in the section
+CV_MIN_CHUNK_CHARS = int(os.getenv("CV_MIN_CHUNK_CHARS", "300"))
+# Entries longer than this are split at line boundaries
+CV_MAX_CHUNK_CHARS = int(os.getenv("CV_MAX_CHUNK_CHARS", "1500"))
+
+# Part of the upload fingerprint: bump when the chunking rules change
+CHUNKER_VERSION = "cv-sections-2"
+
+# Canonical section -> headings that name it (lowercase, without punctuation)
+SECTION_ALIASES = {
+    "summary": ["summary", "profile", "objective", "about me", "professional summary"],
+    "education": [
+        "education",
+        "academic background",
+        "academic qualifications",
+        "qualifications",
+    ],
+    "experience": [
+        "experience",
+        "work experience",
+        "professional experience",
+        "research experience",
+        "employment",
+        "employment history",
+        "work history",
+    ],
+    "publications": [
+        "publications",
+        "selected publications",
+        "papers",
+        "conference papers",
+        "journal articles",
+    ],
+    "projects": ["projects", "selected projects", "research projects"],
+    "research": ["research", "research interests", "interests"],
+    "skills": ["skills", "technical skills", "technical expertise", "tools"],
+    "awards": [
+        "awards",
+        "honors",
+        "honours",
+        "awards and honors",
+        "honors and awards",
+        "achievements",
+        "scholarships",
+        "fellowships",
+    ],
+    "teaching": ["teaching", "teaching experience"],
+    "certifications": ["certifications", "certificates", "courses"],
+    "service": [
+        "service",
+        "activities",
+        "leadership",
+        "volunteering",
+        "volunteer experience",
+        "extracurricular activities",
+    ],
+    "languages": ["languages"],
+    "references": ["references"],
+}
+_ALIAS_TO_SECTION = {
+    alias: section for section, aliases in SECTION_ALIASES.items() for alias in aliases
+}
+
+# Section of the text before the first heading (name, contact details)
+HEADER_SECTION = "header"
+
+_BULLET = re.compile(r"^\s*([-–•▪◦●*·]|\(?[a-z]\))\s+")
+_LIST_MARKER = re.compile(r"^\s*(\[\d+\]|\d{1,3}[.)])\s+")
+_DATE = re.compile(
+    r"\b(19|20)\d{2}\b|\bpresent\b|\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov"
+    r"|dec)[a-z]*\.?\s+\d{4}",
+    re.IGNORECASE,
+)
+
+
+def heading_section(line: str, known_only: bool = False):
+    """Canonical section name if ``line`` is a heading, otherwise None
+
+    Args:
+        line: A line of CV text
+        known_only: Only accept known section names, not unknown headings
+            set in capitals
+    """
+    text = line.strip()
+    if not text or len(text) > 50 or len(text.split()) > 6:
+        return None
+    if _BULLET.match(text) or _LIST_MARKER.match(text) or text[-1] in ".,;":
+        return None
+
+    name = re.sub(r"[^a-z& ]", "", text.lower()).replace("&", "and").strip()
+    name = " ".join(name.split())
+    if name in _ALIAS_TO_SECTION:
+        return _ALIAS_TO_SECTION[name]
+    if known_only:
+        return None
+    # Unknown headings count when set in capitals, e.g. "INVITED TALKS"
+    letters = [c for c in text if c.isalpha()]
+    if len(letters) >= 4 and text.upper() == text and not _DATE.search(text):
+        return name.replace(" ", "_") or None
+    return None
+
+
+def _is_body_line(line: str) -> bool:
+    return line[:1].isspace() or bool(_BULLET.match(line))
+
+
+class _Entry:
+    def __init__(self, section: str, heading: str, page):
+        self.section = section
+        self.heading = heading
+        self.page = page
+        self.lines = []
+        self.has_body = False
+
+    def text(self) -> str:
+        return "\n".join(self.lines).strip()
+
+
+def _entries(documents: list[Document]) -> list[_Entry]:
+    """Group the lines of all pages into entries, following sections across
+    page breaks"""
+    entries = []
+    section, heading = HEADER_SECTION, ""
+    current = None
+    first_line = True
+
+    for document in documents:
+        page = document.metadata.get("page")
+        for line in document.page_content.splitlines():
+            if not line.strip():
+                # A blank line always ends an entry
+                current = None
+                continue
+
+            # A capitalized first line is the name, not a section
+            found = heading_section(line, known_only=first_line)
+            first_line = False
+            if found is not None:
+                section, heading = found, line.strip().rstrip(":")
+                current = None
+                continue
+
+            starts_entry = current is None or (
+                not _is_body_line(line)
+                and (
+                    current.has_body
+                    or bool(_DATE.search(line))
+                    or bool(_LIST_MARKER.match(line))
+                )
+            )
+            if starts_entry:
+                current = _Entry(section, heading, page)
+                entries.append(current)
+            elif _is_body_line(line):
+                current.has_body = True
+            current.lines.append(line.rstrip())
+    return [entry for entry in entries if entry.text()]
+
+
+def _pieces(text: str, max_chars: int) -> list[str]:
+    """Split an oversized entry at line boundaries"""
+    pieces, current = [], []
+    for line in text.splitlines():
+        if current and len("\n".join(current + [line])) > max_chars:
+            pieces.append("\n".join(current))
+            current = []
+        current.append(line)
+    pieces.append("\n".join(current))
+    return pieces
+
+
+def split_cv(
+    documents: list[Document],
+    min_chars: int = CV_MIN_CHUNK_CHARS,
+    max_chars: int = CV_MAX_CHUNK_CHARS,
+) -> list[Document]:
+    """Split CV pages into one chunk per entry.
+
+    Args:
+        documents: The CV's pages, as loaded from the PDF
+        min_chars: Entries shorter than this are merged within their section
+        max_chars: Entries longer than this are split at line boundaries
+
+    Returns:
+        Chunks whose text starts with their section heading, with "section",
+        "heading", "page" and "source" metadata
+    """
+    source = documents[0].metadata.get("source") if documents else None
+    groups = []
+    for entry in _entries(documents):
+        last = groups[-1] if groups else None
+        if (
+            last is not None
+            and last["section"] == entry.section
+            and len(last["text"]) < min_chars
+            and len(last["text"]) + len(entry.text()) < max_chars
+        ):
+            last["text"] += "\n" + entry.text()
+        else:
+            groups.append(
+                {
+                    "section": entry.section,
+                    "heading": entry.heading,
+                    "page": entry.page,
+                    "text": entry.text(),
+                }
+            )
+
+    # A short group left at the end of a section joins the one before it
+    for index in range(len(groups) - 1, 0, -1):
+        group, previous = groups[index], groups[index - 1]
+        if (
+            len(group["text"]) < min_chars
+            and previous["section"] == group["section"]
+            and len(previous["text"]) + len(group["text"]) < max_chars
+        ):
+            previous["text"] += "\n" + group.pop("text")
+            del groups[index]
+
+    chunks = []
+    for group in groups:
+        for piece in _pieces(group["text"], max_chars):
+            content = f"{group['heading']}\n{piece}" if group["heading"] else piece
+            chunks.append(
+                Document(
+                    page_content=content,
+                    metadata={
+                        "source": source,
+                        "page": group["page"],
+                        "section": group["section"],
+                        "heading": group["heading"],
+                    },
+                )
+            )
+    return chunks
+
+
+def sections_of(chunks: list[Document]) -> list[str]:
+    """Sections present in a list of chunks, in document order"""
+    return list(dict.fromkeys(chunk.metadata.get("section") for chunk in chunks))
@@ -0,0 +1,119 @@
+"""
+Background CV ingestion.
+
+Parsing and embedding a CV takes seconds to minutes, so the Streamlit app
+submits it here instead of blocking the script run. A job records its
+progress (pages parsed, chunks embedded) for the UI to poll. A job only
+builds the index: the session that submitted it activates it once it is
+complete, so chat keeps working with the previous CV, or without one,
+until then, and other sessions never see it.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tools import build_cv_index
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# CV ingestions processed at the same time (across all sessions)
+CV_INGEST_WORKERS = int(os.getenv("CV_INGEST_WORKERS", "2"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=CV_INGEST_WORKERS, thread_name_prefix="cv-ingest"
+)
+
+
+class CVIngestJob:
+    """Progress and outcome of one background CV ingestion.
+
+    Args:
+        data: The CV PDF's content
+        api_key: Google API key for the embedding engine
+        name: Name shown to the user, e.g. the uploaded file name
+
+    Attributes:
+        index: The built index once the job is done, for the submitting
+            session to activate (``CVKnowledgeBase.activate``)
+    """
+
+    def __init__(self, data: bytes, api_key: str, name: str):
+        self.data = data
+        self.api_key = api_key
+        self.name = name
+        self.index = None
+        self.state = "queued"
+        self.pages = 0
+        self.chunks = 0
+        self.embedded = 0
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def _progress(self, stage: str, **counts):
+        with self._lock:
+            self.state = {"parsing": "parsing", "embedding": "embedding"}.get(
+                stage, self.state
+            )
+            self.pages = counts.get("pages", self.pages)
+            self.chunks = counts.get("chunks", self.chunks)
+            self.embedded = counts.get("embedded", self.embedded)
+            self.error = counts.get("error", self.error)
+
+    def run(self):
+        try:
+            index = build_cv_index(self.data, self.name, self.api_key, self._progress)
+        except Exception as e:
+            index = None
+            self._progress("failed", error=str(e))
+        finally:
+            # The index holds the text now; don't keep the PDF alive with the job
+            self.data = None
+
+        with self._lock:
+            self.index = index
+            self.state = "done" if index is not None else "failed"
+            if index is None and self.error is None:
+                self.error = "CV processing failed"
+            self.finished_at = time.time()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed")
+
+    @property
+    def fraction(self) -> float:
+        """Overall progress in [0, 1]; parsing counts as the first 10%"""
+        if self.state == "done":
+            return 1.0
+        if self.state == "embedding" and self.chunks:
+            return 0.1 + 0.9 * self.embedded / self.chunks
+        return 0.05 if self.state == "parsing" else 0.0
+
+    def describe(self) -> str:
+        """One-line status for progress displays"""
+        if self.state == "queued":
+            return f"⏳ {self.name}: waiting for a worker..."
+        if self.state == "parsing":
+            return f"📖 {self.name}: parsed {self.pages} pages"
+        if self.state == "embedding":
+            return f"🧠 {self.name}: embedded {self.embedded}/{self.chunks} chunks"
+        if self.state == "done":
+            elapsed = self.finished_at - self.submitted_at
+            return (
+                f"✅ {self.name}: {self.pages} pages, {self.chunks} chunks "
+                f"indexed in {elapsed:.1f}s"
+            )
+        return f"❌ {self.name}: {self.error}"
+
+
+def submit_cv_ingest(data: bytes, api_key: str, name: str) -> CVIngestJob:
+    """Start indexing a CV in the background and return its job"""
+    job = CVIngestJob(data, api_key, name)
+    # Copy the context so the ingestion spans join the caller's trace
+    _executor.submit(contextvars.copy_context().run, job.run)
+    return job
@@ -0,0 +1,232 @@
+"""
+Deterministic fit score between a professor's research and the loaded CV.
+
+The drafting prompt used to ask the model for a "possible fit percentage",
+which cost generation tokens and changed from one run to the next. Here the
+score is computed locally:
+
+- Semantic match: each research topic of the professor (an interest or a
+  publication title, see profiles.profile_topics) is embedded and compared
+  with every CV chunk in one matrix product. A topic's best similarity is
+  mapped to [0, 1] over the embedding backend's similarity range, and the
+  topics are averaged.
+- Keyword overlap: the share of the topics' keywords (words and word pairs,
+  without stopwords) that also appear in the CV.
+
+The score is the weighted sum of both, as a percentage. The same page and
+CV always give the same score, and the only remote calls are the topic
+embeddings. The best matching (topic, CV chunk) pairs are kept as evidence.
+"""
+
+import os
+import re
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from profiles import ProfessorProfile, profile_topics
+
+load_dotenv()
+
+# Weight of the semantic match; keyword overlap gets the rest
+FIT_SEMANTIC_WEIGHT = float(os.getenv("FIT_SEMANTIC_WEIGHT", "0.7"))
+# Matching (topic, CV chunk) pairs reported with a score
+FIT_EVIDENCE_COUNT = int(os.getenv("FIT_EVIDENCE_COUNT", "3"))
+# "low,high" cosine similarities that map to 0% and 100% semantic match;
+# unset uses the embedding backend's range from SIMILARITY_RANGES
+FIT_SIMILARITY_RANGE = os.getenv("FIT_SIMILARITY_RANGE")
+
+# Backend id prefix -> similarity range of unrelated and closely related text
+SIMILARITY_RANGES = {
+    "google": (0.55, 0.85),
+    "local": (0.05, 0.45),
+}
+DEFAULT_SIMILARITY_RANGE = (0.3, 0.8)
+
+STOPWORDS = set("""
+    a about above across after again against all also among an and any are as
+    at based be been being between both but by can could do does during each
+    for from further had has have how however i in into is it its itself many
+    more most my new no not of on one or other our out over own same several
+    so some such than that the their them then there these they this those
+    through to toward towards under until up upon us use used using via was we
+    well were what when where which while who whom why will with within
+    without work works would you your lab group research university professor
+    department prof dr phd student students paper papers publications
+    conference journal proceedings vol pp et al
+    """.split())
+_WORD = re.compile(r"[a-z][a-z0-9+#-]*[a-z0-9+#]|[a-z]")
+
+
+def _stem(word: str) -> str:
+    """Light plural stripping, so "networks" and "network" match"""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def keywords(text: str) -> set:
+    """Words (3+ letters, no stopwords) and adjacent word pairs of a text"""
+    words = [
+        _stem(word)
+        for word in _WORD.findall(text.lower())
+        if len(word) >= 3 and word not in STOPWORDS
+    ]
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def similarity_range(backend: str = None) -> tuple:
+    """(low, high) similarity range for an embedding backend id"""
+    if FIT_SIMILARITY_RANGE:
+        low, high = (float(v) for v in FIT_SIMILARITY_RANGE.split(","))
+        return low, high
+    prefix = (backend or "").split(":")[0]
+    return SIMILARITY_RANGES.get(prefix, DEFAULT_SIMILARITY_RANGE)
+
+
+class FitScore:
+    """A fit score and the evidence behind it.
+
+    Attributes:
+        score: Fit percentage (0-100)
+        semantic: Semantic match in [0, 1]
+        keyword: Keyword overlap in [0, 1]
+        topics: The professor's research topics that were scored
+        shared_keywords: Topic keywords also found in the CV
+        evidence: Best matching pairs as dicts with "topic", "section",
+            "excerpt", "similarity" and "shared"
+    """
+
+    def __init__(self, score, semantic, keyword, topics, shared_keywords, evidence):
+        self.score = score
+        self.semantic = semantic
+        self.keyword = keyword
+        self.topics = topics
+        self.shared_keywords = shared_keywords
+        self.evidence = evidence
+
+    def to_markdown(self, name: str = None) -> str:
+        """The score as a tool result for the model"""
+        if not self.topics:
+            return (
+                "## 🎯 Fit score unavailable\n\nNo research interests or "
+                "publications were found on the page."
+            )
+        who = f" of {name}" if name else ""
+        lines = [
+            f"## 🎯 Fit score: {self.score}%",
+            "",
+            f"Computed locally from {len(self.topics)} research topics{who} "
+            f"against the CV (semantic match {self.semantic:.2f}, keyword "
+            f"overlap {self.keyword:.2f}). Report this score as the fit "
+            "percentage; do not estimate a different one.",
+            "",
+            "**Top matching evidence**",
+        ]
+        for number, item in enumerate(self.evidence, start=1):
+            shared = f"; shared: {', '.join(item['shared'])}" if item["shared"] else ""
+            lines.append(
+                f"{number}. *{item['topic']}* ↔ {item['section']}: "
+                f"\"{item['excerpt']}\" (similarity {item['similarity']:.2f}{shared})"
+            )
+        return "\n".join(lines)
+
+
+# id of the store -> (store, chunk keyword sets, CV keyword set); one entry,
+# the CV index scored last
+_cv_keywords = {}
+_cv_keywords_lock = threading.Lock()
+
+
+def cv_keywords(store) -> tuple:
+    """Keyword sets of a store's chunks and of the whole CV (cached)"""
+    with _cv_keywords_lock:
+        entry = _cv_keywords.get(id(store))
+    if entry is None or entry[0] is not store:
+        chunk_keywords = [keywords(doc.page_content) for doc in store.documents]
+        everything = set().union(*chunk_keywords) if chunk_keywords else set()
+        entry = (store, chunk_keywords, everything)
+        with _cv_keywords_lock:
+            _cv_keywords.clear()
+            _cv_keywords[id(store)] = entry
+    return entry[1], entry[2]
+
+
+def fit_from_similarities(
+    similarities: np.ndarray, topics: list[str], store
+) -> FitScore:
+    """Score a professor from the similarities of their topics (rows) to the
+    store's chunks (columns)"""
+    if not topics or similarities.size == 0:
+        return FitScore(0, 0.0, 0.0, topics, [], [])
+
+    low, high = similarity_range(getattr(store, "backend", None))
+    best_chunk = similarities.argmax(axis=1)
+    best = similarities[np.arange(len(topics)), best_chunk]
+    semantic = float(np.clip((best - low) / (high - low), 0.0, 1.0).mean())
+
+    chunk_keywords, all_keywords = cv_keywords(store)
+    topic_keywords = [keywords(topic) for topic in topics]
+    wanted = set().union(*topic_keywords)
+    shared = wanted & all_keywords
+    keyword = len(shared) / len(wanted) if wanted else 0.0
+
+    score = FIT_SEMANTIC_WEIGHT * semantic + (1 - FIT_SEMANTIC_WEIGHT) * keyword
+    documents = store.documents
+    evidence, seen = [], set()
+    for row in np.argsort(-best, kind="stable"):
+        chunk = int(best_chunk[row])
+        if chunk in seen:
+            continue
+        seen.add(chunk)
+        document = documents[chunk]
+        body = document.page_content.split("\n", 1)[-1]
+        evidence.append(
+            {
+                "topic": topics[row],
+                "section": document.metadata.get("section", "cv"),
+                "excerpt": " ".join(body.split())[:200],
+                "similarity": float(best[row]),
+                "shared": sorted(
+                    word
+                    for word in topic_keywords[row] & chunk_keywords[chunk]
+                    if " " not in word
+                )[:5],
+            }
+        )
+        if len(evidence) >= FIT_EVIDENCE_COUNT:
+            break
+
+    return FitScore(
+        int(round(100 * score)),
+        semantic,
+        keyword,
+        topics,
+        sorted(word for word in shared if " " not in word),
+        evidence,
+    )
+
+
+def score_topics(topics: list[str], store) -> FitScore:
+    """Fit score of a professor's research topics against a CV index.
+
+    Args:
+        topics: Research interests and publication titles
+        store: The CV's QuantizedVectorStore
+    """
+    if not topics or len(store) == 0:
+        return FitScore(0, 0.0, 0.0, topics, [], [])
+    vectors = store.embedding.embed_documents(topics)
+    return fit_from_similarities(store.score_matrix(vectors), topics, store)
+
+
+def score_fit(profile: ProfessorProfile, store, text: str = "") -> FitScore:
+    """Fit score of a professor's profile against a CV index.
+
+    Args:
+        profile: Profile extracted from the professor's website
+        store: The CV's QuantizedVectorStore
+        text: The website text, used for topics when the profile has none
+    """
+    return score_topics(profile_topics(profile, text), store)
@@ -0,0 +1,90 @@
+"""
+Local embedding backend that runs on the CPU without any API.
+
+HashingEmbeddings maps a text to a fixed-size vector by hashing its words
+and character n-grams (the "hashing trick"), with sublinear term counts and
+L2 normalization. It needs no model download or network access, is
+deterministic across processes, and handles typos and word variants
+("optimise" / "optimization") through the shared n-grams. Its retrieval
+quality is below a neural embedding model, but it keeps CV search and the
+semantic cache working offline or when the Google quota is exhausted.
+"""
+
+import os
+import re
+import zlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Size of the local embedding vectors
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "768"))
+
+# Bump when the features change, so indexes built with the old ones are not
+# searched with the new ones
+LOCAL_EMBEDDING_VERSION = "v1"
+
+_WORD = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """Hashed word and character n-gram embeddings.
+
+    Args:
+        dimension: Vector size
+        ngram_range: Smallest and largest character n-gram taken from each
+            word (padded with spaces)
+        char_weight: Weight of the character n-grams relative to whole words
+    """
+
+    def __init__(
+        self,
+        dimension: int = LOCAL_EMBEDDING_DIM,
+        ngram_range: tuple = (3, 5),
+        char_weight: float = 0.5,
+    ):
+        self.dimension = dimension
+        self.ngram_range = ngram_range
+        self.char_weight = char_weight
+
+    @property
+    def backend_id(self) -> str:
+        low, high = self.ngram_range
+        return (
+            f"local:hashing-{self.dimension}-{low}{high}-"
+            f"{self.char_weight:g}-{LOCAL_EMBEDDING_VERSION}"
+        )
+
+    def _features(self, text: str):
+        """(feature, weight) pairs of a text"""
+        low, high = self.ngram_range
+        for word in _WORD.findall(text.lower()):
+            yield "w:" + word, 1.0
+            padded = f" {word} "
+            for n in range(low, high + 1):
+                for start in range(len(padded) - n + 1):
+                    yield "c:" + padded[start : start + n], self.char_weight
+
+    def _vector(self, text: str) -> np.ndarray:
+        counts = {}
+        for feature, weight in self._features(text):
+            counts[feature] = counts.get(feature, 0.0) + weight
+
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature, count in counts.items():
+            digest = zlib.crc32(feature.encode("utf-8"))
+            # The sign bit keeps colliding features from only ever adding up
+            sign = 1.0 if digest & 1 else -1.0
+            vector[(digest >> 1) % self.dimension] += sign * np.log1p(count)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._vector(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._vector(text).tolist()
@@ -1,104 +1,353 @@
 import os
+import functools
+import hashlib
+import re
+import threading
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain.embeddings.base import Embeddings
+from langchain_core.messages import AIMessage, HumanMessage
 from google import genai
 from google.genai import types
+from local_embeddings import HashingEmbeddings
+from resilience import (
+    CHAT_TIMEOUT_SECONDS,
+    CircuitOpenError,
+    GuardedEmbeddings,
+    get_breaker,
+    get_call_policy,
+)
+from usage import usage_callback
 
 load_dotenv()
 
+# Chat model settings, also used to key the response cache
+CHAT_MODEL = os.getenv("MAIN_MODEL", "gemini-2.5-flash")
+CHAT_TEMPERATURE = 0.7
+# Embedding model of the google backends
+EMBEDDING_MODEL = "gemini-embedding-001"
+# Vector size requested by the google-genai backend (Matryoshka truncation);
+# see `python -m bench.retrieval`
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "768"))
+# Embedding backend of the CV index and the semantic cache: "google" (LangChain
+# integration), "google-genai" (google-genai client, EMBEDDING_DIMENSIONS) or
+# "local" (offline, see local_embeddings.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "google").lower()
 
-def get_model(api_key: str):
+# Model tiers: "main" drafts emails and SOPs, "fast" plans tool calls and
+# answers questions about the CV
+MODEL_TIERS = {
+    "main": (CHAT_MODEL, CHAT_TEMPERATURE),
+    "fast": (
+        os.getenv("FAST_MODEL", "gemini-2.5-flash-lite"),
+        float(os.getenv("FAST_MODEL_TEMPERATURE", "0.2")),
+    ),
+}
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+
+# A turn asking for one of these is a drafting turn
+_DRAFTING_REQUEST = re.compile(
+    r"\b(write|draft|compose|rewrite|revise|polish|e-?mail|mail|letter|sop|"
+    r"statement of purpose)\b",
+    re.IGNORECASE,
+)
+# An assistant answer starting with a subject line or salutation is a draft
+_DRAFT_MARKER = re.compile(r"^\W*(subject\W*:|dear\s)", re.IGNORECASE | re.MULTILINE)
+
+
+def is_email_draft(text: str) -> bool:
+    """Whether an assistant answer is an email draft"""
+    return bool(text) and bool(_DRAFT_MARKER.search(text))
+
+
+class ResilientChatGoogleGenerativeAI(ChatGoogleGenerativeAI):
+    """ChatGoogleGenerativeAI whose calls follow the call policy of its tier:
+    per-attempt timeouts, jittered retries and, for non-streaming calls,
+    hedging"""
+
+    tier: str = "main"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        kwargs.pop("stream", None)
+        generate = functools.partial(
+            super()._generate, messages, stop, run_manager, **kwargs
+        )
+        return get_call_policy(f"chat.{self.tier}").run(generate)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        kwargs.pop("stream", None)
+        open_stream = functools.partial(
+            super()._stream, messages, stop, run_manager, **kwargs
+        )
+        yield from get_call_policy(f"chat.{self.tier}").stream(open_stream)
+
+
+def get_model(api_key: str, tier: str = "main"):
+    model, temperature = MODEL_TIERS[tier]
     # Pass the key directly instead of relying on environment variables
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash", temperature=0.7, google_api_key=api_key
+    return ResilientChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        google_api_key=api_key,
+        callbacks=[usage_callback],
+        # Recorded with each call's token usage
+        metadata={"model_tier": tier},
+        tier=tier,
+        # Retries are made by the call policy, so the client makes one attempt
+        timeout=CHAT_TIMEOUT_SECONDS,
+        max_retries=1,
     )
 
 
+class ModelRouter:
+    """Chooses the model tier of each agent step.
+
+    Steps of turns that only ask about the CV or the web, and the tool
+    planning step of drafting turns, run on the fast tier. Once tool
+    results are in, drafting turns continue on the main tier. A message
+    that follows a draft ("add a P.S. about my GPA") revises it, whatever
+    its wording, and runs on the main tier from the start. If the fast
+    tier answers a drafting request without calling a tool, its answer is
+    dropped and the main tier writes it (``escalate``).
+
+    Args:
+        models: Chat model per tier, with "main" and "fast" keys
+    """
+
+    main_tier = "main"
+
+    def __init__(self, models: dict):
+        self.models = models
+
+    @staticmethod
+    def is_drafting(messages: list) -> bool:
+        """Whether the latest user message asks for an email, SOP or letter,
+        or follows up on a draft"""
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                if _DRAFTING_REQUEST.search(str(message.content)):
+                    return True
+                break
+        return ModelRouter.follows_draft(messages)
+
+    @staticmethod
+    def follows_draft(messages: list) -> bool:
+        """Whether the assistant's last answer before the latest user message
+        was an email draft"""
+        human = False
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                human = True
+            elif human and isinstance(message, AIMessage) and message.text:
+                return is_email_draft(message.text)
+        return False
+
+    def route(self, messages: list) -> tuple[str, bool]:
+        """Tier of the next step, and whether it must be escalated to the
+        main tier if it answers instead of calling tools"""
+        if not self.is_drafting(messages):
+            return "fast", False
+        if isinstance(messages[-1], HumanMessage) and not self.follows_draft(messages):
+            return "fast", True
+        return self.main_tier, False
+
+
+def get_router(api_key: str):
+    """A ModelRouter over both tiers, or None when routing is disabled"""
+    if not MODEL_ROUTING_ENABLED:
+        return None
+    return ModelRouter({tier: get_model(api_key, tier) for tier in MODEL_TIERS})
+
+
+def _breaker_name(backend: str, api_key: str = None) -> str:
+    """Breaker name of a backend; each API key has its own health state"""
+    if not api_key:
+        return backend
+    return f"{backend}#{hashlib.sha256(api_key.encode()).hexdigest()[:8]}"
+
+
 class CustomGoogleGenAIEmbeddings(Embeddings):
+    """Embeddings from the google-genai client, falling back to the LangChain
+    integration. Both backends go through shared circuit breakers, so a
+    broken client is skipped without a request until its next probe."""
+
     def __init__(
         self,
-        model: str = "gemini-embedding-001",
-        output_dimensionality: int = 768,
+        model: str = EMBEDDING_MODEL,
+        output_dimensionality: int = EMBEDDING_DIMENSIONS,
         api_key: str = None,
     ):
+        self.model = model
+        self.output_dimensionality = output_dimensionality
+        self.api_key = api_key
+        self.breaker = get_breaker(_breaker_name("embeddings.genai", api_key))
+        self._fallback = None
+        self._fallback_lock = threading.Lock()
         try:
             if api_key:
                 # Use the new API key parameter in the client constructor
                 self.client = genai.Client(api_key=api_key)
             else:
                 self.client = genai.Client()
-            self.model = model
-            self.output_dimensionality = output_dimensionality
             self.use_custom = True
         except Exception as e:
             # Fallback to LangChain integration if custom implementation fails
             print(f"Warning: Custom embedding failed, using LangChain fallback: {e}")
             self.use_custom = False
-            self.langchain_embeddings = GoogleGenerativeAIEmbeddings(
-                model=model,
-                google_api_key=api_key,
-                task_type="retrieval_document",
-                title="CV Document",
-            )
+
+    @property
+    def backend_id(self) -> str:
+        return f"google:{self.model}@{self.output_dimensionality}"
+
+    @property
+    def langchain_embeddings(self) -> Embeddings:
+        """The LangChain fallback, created the first time it is needed"""
+        with self._fallback_lock:
+            if self._fallback is None:
+                # Same dimensions, so vectors from both backends fit one index
+                self._fallback = _guarded_langchain_embeddings(
+                    self.api_key, self.output_dimensionality
+                )
+            return self._fallback
+
+    def _embed(self, contents):
+        result = self.client.models.embed_content(
+            model=self.model,
+            contents=contents,
+            config=types.EmbedContentConfig(
+                output_dimensionality=self.output_dimensionality
+            ),
+        )
+        return [embedding.values for embedding in result.embeddings]
 
     def embed_query(self, text: str) -> list[float]:
-        if hasattr(self, "use_custom") and self.use_custom:
+        if self.use_custom:
             try:
-                result = self.client.models.embed_content(
-                    model=self.model,
-                    contents=text,
-                    config=types.EmbedContentConfig(
-                        output_dimensionality=self.output_dimensionality
-                    ),
-                )
-                [embedding_obj] = result.embeddings
-                return embedding_obj.values
+                [embedding] = self.breaker.call(self._embed, text)
+                return embedding
+            except CircuitOpenError:
+                pass
             except Exception as e:
                 print(f"Custom embedding failed, falling back to LangChain: {e}")
-                return self.langchain_embeddings.embed_query(text)
-        else:
-            return self.langchain_embeddings.embed_query(text)
+        return self.langchain_embeddings.embed_query(text)
 
     def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        if hasattr(self, "use_custom") and self.use_custom:
+        if self.use_custom:
             try:
-                result = self.client.models.embed_content(
-                    model=self.model,
-                    contents=texts,
-                    config=types.EmbedContentConfig(
-                        output_dimensionality=self.output_dimensionality
-                    ),
-                )
-                return [embedding.values for embedding in result.embeddings]
+                return self.breaker.call(self._embed, texts)
+            except CircuitOpenError:
+                pass
             except Exception as e:
                 print(f"Custom embedding failed, falling back to LangChain: {e}")
-                return self.langchain_embeddings.embed_documents(texts)
-        else:
-            return self.langchain_embeddings.embed_documents(texts)
+        return self.langchain_embeddings.embed_documents(texts)
 
 
-def get_embedding_engine(api_key: str = None):
-    return CustomGoogleGenAIEmbeddings(
-        model="gemini-embedding-001", output_dimensionality=768, api_key=api_key
+def _guarded_langchain_embeddings(
+    api_key: str = None, output_dimensionality: int = None
+) -> GuardedEmbeddings:
+    embed_kwargs = {}
+    if output_dimensionality:
+        embed_kwargs["output_dimensionality"] = output_dimensionality
+    return GuardedEmbeddings(
+        GoogleGenerativeAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            google_api_key=api_key,
+            task_type="retrieval_document",
+            title="CV Document",
+            **embed_kwargs,
+        ),
+        get_breaker(_breaker_name("embeddings.langchain", api_key)),
     )
 
 
-def get_langchain_embedding_engine(api_key: str = None):
-    """Get embedding engine using LangChain integration (more reliable)"""
+def _google_embeddings(api_key: str = None) -> Embeddings:
     try:
-        return GoogleGenerativeAIEmbeddings(
-            model="gemini-embedding-001",
-            google_api_key=api_key,
-            task_type="retrieval_document",
-            title="CV Document",
-        )
+        return _guarded_langchain_embeddings(api_key)
     except Exception as e:
         print(f"LangChain embedding engine failed: {e}")
         # Fallback to custom implementation
         return CustomGoogleGenAIEmbeddings(
-            model="gemini-embedding-001", output_dimensionality=768, api_key=api_key
+            model=EMBEDDING_MODEL,
+            output_dimensionality=EMBEDDING_DIMENSIONS,
+            api_key=api_key,
+        )
+
+
+# Backend name -> (factory taking the API key, id of the vectors it produces)
+_embedding_backends = {}
+
+
+def register_embedding_backend(name: str, factory, backend_id: str):
+    """Make an embedding backend selectable with EMBEDDING_BACKEND.
+
+    Args:
+        name: Backend name, e.g. "local"
+        factory: Callable taking the API key (which may be None) and returning
+            an Embeddings instance
+        backend_id: Identifies the model and settings behind the vectors;
+            indexes built with different ids are never mixed
+    """
+    _embedding_backends[name] = (factory, backend_id)
+
+
+def embedding_backends() -> list[str]:
+    """Names of the registered embedding backends"""
+    return list(_embedding_backends)
+
+
+def _backend(name: str = None):
+    name = (name or EMBEDDING_BACKEND).lower()
+    if name not in _embedding_backends:
+        raise ValueError(
+            f"Unknown embedding backend {name!r}; use one of "
+            f"{', '.join(_embedding_backends)}"
         )
+    return _embedding_backends[name]
+
+
+def embedding_backend_id(backend: str = None) -> str:
+    """Id of the vectors a backend (EMBEDDING_BACKEND by default) produces"""
+    return _backend(backend)[1]
+
+
+def engine_backend_id(engine: Embeddings) -> str:
+    """Id of the vectors an engine produces, e.g. to tag an index with"""
+    return getattr(engine, "backend_id", None) or type(engine).__name__
+
+
+def _create_embedding_engine(backend: str, api_key: str = None) -> Embeddings:
+    factory, backend_id = _backend(backend)
+    engine = factory(api_key)
+    # Engines that fell back to another backend keep their own id
+    if getattr(engine, "backend_id", None) is None:
+        engine.backend_id = backend_id
+    return engine
+
+
+def get_embedding_engine(api_key: str = None, backend: str = None):
+    """Get the embedding engine of a backend (EMBEDDING_BACKEND by default),
+    preferring the google-genai client for the google backend"""
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "google":
+        backend = "google-genai"
+    return _create_embedding_engine(backend, api_key)
+
+
+def get_langchain_embedding_engine(api_key: str = None, backend: str = None):
+    """Get the embedding engine of a backend (EMBEDDING_BACKEND by default),
+    using the LangChain integration for the google backend (more reliable)"""
+    return _create_embedding_engine(backend, api_key)
+
+
+register_embedding_backend("google", _google_embeddings, f"google:{EMBEDDING_MODEL}")
+register_embedding_backend(
+    "google-genai",
+    lambda api_key: CustomGoogleGenAIEmbeddings(api_key=api_key),
+    f"google:{EMBEDDING_MODEL}@{EMBEDDING_DIMENSIONS}",
+)
+register_embedding_backend(
+    "local", lambda api_key: HashingEmbeddings(), HashingEmbeddings().backend_id
+)
 
 
 def test_embedding_engine(api_key: str = None):
@@ -110,7 +359,7 @@ def test_embedding_engine(api_key: str = None):
         if test_embedding and len(test_embedding) > 0:
             return (
                 True,
-                f"✅ Embedding engine working! Generated {len(test_embedding)}-dimensional vector",
+                f"✅ Embedding engine working! Generated {len(test_embedding)}-dimensional vector ({engine_backend_id(engine)})",
             )
         else:
             return False, "❌ Embedding engine returned empty result"
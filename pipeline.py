@@ -0,0 +1,309 @@
+"""
+Fast-path pipeline for the canonical "crawl → match → draft" workflow.
+
+The ReAct agent rediscovers the same plan for every email request: crawl the
+professor's site, query the CV, then write. Each of those decisions is an LLM
+round trip. When a message clearly asks for an email to a pasted URL, this
+pipeline runs the crawl and the CV retrieval concurrently, assembles the
+context once and makes a single drafting call. Everything else still goes to
+the ReAct agent.
+
+The exchange is written back into the agent's thread as the equivalent tool
+calls and results, so follow-up chat sees the same history it would have seen
+had the agent done the work itself.
+"""
+
+import os
+import re
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import TypedDict
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
+from langgraph.graph import StateGraph, START, END
+from agent_graph import DEFAULT_TOOL_TIMEOUTS, append_to_thread
+from profile_store import lookup_profile, remember_profile
+from crawler import crawl_result_to_text, find_urls, get_crawler
+from system_prompt import system_prompt
+from tools import fit_for_website, search_cv
+from tracing import span
+from usage import approx_tokens
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+CV_CONTEXT_K = 10
+
+# The tools the pipeline stands in for, as recorded in the agent's thread
+FAST_PATH_TOOLS = {"crawl_website", "kb_tool", "fit_score"}
+
+# An explicit request to write an email or letter ("draft a short email to")
+DRAFTING_PATTERN = re.compile(
+    r"\b(write|draft|compose|prepare)\b[^.?!\n]{0,40}?\b(e-?mails?|letters?)\b",
+    re.IGNORECASE,
+)
+# Same bound as the agent's crawl_website tool
+CRAWL_TIMEOUT_SECONDS = DEFAULT_TOOL_TIMEOUTS["crawl_website"]
+
+DRAFTING_INSTRUCTIONS = """
+---
+The professor's website has already been crawled and the most relevant parts of
+the user's CV have already been retrieved, and the fit score has been computed
+locally; all are included in the request. Do not ask for them again.
+Write the email now: start with a subject line, then the email, then the fit
+percentage from the request with a short justification based on its evidence.
+Never estimate a different percentage.
+"""
+
+
+class PipelineState(TypedDict, total=False):
+    request: str
+    url: str
+    history: list
+    website: str
+    cv_context: str
+    fit: str
+    draft: AIMessage
+
+
+def fast_path_url(message: str):
+    """Return the target URL if a message asks for an email to exactly one
+    pasted URL, otherwise None"""
+    urls = find_urls(message)
+    if len(urls) != 1 or not DRAFTING_PATTERN.search(message):
+        return None
+    return urls[0]
+
+
+def text_history(agent, config: dict) -> list:
+    """Prior human/AI text turns of the agent's thread.
+
+    Tool calls and tool results are left out: the drafting call has no tools
+    bound, and the context it needs is assembled fresh.
+    """
+    if agent is None:
+        return []
+    messages = agent.get_state(config).values.get("messages", [])
+    return [
+        message
+        for message in messages
+        if message.type in ("human", "ai")
+        and message.content
+        and not getattr(message, "tool_calls", None)
+    ]
+
+
+def crawl_text(firecrawl_api_key: str, url: str) -> str:
+    """A professor's website as prompt text: the page text stored with their
+    profile when there is one, otherwise the crawled site (an error message if
+    the crawl failed)"""
+    stored = lookup_profile(url, firecrawl_api_key)
+    if stored is not None and stored.page:
+        return stored.page
+    try:
+        with span("pipeline.crawl", url=url):
+            result = get_crawler(firecrawl_api_key).crawl(
+                url, timeout=CRAWL_TIMEOUT_SECONDS
+            )
+            website = crawl_result_to_text(result)
+        remember_profile(url, website)
+    except FutureTimeoutError:
+        website = (
+            f"## ❌ Error\n\ncrawl_website timed out after "
+            f"{CRAWL_TIMEOUT_SECONDS:.0f}s"
+        )
+    except Exception as e:
+        website = f"## ❌ Error\n\nError crawling website: {str(e)}"
+    return website or "No content found on the website."
+
+
+def fit_text(website: str, url: str = None, kb=None) -> str:
+    """The fit score of a crawled website against the CV (in ``kb``, the
+    CLI's knowledge base by default) as prompt text"""
+    try:
+        result = fit_for_website(website, url, kb)
+    except Exception as e:
+        return f"## ❌ Error\n\nError computing fit score: {str(e)}"
+    if result is None:
+        return "No CV is loaded, so no fit score was computed."
+    fit, profile = result
+    return fit.to_markdown(profile.get("name"))
+
+
+def cv_context(query: str, k: int = CV_CONTEXT_K, kb=None) -> str:
+    """The CV chunks (in ``kb``, the CLI's knowledge base by default) most
+    relevant to a request, joined as prompt text"""
+    try:
+        docs = search_cv(query, k=k, kb=kb)
+    except Exception as e:
+        return f"## ❌ Error\n\nError searching CV: {str(e)}"
+    if not docs:
+        return "No CV is loaded."
+    return "\n\n---\n\n".join(doc.page_content for doc in docs)
+
+
+class FastPathPipeline:
+    """Crawl and CV retrieval in parallel, followed by one drafting call.
+
+    Args:
+        llm: Chat model used for the drafting call
+        firecrawl_api_key: Firecrawl API key for the crawl
+        prompt: System prompt the drafting call runs with
+        k: Number of CV chunks retrieved as context
+        kb: Knowledge base holding the CV (the CLI's by default)
+    """
+
+    def __init__(
+        self,
+        llm,
+        firecrawl_api_key: str,
+        prompt: str = system_prompt,
+        k: int = CV_CONTEXT_K,
+        kb=None,
+    ):
+        self.llm = llm
+        self.firecrawl_api_key = firecrawl_api_key
+        self.system_message = SystemMessage(content=prompt + DRAFTING_INSTRUCTIONS)
+        self.k = k
+        self.kb = kb
+        self.graph = self._build()
+
+    def matches(self, message: str) -> bool:
+        """Whether a message should take the fast path"""
+        return bool(self.firecrawl_api_key) and fast_path_url(message) is not None
+
+    def _crawl(self, state: PipelineState):
+        return {"website": crawl_text(self.firecrawl_api_key, state["url"])}
+
+    def _score(self, state: PipelineState):
+        return {"fit": fit_text(state["website"], state["url"], self.kb)}
+
+    def _retrieve(self, state: PipelineState):
+        return {"cv_context": cv_context(state["request"], self.k, self.kb)}
+
+    def _draft(self, state: PipelineState, config: RunnableConfig):
+        request = (
+            f"{state['request']}\n\n"
+            f"## Professor's website ({state['url']})\n\n{state['website']}\n\n"
+            f"## Relevant parts of my CV\n\n{state['cv_context']}\n\n"
+            f"## Fit score (computed locally)\n\n{state['fit']}"
+        )
+        messages = (
+            [self.system_message]
+            + state.get("history", [])
+            + [HumanMessage(content=request)]
+        )
+        # Attribute the inlined crawl and CV text to the tools they stand in for
+        config = merge_configs(
+            config,
+            {
+                "metadata": {
+                    "tool_context": {
+                        "crawl_website": approx_tokens(state["website"]),
+                        "kb_tool": approx_tokens(state["cv_context"]),
+                        "fit_score": approx_tokens(state["fit"]),
+                    }
+                }
+            },
+        )
+        with span("llm.call", node="draft", messages=len(messages)):
+            return {"draft": self.llm.invoke(messages, config)}
+
+    def _build(self):
+        graph = StateGraph(PipelineState)
+        graph.add_node("crawl", self._crawl)
+        graph.add_node("score", self._score)
+        graph.add_node("retrieve", self._retrieve)
+        graph.add_node("draft", self._draft)
+        # Crawl and retrieval run in the same step, the fit score is computed
+        # from the crawl, and drafting waits for the score and the retrieval
+        graph.add_edge(START, "crawl")
+        graph.add_edge(START, "retrieve")
+        graph.add_edge("crawl", "score")
+        graph.add_edge(["score", "retrieve"], "draft")
+        graph.add_edge("draft", END)
+        return graph.compile()
+
+    def _inputs(self, message: str, agent, config: dict) -> PipelineState:
+        return {
+            "request": message,
+            "url": fast_path_url(message),
+            "history": text_history(agent, config),
+        }
+
+    def _record(self, agent, config: dict, message: str, state: PipelineState):
+        crawl_id = f"call_{uuid.uuid4().hex[:12]}"
+        kb_id = f"call_{uuid.uuid4().hex[:12]}"
+        fit_id = f"call_{uuid.uuid4().hex[:12]}"
+        append_to_thread(
+            agent,
+            config,
+            [
+                HumanMessage(content=message),
+                AIMessage(
+                    content="",
+                    tool_calls=[
+                        {
+                            "name": "crawl_website",
+                            "args": {"url": state["url"]},
+                            "id": crawl_id,
+                        },
+                        {"name": "kb_tool", "args": {"query": message}, "id": kb_id},
+                        {
+                            "name": "fit_score",
+                            "args": {"url": state["url"]},
+                            "id": fit_id,
+                        },
+                    ],
+                ),
+                ToolMessage(
+                    content=state["website"],
+                    name="crawl_website",
+                    tool_call_id=crawl_id,
+                ),
+                ToolMessage(
+                    content=state["cv_context"], name="kb_tool", tool_call_id=kb_id
+                ),
+                ToolMessage(
+                    content=state["fit"], name="fit_score", tool_call_id=fit_id
+                ),
+                AIMessage(content=state["draft"].content),
+            ],
+        )
+
+    def stream(self, message: str, agent, config: dict):
+        """Run the pipeline, yielding (token, metadata) pairs like
+        ``agent.stream(..., stream_mode="messages")``"""
+        final_state = None
+        for mode, chunk in self.graph.stream(
+            self._inputs(message, agent, config),
+            config,
+            stream_mode=["messages", "values"],
+        ):
+            if mode == "messages":
+                yield chunk
+            else:
+                final_state = chunk
+
+        if agent is not None and final_state and "draft" in final_state:
+            self._record(agent, config, message, final_state)
+
+    def invoke(self, message: str, agent, config: dict) -> str:
+        """Run the pipeline and return the drafted email"""
+        final_state = self.graph.invoke(self._inputs(message, agent, config), config)
+        if agent is not None:
+            self._record(agent, config, message, final_state)
+        return final_state["draft"].content
+
+
+def build_fast_path(llm, firecrawl_api_key: str, kb=None):
+    """Return the fast-path pipeline, or None when it is disabled"""
+    if not FAST_PATH_ENABLED or not firecrawl_api_key:
+        return None
+    return FastPathPipeline(llm, firecrawl_api_key, kb=kb)
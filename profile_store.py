@@ -0,0 +1,336 @@
+"""
+Persistent store of professor profiles, shared across sessions and restarts.
+
+A profile extracted from a crawled site (profiles.extract_profile) used to
+live only in one thread's messages, so every new session crawled the same
+professor again. Profiles are now kept in a local SQLite file, keyed by the
+canonical URL and indexed by domain, together with the research topics used
+for fit scores, a source snippet for each field, the extraction time and the
+crawled page text. Drafting uses the stored page text, the same text a crawl
+would give, rather than the much shorter extracted profile.
+
+Staleness policy:
+
+- Younger than PROFILE_STORE_TTL: served as is, no crawl.
+- Older, but younger than PROFILE_STORE_MAX_AGE: served, and the site is
+  re-crawled in the background so the next lookup gets a fresh profile.
+- Older than PROFILE_STORE_MAX_AGE: dropped; the site is crawled again.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+from crawler import canonicalize_url, crawl_result_to_text, get_crawler
+from profiles import ProfessorProfile, extract_profile, profile_topics, source_snippets
+
+load_dotenv()
+
+PROFILE_STORE_ENABLED = os.getenv("PROFILE_STORE_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+PROFILE_STORE_PATH = os.getenv("PROFILE_STORE_PATH", ".cache/profiles.sqlite")
+# Seconds a profile is served without re-crawling the site
+PROFILE_STORE_TTL = int(os.getenv("PROFILE_STORE_TTL", str(14 * 24 * 3600)))
+# Seconds after which a profile is dropped instead of served while refreshing
+PROFILE_STORE_MAX_AGE = int(os.getenv("PROFILE_STORE_MAX_AGE", str(180 * 24 * 3600)))
+
+_FIELDS = ("name", "email", "position", "university")
+
+
+def url_domain(url: str) -> str:
+    """Domain of a URL without a leading "www." """
+    netloc = urlsplit(canonicalize_url(url)).netloc
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+def profile_key(url: str) -> str:
+    """Store key of a URL: its canonical form without scheme and "www.", so
+    http/https and www spellings share a profile"""
+    parts = urlsplit(canonicalize_url(url))
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{url_domain(url)}{parts.path}{query}"
+
+
+class StoredProfile:
+    """A profile read from the store.
+
+    Attributes:
+        url: Canonical URL the profile was extracted from
+        profile: The extracted fields
+        topics: Research topics used for fit scores
+        snippets: Source text around each field
+        extracted_at: Unix time of the extraction
+        stale: Whether it is older than PROFILE_STORE_TTL
+        page: The crawled page text ("" for profiles stored without it)
+    """
+
+    def __init__(self, url, profile, topics, snippets, extracted_at, stale, page=""):
+        self.url = url
+        self.profile = profile
+        self.topics = topics
+        self.snippets = snippets
+        self.extracted_at = extracted_at
+        self.stale = stale
+        self.page = page
+
+    def to_markdown(self) -> str:
+        """The profile as prompt text"""
+        profile = self.profile
+        extracted = datetime.fromtimestamp(self.extracted_at).strftime("%Y-%m-%d")
+        lines = [f"## 👤 {profile.get('name') or 'Professor profile'}", ""]
+        for field in _FIELDS[1:]:
+            if profile.get(field):
+                lines.append(f"- **{field.capitalize()}:** {profile[field]}")
+        lines.append(f"- **Website:** {self.url}")
+        if profile.get("interests"):
+            lines += ["", "**Research interests**"]
+            lines += [f"- {interest}" for interest in profile["interests"]]
+        if profile.get("publications"):
+            lines += ["", "**Recent publications**"]
+            lines += [f"- {title}" for title in profile["publications"]]
+        note = " (stale, refreshing in the background)" if self.stale else ""
+        lines += ["", f"_Extracted from the website on {extracted}{note}._"]
+        return "\n".join(lines)
+
+
+class ProfileStore:
+    """SQLite-backed professor profiles with staleness tracking"""
+
+    def __init__(
+        self,
+        path: str = PROFILE_STORE_PATH,
+        ttl: int = PROFILE_STORE_TTL,
+        max_age: int = PROFILE_STORE_MAX_AGE,
+    ):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Sites being re-crawled in the background
+        self._refreshing = set()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Streamlit runs each session on its own thread
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS profiles (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                name TEXT,
+                email TEXT,
+                position TEXT,
+                university TEXT,
+                interests TEXT NOT NULL,
+                publications TEXT NOT NULL,
+                topics TEXT NOT NULL,
+                snippets TEXT NOT NULL,
+                extracted_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                page TEXT NOT NULL DEFAULT ''
+            )
+            """
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(profiles)")]
+        if "page" not in columns:
+            # Stores created before the page text was kept
+            self._conn.execute(
+                "ALTER TABLE profiles ADD COLUMN page TEXT NOT NULL DEFAULT ''"
+            )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS profiles_domain ON profiles (domain)"
+        )
+        self._conn.commit()
+
+    def _record(self, row, now: float) -> StoredProfile:
+        url, name, email, position, university = row[:5]
+        profile: ProfessorProfile = {
+            "url": url,
+            "interests": json.loads(row[5]),
+            "publications": json.loads(row[6]),
+        }
+        for field, value in zip(_FIELDS, (name, email, position, university)):
+            if value:
+                profile[field] = value
+        return StoredProfile(
+            url,
+            profile,
+            json.loads(row[7]),
+            json.loads(row[8]),
+            row[9],
+            now - row[9] > self.ttl,
+            row[10],
+        )
+
+    def get(self, url: str):
+        """The stored profile of a URL, or None if unknown or too old"""
+        key = profile_key(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT url, name, email, position, university, interests,
+                       publications, topics, snippets, extracted_at, page
+                FROM profiles WHERE key = ?
+                """,
+                (key,),
+            ).fetchone()
+            if row is None or now - row[9] > self.max_age:
+                if row is not None:
+                    self._conn.execute("DELETE FROM profiles WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE profiles SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return self._record(row, now)
+
+    def for_domain(self, domain: str, limit: int = 5) -> list[StoredProfile]:
+        """Profiles stored for a domain (or any URL on it), most recent first"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT url, name, email, position, university, interests,
+                       publications, topics, snippets, extracted_at, page
+                FROM profiles WHERE domain = ? AND extracted_at > ?
+                ORDER BY extracted_at DESC LIMIT ?
+                """,
+                (url_domain(domain), now - self.max_age, limit),
+            ).fetchall()
+        return [self._record(row, now) for row in rows]
+
+    def put(self, url: str, text: str) -> ProfessorProfile:
+        """Extract and store the profile of a crawled site
+
+        Args:
+            url: The crawled URL
+            text: The crawled site as text
+
+        Returns:
+            The extracted profile
+        """
+        url = canonicalize_url(url)
+        profile = extract_profile(text, url)
+        topics = profile_topics(profile, text)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO profiles (
+                    key, url, domain, name, email, position, university,
+                    interests, publications, topics, snippets, extracted_at,
+                    last_used, page
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    profile_key(url),
+                    url,
+                    url_domain(url),
+                    *(profile.get(field) for field in _FIELDS),
+                    json.dumps(profile["interests"], ensure_ascii=False),
+                    json.dumps(profile["publications"], ensure_ascii=False),
+                    json.dumps(topics, ensure_ascii=False),
+                    json.dumps(source_snippets(profile, text), ensure_ascii=False),
+                    now,
+                    now,
+                    text,
+                ),
+            )
+            self._conn.execute(
+                "DELETE FROM profiles WHERE extracted_at < ?", (now - self.max_age,)
+            )
+            self._conn.commit()
+        return profile
+
+    def refresh(self, url: str, firecrawl_api_key: str):
+        """Re-crawl a site in the background and store its new profile"""
+        url = canonicalize_url(url)
+        if not firecrawl_api_key:
+            return
+        with self._lock:
+            if url in self._refreshing:
+                return
+            self._refreshing.add(url)
+
+        def store(future):
+            try:
+                if future.exception() is None:
+                    text = crawl_result_to_text(future.result())
+                    if text:
+                        self.put(url, text)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(url)
+
+        get_crawler(firecrawl_api_key).prefetch(url).add_done_callback(store)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM profiles")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+
+_profile_store = None
+_profile_store_lock = threading.Lock()
+
+
+def get_profile_store():
+    """Return the shared profile store, or None when it is disabled"""
+    global _profile_store
+
+    if not PROFILE_STORE_ENABLED:
+        return None
+
+    with _profile_store_lock:
+        if _profile_store is None:
+            _profile_store = ProfileStore()
+    return _profile_store
+
+
+def lookup_profile(url: str, firecrawl_api_key: str = None):
+    """The stored profile of a URL, refreshing a stale one in the background.
+
+    Returns:
+        A StoredProfile, or None when the store is disabled or has no usable
+        profile for the URL
+    """
+    store = get_profile_store()
+    if store is None:
+        return None
+    stored = store.get(url)
+    if stored is not None and stored.stale:
+        store.refresh(url, firecrawl_api_key)
+    return stored
+
+
+def has_fresh_profile(url: str) -> bool:
+    """Whether a URL has a stored profile and page that need no crawl"""
+    stored = lookup_profile(url)
+    return stored is not None and not stored.stale and bool(stored.page)
+
+
+def remember_profile(url: str, text: str):
+    """Store the profile of a freshly crawled site (no-op when disabled)"""
+    store = get_profile_store()
+    if store is None or not text:
+        return None
+    return store.put(url, text)
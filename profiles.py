@@ -0,0 +1,211 @@
+"""
+Heuristic extraction of a professor's profile from a crawled website.
+
+The crawl result is markdown (or plain text) of the professor's pages. The
+fields that matter for scoring and drafting are pulled out with headings and
+patterns rather than an LLM call, so extraction is instant, free and gives
+the same result every time:
+
+- name: the first heading that looks like a person's name
+- email: the first address on the page
+- position and university: the first short lines naming a title
+  ("Associate Professor") and an institution
+- interests: items under a "Research interests"-like heading, otherwise
+  sentences like "My research focuses on ..."
+- publications: items under a "Publications"-like heading
+"""
+
+import re
+from typing import TypedDict
+
+# Items kept per list field
+MAX_INTERESTS = 12
+MAX_PUBLICATIONS = 8
+
+_EMAIL = re.compile(r"[\w.+-]+(?:@|\s*\[at\]\s*)[\w-]+(?:\.[\w-]+)+", re.IGNORECASE)
+_HEADING = re.compile(r"^\s*(#{1,6})\s+(.+?)\s*#*\s*$")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+•]|\d{1,3}[.)]|\[\d+\])\s+(.+)$")
+_POSITION = re.compile(
+    r"\b((?:assistant|associate|full|adjunct|research|visiting|emeritus)?\s*"
+    r"professor|lecturer|reader|principal investigator|research scientist|"
+    r"group leader|postdoc\w*|director)\b",
+    re.IGNORECASE,
+)
+_INSTITUTION = re.compile(
+    r"\b(university|universität|université|institute|college|school of|"
+    r"polytechnic|ETH|EPFL|MIT)\b",
+    re.IGNORECASE,
+)
+_INTEREST_HEADING = re.compile(
+    r"research( interests| areas| topics| focus)?|interests|areas of expertise|"
+    r"research group|what we do",
+    re.IGNORECASE,
+)
+_PUBLICATION_HEADING = re.compile(
+    r"(selected |recent )?(publications|papers|articles)", re.IGNORECASE
+)
+_INTEREST_SENTENCE = re.compile(
+    r"(research interests? (?:include|are|is|lie)|my research|our research|"
+    r"(?:lab|group) (?:works|focuses|studies)|focus(?:es)? on|interested in)"
+    r"\s*(?:in|on)?\s*:?\s*([^.]{10,300})",
+    re.IGNORECASE,
+)
+_TITLE = re.compile(r"^(prof\.?|professor|dr\.?)\s+", re.IGNORECASE)
+_MARKDOWN_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_QUOTED_TITLE = re.compile(r"[\"“]([^\"”]{15,250})[\"”]")
+
+
+class ProfessorProfile(TypedDict, total=False):
+    url: str
+    name: str
+    email: str
+    position: str
+    university: str
+    interests: list
+    publications: list
+
+
+def _clean(line: str) -> str:
+    """Strip markdown links, emphasis and list markers from a line"""
+    line = _MARKDOWN_LINK.sub(r"\1", line)
+    line = re.sub(r"[*_`>]+", "", line)
+    item = _LIST_ITEM.match(line)
+    if item:
+        line = item.group(1)
+    return " ".join(line.split())
+
+
+def _sections(text: str) -> list[tuple[str, list[str]]]:
+    """(heading, lines) pairs; text before the first heading has heading "" """
+    sections = [("", [])]
+    for line in text.splitlines():
+        heading = _HEADING.match(line)
+        if heading:
+            sections.append((_clean(heading.group(2)), []))
+        elif line.strip():
+            sections[-1][1].append(line)
+    return sections
+
+
+def _looks_like_name(text: str) -> bool:
+    words = _TITLE.sub("", text).split()
+    return 2 <= len(words) <= 5 and all(
+        word[:1].isupper() and word.replace(".", "").replace("-", "").isalpha()
+        for word in words
+    )
+
+
+def _items(lines: list[str], limit: int, sentences: bool = False) -> list[str]:
+    """List items of a section; without any, its lines, or its sentences when
+    ``sentences`` is set (for prose wrapped over several lines)"""
+    items = [_clean(line) for line in lines if _LIST_ITEM.match(line)]
+    if not items and sentences:
+        prose = " ".join(_clean(line) for line in lines)
+        items = [s.strip() for s in re.split(r"(?<=[.;])\s+", prose)]
+    elif not items:
+        items = [_clean(line) for line in lines]
+    return [item.rstrip(".;") for item in items if len(item) >= 4][:limit]
+
+
+def _publication_title(item: str) -> str:
+    quoted = _QUOTED_TITLE.search(item)
+    return quoted.group(1).strip() if quoted else item[:250]
+
+
+def extract_profile(text: str, url: str = None) -> ProfessorProfile:
+    """Extract a professor's profile from crawled website text.
+
+    Args:
+        text: Markdown or plain text of the professor's pages
+        url: The crawled URL, kept in the profile
+
+    Returns:
+        The fields that could be found; list fields are always present
+    """
+    profile: ProfessorProfile = {"interests": [], "publications": []}
+    if url:
+        profile["url"] = url
+    text = text or ""
+
+    email = _EMAIL.search(text)
+    if email:
+        profile["email"] = re.sub(r"\s*\[at\]\s*", "@", email.group(0))
+
+    sections = _sections(text)
+    for heading, lines in sections:
+        if "name" not in profile and heading and _looks_like_name(heading):
+            profile["name"] = _TITLE.sub("", heading)
+        for line in [heading] + lines[:20]:
+            line = _clean(line)
+            if len(line) > 150:
+                continue
+            # "Associate Professor, Dept. of X, Y University" holds both
+            parts = [part.strip() for part in line.split(",")]
+            if "position" not in profile and _POSITION.search(line):
+                profile["position"] = next(p for p in parts if _POSITION.search(p))
+            if "university" not in profile and _INSTITUTION.search(line):
+                profile["university"] = next(
+                    p for p in reversed(parts) if _INSTITUTION.search(p)
+                )
+
+        if not heading:
+            continue
+        if _PUBLICATION_HEADING.fullmatch(heading.strip(" :")):
+            profile["publications"] += [
+                _publication_title(item) for item in _items(lines, MAX_PUBLICATIONS)
+            ]
+        elif _INTEREST_HEADING.fullmatch(heading.strip(" :")):
+            profile["interests"] += _items(lines, MAX_INTERESTS, sentences=True)
+
+    if not profile["interests"]:
+        for match in _INTEREST_SENTENCE.finditer(_MARKDOWN_LINK.sub(r"\1", text)):
+            profile["interests"].append(" ".join(match.group(2).split()))
+    profile["interests"] = list(dict.fromkeys(profile["interests"]))[:MAX_INTERESTS]
+    profile["publications"] = list(dict.fromkeys(profile["publications"]))[
+        :MAX_PUBLICATIONS
+    ]
+    return profile
+
+
+def source_snippets(
+    profile: ProfessorProfile, text: str, width: int = 80
+) -> dict[str, str]:
+    """The text around each extracted field (the first item of list fields),
+    so a stored profile can be checked against its source"""
+    snippets = {}
+    for field, value in profile.items():
+        if field == "url" or not value:
+            continue
+        value = value[0] if isinstance(value, list) else value
+        start = text.find(value[:40])
+        if start == -1 and field == "email":
+            start = text.find(value.split("@")[0])
+        if start != -1:
+            end = start + len(value)
+            # Widen by up to ``width`` characters, stopping at whitespace so
+            # no word is cut
+            begin = max(0, start - width)
+            if begin > 0:
+                space = re.search(r"\s", text[begin:start])
+                begin = begin + space.end() if space else start
+            stop = min(len(text), end + width)
+            if stop < len(text):
+                space = re.search(r"\s\S*$", text[end : stop + 1])
+                stop = end + space.start() if space else end
+            snippets[field] = " ".join(text[begin:stop].split())
+    return snippets
+
+
+def profile_topics(profile: ProfessorProfile, text: str = "") -> list[str]:
+    """Research interests (one per listed phrase) and publication titles of a
+    profile, falling back to the longer paragraphs of the page when neither
+    was found"""
+    topics = []
+    for interest in profile.get("interests", []):
+        phrases = [p.strip() for p in re.split(r",|;|\band\b", interest)]
+        topics += [phrase for phrase in phrases if len(phrase) >= 4]
+    topics = list(dict.fromkeys(topics + list(profile.get("publications", []))))
+    if topics:
+        return topics
+    paragraphs = [" ".join(p.split()) for p in re.split(r"\n\s*\n", text or "")]
+    return [p[:500] for p in paragraphs if len(p) >= 80][:MAX_INTERESTS]
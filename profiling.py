@@ -0,0 +1,134 @@
+"""
+Local CPU and memory profiling for CLI runs.
+
+``profile_run`` wraps a block in three profilers and writes their reports
+when the block exits (also on errors, Ctrl-C and ``sys.exit``):
+
+- hotspots.txt / run.pstats: cProfile of the main thread, where CV
+  ingestion and rendering run. Open run.pstats with snakeviz or pstats.
+- stacks.collapsed: sampled stacks of all threads (including the tool and
+  crawl pools) in the collapsed format read by flamegraph.pl, speedscope
+  and inferno.
+- allocations.txt: the allocation sites holding the most memory at exit and
+  the peak traced memory, from tracemalloc.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Stack samples per second taken for stacks.collapsed
+PROFILE_SAMPLE_HZ = int(os.getenv("PROFILE_SAMPLE_HZ", "100"))
+# Frames kept per allocation traceback
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "10"))
+
+
+class StackSampler:
+    """Periodically records the Python stack of every thread.
+
+    Args:
+        interval: Seconds between samples
+    """
+
+    def __init__(self, interval: float = 1.0 / PROFILE_SAMPLE_HZ):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    module = Path(code.co_filename).stem
+                    stack.append(f"{module}.{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_collapsed(self, path: Path):
+        lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _write_hotspots(profiler: cProfile.Profile, path: Path, limit: int):
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out).strip_dirs()
+    out.write("=== Sorted by cumulative time ===\n")
+    stats.sort_stats("cumulative").print_stats(limit)
+    out.write("\n=== Sorted by own time ===\n")
+    stats.sort_stats("tottime").print_stats(limit)
+    path.write_text(out.getvalue(), encoding="utf-8")
+
+
+def _write_allocations(snapshot, peak: int, path: Path, limit: int):
+    stats = snapshot.statistics("lineno")
+    total = sum(stat.size for stat in stats)
+    lines = [
+        f"Traced memory at exit: {total / 1024 / 1024:.1f} MiB",
+        f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB",
+        "",
+        f"=== Top {limit} allocation sites ===",
+    ]
+    lines += [str(stat) for stat in stats[:limit]]
+
+    lines += ["", "=== Tracebacks of the top 5 ==="]
+    for stat in snapshot.statistics("traceback")[:5]:
+        lines.append(f"\n{stat.count} blocks, {stat.size / 1024:.1f} KiB")
+        lines += stat.traceback.format()
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+@contextmanager
+def profile_run(output_dir: Path, limit: int = 40):
+    """Profile the enclosed block and write reports to a new folder in
+    ``output_dir``. Yields the folder the reports are written to."""
+    report_dir = Path(output_dir) / time.strftime("profile-%Y%m%d-%H%M%S")
+    report_dir.mkdir(parents=True, exist_ok=True)
+
+    tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+    sampler = StackSampler().start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield report_dir
+    finally:
+        profiler.disable()
+        sampler.stop()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiler.dump_stats(report_dir / "run.pstats")
+        _write_hotspots(profiler, report_dir / "hotspots.txt", limit)
+        sampler.write_collapsed(report_dir / "stacks.collapsed")
+        _write_allocations(snapshot, peak, report_dir / "allocations.txt", limit)
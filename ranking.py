@@ -0,0 +1,275 @@
+"""
+Rank many professors' labs by fit with the loaded CV, without the chat model.
+
+Screening a list of candidate labs works in three steps:
+
+1. Labs with a profile in the profile store are not crawled at all. The
+   other sites are crawled concurrently through the shared crawler, so a
+   site crawled earlier (or prefetched from a message) is served from its
+   cache.
+2. A profile is extracted from each crawled site (profiles.extract_profile)
+   and stored, and the research topics of all labs are collected. Topics
+   shared by several labs are embedded once, in batches, with the CV
+   index's own embedding engine.
+3. One similarity matrix of every topic against every CV chunk is computed
+   (QuantizedVectorStore.score_matrix), and each lab's rows are scored like
+   a single fit score (fit_score.fit_from_similarities).
+
+The only model calls are the topic embeddings. The ranking lists every lab
+with its score, and the best ones form a shortlist that can be drafted next.
+"""
+
+import csv
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import as_completed
+import numpy as np
+from dotenv import load_dotenv
+import tools
+from crawler import canonicalize_url, crawl_result_to_text, get_crawler
+from fit_score import FitScore, fit_from_similarities
+from profile_store import lookup_profile, remember_profile
+from profiles import ProfessorProfile, extract_profile, profile_topics
+from tracing import span
+
+load_dotenv()
+
+# Labs drafted from a ranking
+RANK_SHORTLIST_SIZE = int(os.getenv("RANK_SHORTLIST_SIZE", "5"))
+# Labs below this fit percentage never make the shortlist
+RANK_MIN_SCORE = int(os.getenv("RANK_MIN_SCORE", "0"))
+# Research topics embedded per request
+RANK_EMBED_BATCH_SIZE = int(os.getenv("RANK_EMBED_BATCH_SIZE", "100"))
+# Topic embeddings kept in memory, so re-ranking a list only embeds new topics
+RANK_TOPIC_CACHE_SIZE = int(os.getenv("RANK_TOPIC_CACHE_SIZE", "5000"))
+
+# (backend id, topic) -> vector, least recently used first
+_topic_vectors = OrderedDict()
+# Guards _topic_vectors: rankings run from several sessions at once
+_topic_lock = threading.Lock()
+
+
+class LabFit:
+    """One ranked lab.
+
+    Attributes:
+        url: Canonical URL of the professor's site
+        profile: Profile extracted from the site
+        fit: Its fit score against the CV
+    """
+
+    def __init__(self, url: str, profile: ProfessorProfile, fit: FitScore):
+        self.url = url
+        self.profile = profile
+        self.fit = fit
+
+    @property
+    def name(self) -> str:
+        return self.profile.get("name") or self.url
+
+
+class LabRanking:
+    """Labs ranked by fit, best first.
+
+    Attributes:
+        labs: Ranked labs
+        failed: (url, error) of the sites that could not be crawled
+        timings: Seconds spent on "crawl", "embed" and "score"
+    """
+
+    def __init__(self, labs: list[LabFit], failed: list, timings: dict):
+        self.labs = labs
+        self.failed = failed
+        self.timings = timings
+
+    def shortlist(
+        self, size: int = RANK_SHORTLIST_SIZE, min_score: int = RANK_MIN_SCORE
+    ) -> list[str]:
+        """URLs of the best labs, to be drafted next"""
+        return [lab.url for lab in self.labs if lab.fit.score >= min_score][:size]
+
+    def to_markdown(self, limit: int = None) -> str:
+        """The ranking as a markdown table"""
+        lines = [
+            "| # | Fit | Professor | Position | Top matching topic | URL |",
+            "|---|-----|-----------|----------|--------------------|-----|",
+        ]
+        for rank, lab in enumerate(self.labs[:limit], start=1):
+            topic = lab.fit.evidence[0]["topic"] if lab.fit.evidence else ""
+            lines.append(
+                f"| {rank} | {lab.fit.score}% | {lab.name} | "
+                f"{lab.profile.get('position', '')} | {topic[:60]} | {lab.url} |"
+            )
+        for url, error in self.failed:
+            lines.append(f"| - | - | ❌ {error[:60]} | | | {url} |")
+        return "\n".join(lines)
+
+    def to_csv(self) -> str:
+        """The ranking as CSV, one row per lab"""
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(
+            [
+                "rank",
+                "fit",
+                "semantic",
+                "keyword",
+                "name",
+                "email",
+                "position",
+                "university",
+                "url",
+                "shared_keywords",
+                "top_topic",
+            ]
+        )
+        for rank, lab in enumerate(self.labs, start=1):
+            writer.writerow(
+                [
+                    rank,
+                    lab.fit.score,
+                    f"{lab.fit.semantic:.3f}",
+                    f"{lab.fit.keyword:.3f}",
+                    lab.profile.get("name", ""),
+                    lab.profile.get("email", ""),
+                    lab.profile.get("position", ""),
+                    lab.profile.get("university", ""),
+                    lab.url,
+                    " ".join(lab.fit.shared_keywords),
+                    lab.fit.evidence[0]["topic"] if lab.fit.evidence else "",
+                ]
+            )
+        return out.getvalue()
+
+
+def _crawl_all(urls: list[str], firecrawl_api_key: str, progress) -> tuple:
+    """({url: text}, [(url, error)]) for a list of sites, crawled concurrently"""
+    if not firecrawl_api_key:
+        return {}, [(url, "Firecrawl API key is required") for url in urls]
+    crawler = get_crawler(firecrawl_api_key)
+    futures = {crawler.prefetch(url): url for url in urls}
+    texts, failed = {}, []
+    for done, future in enumerate(as_completed(futures), start=1):
+        url = futures[future]
+        try:
+            text = crawl_result_to_text(future.result())
+            if text:
+                texts[url] = text
+            else:
+                failed.append((url, "No content found on the website"))
+        except Exception as e:
+            failed.append((url, str(e)))
+        progress("crawl", done, len(urls))
+    return texts, failed
+
+
+def _embed_topics(store, topics: list[str], progress) -> np.ndarray:
+    """Vectors of distinct topics, from the cache or embedded in batches"""
+    backend = store.backend
+    vectors = {}
+    with _topic_lock:
+        for topic in topics:
+            vector = _topic_vectors.get((backend, topic))
+            if vector is not None:
+                _topic_vectors.move_to_end((backend, topic))
+                vectors[topic] = vector
+
+    # Embedded outside the lock; another ranking may embed the same topics
+    missing = [topic for topic in topics if topic not in vectors]
+    for start in range(0, len(missing), RANK_EMBED_BATCH_SIZE):
+        batch = missing[start : start + RANK_EMBED_BATCH_SIZE]
+        for topic, vector in zip(batch, store.embedding.embed_documents(batch)):
+            vectors[topic] = np.asarray(vector, dtype=np.float32)
+        with _topic_lock:
+            for topic in batch:
+                _topic_vectors[(backend, topic)] = vectors[topic]
+            while len(_topic_vectors) > RANK_TOPIC_CACHE_SIZE:
+                _topic_vectors.popitem(last=False)
+        progress("embed", min(start + len(batch), len(missing)), len(missing))
+
+    return np.vstack([vectors[topic] for topic in topics])
+
+
+def rank_labs(
+    urls: list[str],
+    firecrawl_api_key: str = None,
+    texts: dict = None,
+    store=None,
+    progress=None,
+) -> LabRanking:
+    """Rank professors' labs by fit with a CV.
+
+    Args:
+        urls: Professors' websites; duplicates are ranked once
+        firecrawl_api_key: Firecrawl API key for sites not in ``texts``
+        texts: Already crawled site text by URL, used instead of crawling
+        store: CV index to rank against (the CLI's loaded CV by default)
+        progress: Optional callback(stage, done, total) for "crawl" and "embed"
+
+    Returns:
+        The labs ranked best first, with the sites that failed
+    """
+    # Read the store once: a background ingestion may swap it meanwhile
+    store = store if store is not None else tools.default_kb.store
+    if store is None or len(store) == 0:
+        raise ValueError("No CV is loaded. Load a CV before ranking labs.")
+    progress = progress or (lambda stage, done, total: None)
+
+    given = {canonicalize_url(url): text for url, text in (texts or {}).items()}
+    urls = list(dict.fromkeys(canonicalize_url(url) for url in urls))
+    timings = {}
+
+    with span("rank.labs", labs=len(urls)):
+        started = time.perf_counter()
+        labs = {}
+        for url in urls:
+            stored = None if url in given else lookup_profile(url, firecrawl_api_key)
+            if stored is not None:
+                labs[url] = (stored.profile, stored.topics)
+        to_crawl = [url for url in urls if url not in given and url not in labs]
+        with span("rank.crawl", sites=len(to_crawl), stored=len(labs)):
+            crawled, failed = _crawl_all(to_crawl, firecrawl_api_key, progress)
+        timings["crawl"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for url, text in {**given, **crawled}.items():
+            if url in crawled:
+                profile = remember_profile(url, text) or extract_profile(text, url)
+            else:
+                profile = extract_profile(text, url)
+            labs[url] = (profile, profile_topics(profile, text))
+        labs = [(url, *labs[url]) for url in urls if url in labs]
+        # Each distinct topic is embedded and scored once, whichever lab has it
+        topics = list(dict.fromkeys(topic for _, _, lab in labs for topic in lab))
+        row = {topic: index for index, topic in enumerate(topics)}
+        with span("rank.embed", topics=len(topics)):
+            vectors = _embed_topics(store, topics, progress) if topics else None
+        timings["embed"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with span("rank.score", topics=len(topics), chunks=len(store)):
+            similarities = (
+                store.score_matrix(vectors)
+                if vectors is not None
+                else np.zeros((0, len(store)), dtype=np.float32)
+            )
+            ranked = [
+                LabFit(
+                    url,
+                    profile,
+                    fit_from_similarities(
+                        similarities[[row[topic] for topic in lab_topics]],
+                        lab_topics,
+                        store,
+                    ),
+                )
+                for url, profile, lab_topics in labs
+            ]
+        # Stable: labs with the same score keep the order they were given in
+        ranked.sort(key=lambda lab: -lab.fit.score)
+        timings["score"] = time.perf_counter() - started
+
+    return LabRanking(ranked, failed, timings)
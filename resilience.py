@@ -0,0 +1,509 @@
+"""
+Failure handling for calls to remote model backends.
+
+A CircuitBreaker tracks one backend. After BREAKER_FAILURE_THRESHOLD
+consecutive failures it opens, and calls are rejected immediately instead of
+waiting for another failed request. After BREAKER_RESET_SECONDS it lets a
+single probe call through (half-open). If the probe succeeds the breaker
+closes; if it fails, the breaker stays open for another interval. A broken
+backend therefore costs one failed call per interval, not one per request.
+
+Breakers are shared by name through ``get_breaker``, so every engine using
+the same backend sees the same health state.
+
+A CallPolicy bounds the latency of chat model calls. Each attempt gets a
+timeout and the whole call a deadline. Retryable errors (rate limits, 5xx,
+timeouts) are retried with jittered exponential backoff. Non-streaming
+calls can be hedged: if the first request has not answered after the p95
+latency of recent calls, an identical request is sent and the first answer
+wins. Streaming calls get the timeout for their first chunk and
+CHAT_STREAM_IDLE_SECONDS between chunks, within the same deadline, and are
+only retried before their first chunk. Every call's outcome is recorded in
+CallMetrics.
+"""
+
+import contextvars
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from langchain_core.embeddings import Embeddings
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Consecutive failures that open a breaker
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+# Seconds an open breaker waits before letting a probe call through
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# Seconds one chat model request may take
+CHAT_TIMEOUT_SECONDS = float(os.getenv("CHAT_TIMEOUT_SECONDS", "60"))
+# Seconds a chat call may take across all its retries
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "150"))
+# Seconds a streaming chat call may go without a new chunk
+CHAT_STREAM_IDLE_SECONDS = float(os.getenv("CHAT_STREAM_IDLE_SECONDS", "30"))
+CHAT_MAX_RETRIES = int(os.getenv("CHAT_MAX_RETRIES", "2"))
+# First backoff in seconds; doubled per retry and jittered
+CHAT_RETRY_BACKOFF = float(os.getenv("CHAT_RETRY_BACKOFF", "1.0"))
+# Send a duplicate of slow non-streaming calls (tool selection steps)
+CHAT_HEDGE_ENABLED = os.getenv("CHAT_HEDGE_ENABLED", "false").lower() == "true"
+# Hedge delay until enough calls were seen to use their p95 latency
+CHAT_HEDGE_DELAY = float(os.getenv("CHAT_HEDGE_DELAY", "4.0"))
+CHAT_HEDGE_MIN_DELAY = 0.5
+# Latencies kept for the percentiles
+METRICS_WINDOW = 500
+
+# HTTP statuses and status names worth retrying
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+_RETRYABLE_TEXT = re.compile(
+    r"\b(408|429|500|502|503|504)\b|RESOURCE_EXHAUSTED|UNAVAILABLE|"
+    r"DEADLINE_EXCEEDED|INTERNAL|timed? ?out",
+    re.IGNORECASE,
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose breaker is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(
+            f"{name} is unavailable after repeated failures; "
+            f"retrying in {retry_in:.0f}s"
+        )
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Closed/open/half-open health state of one backend.
+
+    Args:
+        name: Backend name shown in errors and metrics
+        failure_threshold: Consecutive failures that open the breaker
+        reset_seconds: Seconds before an open breaker allows a probe
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = BREAKER_RESET_SECONDS,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.probes = 0
+        self.opens = 0
+        self._probe_running = False
+        self._lock = threading.Lock()
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker allows its next probe"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_seconds - time.time())
+
+    def allow(self) -> bool:
+        """Whether a call may go to the backend now (counts it if so)"""
+        with self._lock:
+            if self.state == OPEN and self.retry_in() == 0:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                # Only one probe at a time; the rest are rejected meanwhile
+                if self._probe_running:
+                    self.rejected += 1
+                    return False
+                self._probe_running = True
+                self.probes += 1
+            elif self.state == OPEN:
+                self.rejected += 1
+                return False
+            self.calls += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probe_running = False
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            probe_failed = self.state == HALF_OPEN
+            self._probe_running = False
+            if probe_failed or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opens += 1
+                self.state = OPEN
+                self.opened_at = time.time()
+
+    def call(self, func, *args, **kwargs):
+        """Run ``func`` through the breaker.
+
+        Raises:
+            CircuitOpenError: The breaker is open, ``func`` was not called
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self.state,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "probes": self.probes,
+                "opens": self.opens,
+                "retry_in": self.retry_in(),
+                "last_error": self.last_error,
+            }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """The shared breaker of a backend, created on first use"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def breaker_stats() -> list[dict]:
+    """Metrics of every breaker created so far"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [breaker.stats() for breaker in breakers]
+
+
+class GuardedEmbeddings(Embeddings):
+    """Embeddings that go through a circuit breaker.
+
+    Args:
+        embeddings: The wrapped engine
+        breaker: Breaker of the engine's backend
+    """
+
+    def __init__(self, embeddings: Embeddings, breaker: CircuitBreaker):
+        self.embeddings = embeddings
+        self.breaker = breaker
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.breaker.call(self.embeddings.embed_query, text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.breaker.call(self.embeddings.embed_documents, texts)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an error (or one it was raised from) is transient"""
+    while error is not None:
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        code = getattr(error, "code", None) or getattr(error, "status_code", None)
+        if isinstance(code, int) and code in RETRYABLE_CODES:
+            return True
+        if _RETRYABLE_TEXT.search(str(error)):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class CallMetrics:
+    """Outcomes and latencies of the calls made under a policy.
+
+    Args:
+        name: Name shown in health displays
+        window: Number of recent latencies kept for percentiles
+    """
+
+    def __init__(self, name: str, window: int = METRICS_WINDOW):
+        self.name = name
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.outcomes = {}
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(
+        self,
+        outcome: str,
+        latency: float,
+        attempts: int,
+        hedged: bool = False,
+        hedge_won: bool = False,
+    ):
+        with self._lock:
+            self.calls += 1
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            self.retries += attempts - 1
+            self.hedges += hedged
+            self.hedge_wins += hedge_won
+            if outcome == "ok":
+                self._latencies.append(latency)
+
+    def percentile(self, pct: float, min_samples: int = 1):
+        """Latency percentile of successful calls, None with too few samples"""
+        with self._lock:
+            latencies = list(self._latencies)
+        if len(latencies) < min_samples:
+            return None
+        return _percentile(latencies, pct)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "outcomes": dict(self.outcomes),
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class CallPolicy:
+    """Timeouts, retries and hedging for calls to one backend.
+
+    Args:
+        metrics: Where call outcomes are recorded
+        timeout: Seconds one attempt may take (for a stream, until its first
+            chunk)
+        deadline: Seconds the call may take across attempts
+        idle_timeout: Seconds a stream may wait for its next chunk
+        max_retries: Retries after the first attempt
+        backoff: First backoff in seconds (doubled per retry, jittered)
+        hedge: Hedge non-streaming calls
+        hedge_delay: Hedge delay until the metrics have a p95
+    """
+
+    def __init__(
+        self,
+        metrics: CallMetrics,
+        timeout: float = CHAT_TIMEOUT_SECONDS,
+        deadline: float = CHAT_DEADLINE_SECONDS,
+        idle_timeout: float = CHAT_STREAM_IDLE_SECONDS,
+        max_retries: int = CHAT_MAX_RETRIES,
+        backoff: float = CHAT_RETRY_BACKOFF,
+        hedge: bool = CHAT_HEDGE_ENABLED,
+        hedge_delay: float = CHAT_HEDGE_DELAY,
+    ):
+        self.metrics = metrics
+        self.timeout = timeout
+        self.deadline = deadline
+        self.idle_timeout = idle_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+
+    def _hedge_after(self) -> float:
+        p95 = self.metrics.percentile(95, min_samples=20)
+        return max(CHAT_HEDGE_MIN_DELAY, p95 if p95 is not None else self.hedge_delay)
+
+    def _sleep_before_retry(self, attempt: int, error, ends_at: float) -> bool:
+        """Back off before another attempt; False when no retry is allowed"""
+        if attempt > self.max_retries or not is_retryable(error):
+            return False
+        delay = random.uniform(0, self.backoff * 2 ** (attempt - 1))
+        if time.monotonic() + delay >= ends_at:
+            return False
+        time.sleep(delay)
+        return True
+
+    def _attempt(self, func, ends_at: float, hedge: bool):
+        """One attempt, hedged if asked; returns (result, hedged, hedge_won)"""
+        attempt_ends = min(ends_at, time.monotonic() + self.timeout)
+        futures = [_pool.submit(contextvars.copy_context().run, func)]
+        if hedge:
+            hedge_at = min(attempt_ends, time.monotonic() + self._hedge_after())
+            try:
+                return _first_success(futures, hedge_at), False, False
+            except TimeoutError:
+                futures.append(_pool.submit(contextvars.copy_context().run, func))
+        result = _first_success(futures, attempt_ends)
+        winner = next(
+            i for i, f in enumerate(futures) if f.done() and not f.exception()
+        )
+        return result, len(futures) > 1, winner == 1
+
+    def run(self, func, hedge: bool = None):
+        """Call ``func`` with the policy's timeout, retries and hedging"""
+        hedge = self.hedge if hedge is None else hedge
+        started = time.monotonic()
+        ends_at = started + self.deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result, hedged, hedge_won = self._attempt(func, ends_at, hedge)
+            except Exception as e:
+                if self._sleep_before_retry(attempt, e, ends_at):
+                    continue
+                self.metrics.record(_outcome(e), time.monotonic() - started, attempt)
+                raise
+            self.metrics.record(
+                "ok", time.monotonic() - started, attempt, hedged, hedge_won
+            )
+            return result
+
+    def _stream_attempt(self, open_stream, ends_at: float):
+        """Yield the chunks of one stream, read in a background thread so a
+        stalled stream can be abandoned"""
+        chunks = queue.Queue()
+        stop = threading.Event()
+        threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(_read_stream, open_stream, chunks, stop),
+            name="model-stream",
+            daemon=True,
+        ).start()
+        wait_for = self.timeout
+        try:
+            while True:
+                timeout = min(wait_for, ends_at - time.monotonic())
+                try:
+                    chunk, error = chunks.get(timeout=max(0.0, timeout))
+                except queue.Empty:
+                    raise TimeoutError("model stream timed out") from None
+                if error is not None:
+                    raise error
+                if chunk is _STREAM_END:
+                    return
+                yield chunk
+                wait_for = self.idle_timeout
+        finally:
+            # An abandoned stream stops at its next chunk
+            stop.set()
+
+    def stream(self, open_stream):
+        """Yield from ``open_stream()``, retrying failures before the first
+        chunk (later failures are raised: the chunks are already shown)"""
+        started = time.monotonic()
+        ends_at = started + self.deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            yielded = False
+            try:
+                for chunk in self._stream_attempt(open_stream, ends_at):
+                    yielded = True
+                    yield chunk
+            except Exception as e:
+                if not yielded and self._sleep_before_retry(attempt, e, ends_at):
+                    continue
+                self.metrics.record(_outcome(e), time.monotonic() - started, attempt)
+                raise
+            self.metrics.record("ok", time.monotonic() - started, attempt)
+            return
+
+
+_STREAM_END = object()
+
+
+def _read_stream(open_stream, chunks: queue.Queue, stop: threading.Event):
+    """Put each chunk of ``open_stream()`` on ``chunks`` as (chunk, None),
+    then (_STREAM_END, None), or (None, error) if it fails"""
+    try:
+        stream = open_stream()
+        try:
+            for chunk in stream:
+                if stop.is_set():
+                    return
+                chunks.put((chunk, None))
+        finally:
+            stream.close()
+        chunks.put((_STREAM_END, None))
+    except Exception as e:
+        chunks.put((None, e))
+
+
+def _outcome(error: Exception) -> str:
+    if isinstance(error, TimeoutError) or "timed out" in str(error).lower():
+        return "timeout"
+    return "error"
+
+
+def _first_success(futures: list, deadline: float):
+    """Result of the first future to succeed, or the last error
+
+    Raises:
+        TimeoutError: None succeeded before ``deadline`` (monotonic time)
+    """
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(
+            pending,
+            timeout=max(0.0, deadline - time.monotonic()),
+            return_when=FIRST_COMPLETED,
+        )
+        if not done:
+            raise TimeoutError("model call timed out")
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+# Attempts run here so they can be timed out and hedged; a timed out attempt
+# finishes in the background and its result is dropped
+_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="model-call")
+
+_policies: dict[str, CallPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_call_policy(name: str) -> CallPolicy:
+    """Shared call policy of a backend (e.g. chat.main), created on first use"""
+    with _policies_lock:
+        if name not in _policies:
+            _policies[name] = CallPolicy(CallMetrics(name))
+        return _policies[name]
+
+
+def call_stats() -> list[dict]:
+    """Metrics of every call policy created so far"""
+    with _policies_lock:
+        policies = list(_policies.values())
+    return [policy.metrics.stats() for policy in policies]
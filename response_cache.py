@@ -0,0 +1,563 @@
+"""
+Opt-in exact-match cache for agent responses.
+
+A turn is keyed by the chat model, its temperature, the system prompt, the
+loaded CV index and the normalized conversation so far. On a hit the stored
+stream chunks are replayed one by one, so the UI renders exactly as it would
+for a live response. Entries live in a local SQLite file with a TTL and an
+LRU size limit.
+
+A second, semantic layer embeds standalone CV questions with the regular
+embedding engine and serves a previous answer when a new question is close
+enough in cosine similarity, so paraphrases hit too. It only ever stores
+answers grounded on the CV knowledge base and never ones that used fresh
+web data. A follow-up question ("and what about her?") means something
+else in every conversation, so it is only matched against questions asked
+after the same recent messages.
+
+Enable with RESPONSE_CACHE_ENABLED=true and/or SEMANTIC_CACHE_ENABLED=true
+in the environment or .env file.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", ".cache/responses.sqlite")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "500"))
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+# Recent messages a follow-up question's semantic cache entries are tied to
+SEMANTIC_CACHE_HISTORY = int(os.getenv("SEMANTIC_CACHE_HISTORY", "4"))
+
+# Answers that used these tools depend on live web data and are never reused
+WEB_TOOLS = {"crawl_website", "fit_score", "lookup_professor"}
+# Answers must be grounded on the CV to be reused for a paraphrase
+GROUNDING_TOOLS = {"kb_tool"}
+
+URL_PATTERN = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+# Words that make a question refer back to the conversation before it
+FOLLOW_UP_PATTERN = re.compile(
+    r"^\W*(and|but|so|or|what about|how about)\b|\b(it|its|this|that|these|"
+    r"those|they|them|their|he|him|his|she|her|above|previous|earlier|again|"
+    r"also|instead|another|same|else)\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different prompts share a key"""
+    return " ".join(str(text).split()).casefold()
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(
+    model: str,
+    temperature: float,
+    system_prompt: str,
+    cv_index_hash: str,
+    messages: list[dict],
+) -> str:
+    """Build the cache key for a turn.
+
+    Args:
+        model: Chat model name
+        temperature: Sampling temperature of the chat model
+        system_prompt: System prompt the agent runs with
+        cv_index_hash: Fingerprint of the loaded CV index ("" if none)
+        messages: Conversation so far as role/content dicts, ending with the
+            new user message
+
+    Returns:
+        A hex digest identifying the turn
+    """
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "system_prompt": hash_text(system_prompt),
+        "cv_index": cv_index_hash or "",
+        "messages": [
+            {"role": m["role"], "content": normalize_text(m["content"])}
+            for m in messages
+        ],
+    }
+    return hash_text(json.dumps(payload, sort_keys=True, ensure_ascii=False))
+
+
+class ResponseCache:
+    """SQLite-backed response store with TTL expiry and LRU eviction"""
+
+    def __init__(
+        self,
+        path: str = RESPONSE_CACHE_PATH,
+        ttl: int = RESPONSE_CACHE_TTL,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+    ):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Streamlit runs each session on its own thread
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                chunks TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        """Return the cached stream chunks for a key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunks, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key: str, chunks: list[str]):
+        """Store the stream chunks of a completed response"""
+        if not chunks:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, json.dumps(chunks, ensure_ascii=False), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+        )
+        self._conn.execute(
+            """
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class SemanticResponseCache:
+    """Nearest-neighbour lookup of previously answered questions.
+
+    Entries are scoped by a caller-provided string (model, prompt and CV
+    index), so an answer is only reused against the same CV it was grounded
+    on, and by the embedding backend, so vectors from different backends are
+    never compared. Embeddings for a scope are held in a matrix and scored in
+    one vectorized product.
+    """
+
+    def __init__(
+        self,
+        embedding_engine,
+        path: str = RESPONSE_CACHE_PATH,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: int = RESPONSE_CACHE_TTL,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+    ):
+        self.embedding_engine = embedding_engine
+        self.backend = (
+            getattr(embedding_engine, "backend_id", None)
+            or type(embedding_engine).__name__
+        )
+        self.path = Path(path)
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # scope -> (row ids, normalized embedding matrix)
+        self._matrices = {}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS semantic_responses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT NOT NULL,
+                query TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                chunks TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS semantic_scope ON semantic_responses(scope)"
+        )
+        self._conn.commit()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(
+            self.embedding_engine.embed_query(normalize_text(query)),
+            dtype=np.float32,
+        )
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _backend_scope(self, scope: str) -> str:
+        return f"{self.backend}|{scope}"
+
+    def _load_scope(self, scope: str):
+        if scope not in self._matrices:
+            rows = self._conn.execute(
+                "SELECT id, embedding FROM semantic_responses "
+                "WHERE scope = ? AND created_at >= ?",
+                (scope, time.time() - self.ttl),
+            ).fetchall()
+            ids = [row[0] for row in rows]
+            if rows:
+                matrix = np.stack(
+                    [np.frombuffer(row[1], dtype=np.float32) for row in rows]
+                )
+            else:
+                matrix = np.empty((0, 0), dtype=np.float32)
+            self._matrices[scope] = (ids, matrix)
+        return self._matrices[scope]
+
+    def get(self, scope: str, query: str, vector: np.ndarray = None):
+        """Return (chunks, matched query, similarity) or None on a miss"""
+        scope = self._backend_scope(scope)
+        if vector is None:
+            vector = self.embed(query)
+
+        with self._lock:
+            ids, matrix = self._load_scope(scope)
+            if not ids or matrix.shape[1] != vector.shape[0]:
+                self.misses += 1
+                return None
+
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            row = self._conn.execute(
+                "SELECT query, chunks, created_at FROM semantic_responses "
+                "WHERE id = ?",
+                (ids[best],),
+            ).fetchone()
+            if row is None or time.time() - row[2] > self.ttl:
+                self._matrices.pop(scope, None)
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE semantic_responses SET last_used = ? WHERE id = ?",
+                (time.time(), ids[best]),
+            )
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(row[1]), row[0], similarity
+
+    def put(self, scope: str, query: str, chunks: list[str], vector=None):
+        if not chunks:
+            return
+        scope = self._backend_scope(scope)
+        if vector is None:
+            vector = self.embed(query)
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO semantic_responses "
+                "(scope, query, embedding, chunks, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    scope,
+                    query,
+                    np.asarray(vector, dtype=np.float32).tobytes(),
+                    json.dumps(chunks, ensure_ascii=False),
+                    now,
+                    now,
+                ),
+            )
+            self._conn.execute(
+                "DELETE FROM semantic_responses WHERE created_at < ?",
+                (now - self.ttl,),
+            )
+            self._conn.execute(
+                """
+                DELETE FROM semantic_responses WHERE id IN (
+                    SELECT id FROM semantic_responses
+                    ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self._conn.commit()
+            # Eviction may touch any scope, so rebuild matrices lazily
+            self._matrices.clear()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM semantic_responses")
+            self._conn.commit()
+            self._matrices.clear()
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+_semantic_caches = {}
+
+
+def get_response_cache():
+    """Return the shared response cache, or None when caching is disabled"""
+    global _response_cache
+
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+    return _response_cache
+
+
+def cache_stats() -> list[dict]:
+    """Hit/miss counters of the caches created in this process"""
+    stats = []
+    if _response_cache is not None:
+        total = _response_cache.hits + _response_cache.misses
+        stats.append(
+            {
+                "cache": "exact",
+                "hits": _response_cache.hits,
+                "misses": _response_cache.misses,
+                "hit_rate": _response_cache.hits / total if total else 0.0,
+            }
+        )
+    for cache in _semantic_caches.values():
+        stats.append(
+            {
+                "cache": "semantic",
+                "hits": cache.hits,
+                "misses": cache.misses,
+                "hit_rate": cache.hit_rate,
+            }
+        )
+    return stats
+
+
+def get_semantic_cache(api_key: str = None):
+    """Return the semantic cache for an API key, or None when disabled"""
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+
+    with _response_cache_lock:
+        if api_key not in _semantic_caches:
+            from model import get_embedding_engine
+
+            _semantic_caches[api_key] = SemanticResponseCache(
+                get_embedding_engine(api_key)
+            )
+    return _semantic_caches[api_key]
+
+
+def is_standalone(query: str) -> bool:
+    """Whether a question can be understood without the conversation before
+    it: at least three words and no reference back to earlier messages"""
+    return len(query.split()) >= 3 and not FOLLOW_UP_PATTERN.search(query)
+
+
+def is_semantically_cacheable(query: str, tools_used: set = None) -> bool:
+    """Whether a standalone question may be served from or stored in the
+    semantic cache.
+
+    Questions containing URLs always go to the agent. When ``tools_used`` is
+    given (storing a fresh answer), the answer must have been grounded on the
+    CV and must not have used web tools.
+    """
+    if URL_PATTERN.search(query):
+        return False
+    if tools_used is None:
+        return True
+    return bool(tools_used & GROUNDING_TOOLS) and not tools_used & WEB_TOOLS
+
+
+class TurnCache:
+    """Exact and semantic cache lookups for one chat turn.
+
+    Args:
+        model: Chat model name
+        temperature: Sampling temperature of the chat model
+        system_prompt: System prompt the agent runs with
+        cv_index_hash: Fingerprint of the loaded CV index
+        messages: Conversation so far, ending with the new user message
+        api_key: Google API key for the semantic cache's embeddings
+    """
+
+    def __init__(
+        self,
+        model: str,
+        temperature: float,
+        system_prompt: str,
+        cv_index_hash: str,
+        messages: list[dict],
+        api_key: str = None,
+    ):
+        self.query = messages[-1]["content"]
+        self.exact = get_response_cache()
+        self.semantic = get_semantic_cache(api_key) if cv_index_hash else None
+        self.key = None
+        self.scope = None
+        self.vector = None
+        # "exact" or "semantic" after a hit
+        self.source = None
+        self.matched_query = None
+
+        if self.exact is not None:
+            self.key = make_cache_key(
+                model, temperature, system_prompt, cv_index_hash, messages
+            )
+        if self.semantic is not None:
+            # Standalone questions share one scope across conversations; a
+            # follow-up is scoped to the recent messages it refers to
+            history = messages[:-1]
+            if history and not is_standalone(self.query):
+                history = history[-SEMANTIC_CACHE_HISTORY:]
+            else:
+                history = []
+            self.scope = make_cache_key(
+                model, temperature, system_prompt, cv_index_hash, history
+            )
+
+    def lookup(self):
+        """Return cached chunks for this turn, or None on a miss"""
+        if self.exact is not None:
+            chunks = self.exact.get(self.key)
+            if chunks is not None:
+                self.source = "exact"
+                return chunks
+
+        if self.semantic is not None and is_semantically_cacheable(self.query):
+            try:
+                self.vector = self.semantic.embed(self.query)
+                hit = self.semantic.get(self.scope, self.query, self.vector)
+            except Exception:
+                # The cache must never break a turn
+                hit = None
+            if hit is not None:
+                chunks, self.matched_query, _ = hit
+                self.source = "semantic"
+                return chunks
+
+        return None
+
+    def store(self, chunks: list, tools_used: set = None):
+        """Store the chunks of a freshly generated answer. Answers built on
+        live web data (WEB_TOOLS) are not stored in either layer."""
+        if not chunks or not all(isinstance(c, str) for c in chunks):
+            return
+        tools_used = tools_used or set()
+
+        if self.exact is not None and not tools_used & WEB_TOOLS:
+            self.exact.put(self.key, chunks)
+
+        if self.semantic is not None and is_semantically_cacheable(
+            self.query, tools_used
+        ):
+            try:
+                self.semantic.put(self.scope, self.query, chunks, self.vector)
+            except Exception:
+                pass
+
+
+def tools_used_in_turn(messages: list) -> set:
+    """Names of the tools called since the last human message in a thread"""
+    used = set()
+    for message in reversed(messages):
+        if getattr(message, "type", None) == "human":
+            break
+        if getattr(message, "type", None) == "tool":
+            used.add(message.name)
+    return used
+
+
+def replay(chunks: list[str]):
+    """Yield cached chunks one by one, like a live token stream"""
+    for chunk in chunks:
+        yield chunk
+
+
+def remember_exchange(agent, config: dict, user_message: str, response_text: str):
+    """Append a cache-served exchange to the agent's thread history.
+
+    Keeps follow-up questions coherent even though the agent never ran for
+    the cached turn.
+    """
+    from langchain_core.messages import AIMessage, HumanMessage
+    from agent_graph import append_to_thread
+
+    append_to_thread(
+        agent,
+        config,
+        [HumanMessage(content=user_message), AIMessage(content=response_text)],
+    )
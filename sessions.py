@@ -0,0 +1,277 @@
+"""
+Per-session resources of the Streamlit app, with idle eviction.
+
+Each browser session holds an agent (with its InMemorySaver thread), a fast
+path pipeline, its CV index and the chat transcript. SessionManager owns
+these objects instead of ``st.session_state``, so it can release them:
+
+- After each turn, a thread bigger than SESSION_MAX_MB is compacted to a
+  single checkpoint. If it is still too big, it is cut to its most recent
+  messages.
+- Sessions idle for SESSION_IDLE_TTL seconds are spilled to disk, and so
+  are the least recently used ones while all sessions together exceed
+  SESSIONS_MAX_MB. Spilling writes the transcript, the thread's messages
+  and the CV index to SESSION_SPILL_DIR and drops the agent. The session
+  is rehydrated the next time it runs.
+"""
+
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+from agent_graph import compact_thread, thread_messages, thread_size_bytes
+from tools import CVKnowledgeBase
+from rich.console import Console
+from dotenv import load_dotenv
+
+load_dotenv()
+
+console = Console()
+
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", "900"))
+SESSION_MAX_MB = float(os.getenv("SESSION_MAX_MB", "32"))
+SESSIONS_MAX_MB = float(os.getenv("SESSIONS_MAX_MB", "512"))
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", ".cache/sessions")
+# Spilled sessions nobody came back to are deleted after this many seconds
+SESSION_SPILL_TTL = int(os.getenv("SESSION_SPILL_TTL", "86400"))
+# Minimum seconds between two eviction sweeps
+SWEEP_INTERVAL = 30
+
+MB = 1024 * 1024
+
+
+class SessionResources:
+    """The heavy objects of one browser session.
+
+    Attributes:
+        agent: The session's agent graph (None until initialized or after a
+            spill)
+        fast_path: The session's fast path pipeline
+        variants: The session's email variant drafter
+        cv: The session's CV index, searched by its tools
+        messages: Chat transcript as {"role", "content"} dicts
+        restore_history: Thread messages to replay into a rebuilt agent
+            after the session was rehydrated, otherwise None
+    """
+
+    def __init__(self, session_id: str, config: dict):
+        self.session_id = session_id
+        self.config = config
+        self.agent = None
+        self.fast_path = None
+        self.variants = None
+        self.cv = CVKnowledgeBase()
+        self.messages = []
+        self.restore_history = None
+        self.spilled = False
+        self.last_active = time.time()
+        self.approx_bytes = 0
+        # Held while a turn runs so the session is never spilled mid-turn
+        self.lock = threading.RLock()
+
+    def estimate_bytes(self) -> int:
+        """Approximate memory of the transcript, the agent's thread and the
+        CV index"""
+        size = sum(len(str(m.get("content", ""))) for m in self.messages)
+        size += self.cv.memory_bytes()
+        if self.agent is not None:
+            size += thread_size_bytes(self.agent, self.config)
+        self.approx_bytes = size
+        return size
+
+
+class SessionManager:
+    """Tracks every session's resources, memory and last activity.
+
+    Args:
+        idle_ttl: Seconds of inactivity before a session is spilled
+        session_max_bytes: Per-session cap enforced after each turn
+        total_max_bytes: Budget for all sessions kept in memory
+        spill_dir: Folder for spilled sessions
+    """
+
+    def __init__(
+        self,
+        idle_ttl: int = SESSION_IDLE_TTL,
+        session_max_bytes: int = int(SESSION_MAX_MB * MB),
+        total_max_bytes: int = int(SESSIONS_MAX_MB * MB),
+        spill_dir: str = SESSION_SPILL_DIR,
+    ):
+        self.idle_ttl = idle_ttl
+        self.session_max_bytes = session_max_bytes
+        self.total_max_bytes = total_max_bytes
+        self.spill_dir = Path(spill_dir)
+        self._lock = threading.Lock()
+        self._sessions: dict[str, SessionResources] = {}
+        self._last_sweep = 0.0
+        self.spills = 0
+        self.rehydrations = 0
+
+    def _spill_path(self, session_id: str) -> Path:
+        return self.spill_dir / f"{session_id}.pkl"
+
+    def acquire(self, session_id: str, config: dict) -> SessionResources:
+        """Return a session's resources, rehydrating them if they were spilled"""
+        with self._lock:
+            resources = self._sessions.get(session_id)
+            if resources is None:
+                resources = SessionResources(session_id, config)
+                self._sessions[session_id] = resources
+            resources.last_active = time.time()
+
+        if resources.spilled:
+            with resources.lock:
+                if resources.spilled:
+                    self._rehydrate(resources)
+
+        if time.time() - self._last_sweep >= SWEEP_INTERVAL:
+            self.sweep(exclude=session_id)
+        return resources
+
+    def enforce_cap(self, resources: SessionResources):
+        """Shrink a session's agent thread to fit the per-session cap"""
+        if resources.estimate_bytes() <= self.session_max_bytes:
+            return
+        if resources.agent is None:
+            return
+
+        with resources.lock:
+            compact_thread(resources.agent, resources.config)
+            keep = len(thread_messages(resources.agent, resources.config))
+            # Still too big: halve the remembered conversation until it fits
+            while resources.estimate_bytes() > self.session_max_bytes and keep > 2:
+                keep //= 2
+                compact_thread(resources.agent, resources.config, keep_messages=keep)
+        console.print(
+            f"🗜️  Compacted session {resources.session_id[:8]} to "
+            f"{resources.approx_bytes / MB:.1f} MB",
+            style="dim",
+        )
+
+    def sweep(self, exclude: str = None):
+        """Spill idle sessions, then least recently used ones over budget"""
+        self._last_sweep = time.time()
+        with self._lock:
+            sessions = sorted(self._sessions.values(), key=lambda r: r.last_active)
+
+        now = time.time()
+        in_memory = [r for r in sessions if not r.spilled]
+        for resources in in_memory:
+            if resources.session_id != exclude and (
+                now - resources.last_active >= self.idle_ttl
+            ):
+                self._try_spill(resources)
+
+        in_memory = [r for r in in_memory if not r.spilled]
+        total = sum(self._estimate(r) for r in in_memory)
+        for resources in in_memory:
+            if total <= self.total_max_bytes:
+                break
+            if resources.session_id != exclude and self._try_spill(resources):
+                total -= resources.approx_bytes
+
+        self._forget_abandoned(now)
+
+    def _estimate(self, resources: SessionResources) -> int:
+        # A session that is running a turn keeps its last estimate
+        if not resources.lock.acquire(blocking=False):
+            return resources.approx_bytes
+        try:
+            return resources.estimate_bytes()
+        finally:
+            resources.lock.release()
+
+    def _try_spill(self, resources: SessionResources) -> bool:
+        # A session that is running a turn is skipped, not waited for
+        if not resources.lock.acquire(blocking=False):
+            return False
+        try:
+            if resources.spilled:
+                return False
+            self._spill(resources)
+            return True
+        finally:
+            resources.lock.release()
+
+    def _spill(self, resources: SessionResources):
+        history = None
+        if resources.agent is not None:
+            history = thread_messages(resources.agent, resources.config)
+        elif resources.restore_history is not None:
+            history = resources.restore_history
+
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        path = self._spill_path(resources.session_id)
+        with open(path, "wb") as f:
+            pickle.dump(
+                {
+                    "messages": resources.messages,
+                    "history": history,
+                    "cv": resources.cv,
+                },
+                f,
+            )
+
+        resources.agent = None
+        resources.fast_path = None
+        resources.variants = None
+        resources.cv = CVKnowledgeBase()
+        resources.messages = []
+        resources.restore_history = None
+        resources.spilled = True
+        self.spills += 1
+        console.print(
+            f"💤 Spilled idle session {resources.session_id[:8]} "
+            f"({resources.approx_bytes / MB:.1f} MB) to {path}",
+            style="dim",
+        )
+
+    def _rehydrate(self, resources: SessionResources):
+        path = self._spill_path(resources.session_id)
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+            path.unlink()
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            console.print(
+                f"⚠️  Could not restore session {resources.session_id[:8]}: {e}",
+                style="yellow",
+            )
+            state = {"messages": [], "history": None}
+
+        # The index comes back without its embedding engine; the app gives
+        # it one (CVKnowledgeBase.restore_engine)
+        resources.cv = state.get("cv") or CVKnowledgeBase()
+        resources.messages = state["messages"]
+        resources.restore_history = state["history"]
+        resources.spilled = False
+        self.rehydrations += 1
+
+    def _forget_abandoned(self, now: float):
+        """Drop spilled sessions (and their files) nobody came back to"""
+        with self._lock:
+            abandoned = [
+                session_id
+                for session_id, resources in self._sessions.items()
+                if resources.spilled
+                and now - resources.last_active >= SESSION_SPILL_TTL
+            ]
+            for session_id in abandoned:
+                del self._sessions[session_id]
+        for session_id in abandoned:
+            self._spill_path(session_id).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        """Session counts and the memory held by sessions in memory"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        in_memory = [r for r in sessions if not r.spilled]
+        return {
+            "sessions": len(sessions),
+            "in_memory": len(in_memory),
+            "spilled": len(sessions) - len(in_memory),
+            "bytes": sum(r.approx_bytes for r in in_memory),
+            "spills": self.spills,
+            "rehydrations": self.rehydrations,
+        }
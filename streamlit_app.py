@@ -7,12 +7,26 @@ Write. Send. Hope. Repeat. (Now with AI)
 import os
 import uuid
 import streamlit as st
-from langgraph.prebuilt import create_react_agent
+from agent_graph import append_to_thread, build_agent
 from langgraph.checkpoint.memory import InMemorySaver
 from system_prompt import system_prompt
-from model import get_model
-from tools import create_tools_with_api_keys, initialize_vectorstore_with_cv
-import tempfile
+from model import get_model, get_router, CHAT_MODEL, CHAT_TEMPERATURE
+from tools import (
+    create_tools_with_api_keys,
+    cv_fingerprint,
+    get_cv_index_hash,
+    reuse_cv_index,
+)
+from cv_jobs import submit_cv_ingest
+from crawler import get_crawler
+from profile_store import has_fresh_profile
+from pipeline import FAST_PATH_TOOLS, build_fast_path
+from variants import build_variant_drafter
+from response_cache import TurnCache, remember_exchange, replay
+from tracing import span, span_tree, tracer
+from usage import usage_ledger
+from resilience import breaker_stats, call_stats
+from sessions import SessionManager
 from ui_theme import DARK_THEME_CSS
 
 # Page configuration
@@ -23,30 +37,66 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
+# Number of chat messages rendered per window; older ones load on demand
+CHAT_WINDOW_SIZE = 20
+
 # Apply the dark mode CSS
 st.markdown(DARK_THEME_CSS, unsafe_allow_html=True)
 
 
 # Initialize session state FIRST (before using any session state variables)
-if "agent" not in st.session_state:
-    st.session_state.agent = None
 if "cv_loaded" not in st.session_state:
     st.session_state.cv_loaded = False
 if "cv_path" not in st.session_state:
     st.session_state.cv_path = None
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+if "cv_job" not in st.session_state:
+    # Background ingestion of the last uploaded CV, polled by the sidebar
+    st.session_state.cv_job = None
 if "config" not in st.session_state:
-    st.session_state.config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    # The session id keys the session manager and, through the run
+    # metadata, the usage ledger
+    st.session_state.config = {
+        "configurable": {"thread_id": str(uuid.uuid4())},
+        "metadata": {"session_id": str(uuid.uuid4())},
+    }
 if "google_api_key" not in st.session_state:
     st.session_state.google_api_key = ""
 if "firecrawl_api_key" not in st.session_state:
     st.session_state.firecrawl_api_key = ""
+if "chat_window" not in st.session_state:
+    st.session_state.chat_window = CHAT_WINDOW_SIZE
+
+
+@st.cache_resource
+def get_session_manager():
+    """One manager for all sessions of this server process"""
+    return SessionManager()
+
+
+def session_resources():
+    """This session's agent, fast path and transcript.
+
+    They live in the session manager rather than in st.session_state so idle
+    sessions can be spilled to disk. A spilled session's agent is rebuilt on
+    its next run, with its conversation thread restored.
+    """
+    config = st.session_state.config
+    resources = get_session_manager().acquire(config["metadata"]["session_id"], config)
+    # A CV index rehydrated from disk needs its embedding engine back
+    resources.cv.restore_engine(
+        st.session_state.get("google_api_key") or os.getenv("GOOGLE_API_KEY")
+    )
+    if resources.restore_history is not None and resources.agent is None:
+        history, resources.restore_history = resources.restore_history, None
+        if initialize_agent() and history:
+            append_to_thread(resources.agent, config, history)
+    return resources
 
 
 def needs_reinitialization():
     """Check if the agent needs to be reinitialized due to API key changes"""
-    if not st.session_state.agent:
+    agent = session_resources().agent
+    if not agent:
         return True
 
     # Check if current API keys match what the agent was initialized with
@@ -59,10 +109,8 @@ def needs_reinitialization():
 
     # If keys have changed, reinitialization is needed
     if current_google_key != getattr(
-        st.session_state.agent, "_google_api_key", None
-    ) or current_firecrawl_key != getattr(
-        st.session_state.agent, "_firecrawl_api_key", None
-    ):
+        agent, "_google_api_key", None
+    ) or current_firecrawl_key != getattr(agent, "_firecrawl_api_key", None):
         return True
 
     return False
@@ -70,10 +118,14 @@ def needs_reinitialization():
 
 def clear_agent():
     """Clear the agent and reset related state"""
-    st.session_state.agent = None
+    resources = session_resources()
+    resources.agent = None
+    resources.fast_path = None
+    resources.variants = None
     st.session_state.cv_loaded = False
     st.session_state.cv_path = None
-    st.session_state.messages = []
+    resources.messages = []
+    st.session_state.chat_window = CHAT_WINDOW_SIZE
     st.rerun()
 
 
@@ -95,7 +147,7 @@ def safe_error_message(error: Exception, context: str = "") -> str:
     )
 
 
-def check_app_health():
+def check_app_health(reinit_needed: bool = None):
     """Check the overall health of the app and provide guidance"""
     issues = []
     warnings = []
@@ -119,7 +171,9 @@ def check_app_health():
         )
 
     # Check agent status
-    if st.session_state.agent and needs_reinitialization():
+    if reinit_needed is None:
+        reinit_needed = bool(session_resources().agent) and needs_reinitialization()
+    if reinit_needed:
         issues.append("Agent needs reinitialization due to API key changes")
 
     return issues, warnings
@@ -198,401 +252,636 @@ def initialize_agent():
             st.error("❌ Invalid Google API key format. Please check your key.")
             return False
 
-        if st.session_state.agent is None:
+        resources = session_resources()
+        if resources.agent is None:
             checkpointer = InMemorySaver()
             llm = get_model(google_key)  # Pass the API key
             firecrawl_key = st.session_state.get("firecrawl_api_key") or os.getenv(
                 "FIRECRAWL_API_KEY"
             )
-            tools = create_tools_with_api_keys(google_key, firecrawl_key)
-            agent = create_react_agent(
+            tools = create_tools_with_api_keys(google_key, firecrawl_key, resources.cv)
+            agent = build_agent(
                 model=llm,
                 tools=tools,
                 prompt=system_prompt,
                 checkpointer=checkpointer,
+                router=get_router(google_key),
             )
             # Store API keys with the agent for comparison
             agent._google_api_key = google_key
             agent._firecrawl_api_key = firecrawl_key
-            st.session_state.agent = agent
+            resources.agent = agent
+            resources.fast_path = build_fast_path(llm, firecrawl_key, resources.cv)
+            resources.variants = build_variant_drafter(llm, firecrawl_key, resources.cv)
         return True
     except Exception as e:
         safe_msg = safe_error_message(e, "agent initialization")
         st.error(f"Failed to initialize AI Agent: {safe_msg}")
         # Clear the agent on error
-        st.session_state.agent = None
+        session_resources().agent = None
         return False
 
 
 def load_cv_from_upload(uploaded_file):
-    """Load CV from uploaded file"""
+    """Load an uploaded CV, reusing its index if the same file was loaded before
+
+    Returns True when the CV is ready, False when it was submitted for
+    background indexing or could not be read.
+    """
     try:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_path = tmp_file.name
+        data = uploaded_file.getvalue()
+        if reuse_cv_index(cv_fingerprint(data), kb=session_resources().cv):
+            st.session_state.cv_loaded = True
+            st.session_state.cv_path = uploaded_file.name
+            return True
 
         # Get the current Google API key
         google_key = st.session_state.get("google_api_key") or os.getenv(
             "GOOGLE_API_KEY"
         )
-
-        # Initialize vector store with the uploaded CV
-        if initialize_vectorstore_with_cv(tmp_path, google_key):
-            st.session_state.cv_loaded = True
-            st.session_state.cv_path = uploaded_file.name
-            # Clean up temporary file
-            os.unlink(tmp_path)
-            return True
-        else:
-            os.unlink(tmp_path)
-            return False
+        st.session_state.cv_job = submit_cv_ingest(data, google_key, uploaded_file.name)
     except Exception as e:
         safe_msg = safe_error_message(e, "CV loading")
         st.error(f"Error loading CV: {safe_msg}")
-        return False
+    return False
 
 
-def main():
-    # Check if API keys are provided
-    is_valid, message = validate_api_keys()
-    if not is_valid:
-        st.error(f"❌ **{message}**")
-
-        # Show deployment-specific help
-        # Removed deployment detection and specific help messages
-
-        st.info("Please enter your Google API key to get started.")
-
-        # Show a helpful setup guide
-        with st.expander("🚀 **Quick Setup Guide**"):
-            st.markdown("""
-            ### Getting Started with Draft 'n' Pray
-            
-            1. **Get your Google API key:**
-               - Go to [Google AI Studio](https://aistudio.google.com/)
-               - Sign in and create a new API key
-               - Copy the key (it starts with 'AI...')
-            
-            2. **Enter the key in the sidebar:**
-               - Look for the "Google API Key" field on the left
-               - Paste your key there
-               - The app will automatically validate it
-            
-            3. **Initialize the AI Agent:**
-               - Click the "Initialize Agent" button
-               - Wait for confirmation
-               - Start writing emails!
-            
-            **Need help?** Check the "Where to get API keys?" section in the sidebar.
-            """)
+def render_embedding_help():
+    st.info("💡 **Embedding Issue Detected**")
+    st.markdown("""
+    This might be due to:
+    - Invalid Google API key
+    - Network connectivity issues
+    - Google GenAI service availability
 
-        st.stop()
+    Try:
+    1. **Verify your Google API key** is correct
+    2. **Test the embedding engine** using the test button above
+    3. **Check your internet connection**
+    4. **Wait a few minutes** and try again
+    """)
 
-    # Clean header
 
-    # Minimal header like ChatGPT
-    st.markdown(
-        "<h1 class='main-header'>🧾 Draft 'n' Pray</h1>",
-        unsafe_allow_html=True,
+@st.fragment(run_every=1)
+def render_cv_progress():
+    """Poll the background CV job; only rendered while one is running"""
+    job = st.session_state.cv_job
+    if job is None:
+        return
+    if not job.finished:
+        st.progress(job.fraction, text=job.describe())
+        return
+
+    st.session_state.cv_job = None
+    if job.state == "done":
+        # Only this session switches to the new index
+        session_resources().cv.activate(*job.index)
+        job.index = None
+        st.session_state.cv_loaded = True
+        st.session_state.cv_path = job.name
+    st.session_state.cv_result = job
+    # Rerun the whole app so the CV status and hints pick up the new index
+    st.rerun()
+
+
+def render_setup_guide(message: str):
+    """Render the onboarding screen shown while the Google API key is missing"""
+    st.error(f"❌ **{message}**")
+
+    st.info("Please enter your Google API key to get started.")
+
+    # Show a helpful setup guide
+    with st.expander("🚀 **Quick Setup Guide**"):
+        st.markdown("""
+        ### Getting Started with Draft 'n' Pray
+        
+        1. **Get your Google API key:**
+           - Go to [Google AI Studio](https://aistudio.google.com/)
+           - Sign in and create a new API key
+           - Copy the key (it starts with 'AI...')
+        
+        2. **Enter the key in the sidebar:**
+           - Look for the "Google API Key" field on the left
+           - Paste your key there
+           - The app will automatically validate it
+        
+        3. **Initialize the AI Agent:**
+           - Click the "Initialize Agent" button
+           - Wait for confirmation
+           - Start writing emails!
+        
+        **Need help?** Check the "Where to get API keys?" section in the sidebar.
+        """)
+
+
+@st.fragment
+def render_sidebar():
+    """Sidebar for configuration.
+
+    Runs as a fragment so typing a key or pressing a test button only reruns
+    the sidebar. Anything that changes what the chat area shows (agent reset,
+    chat cleared) triggers a full app rerun explicitly.
+    """
+    st.markdown("### 🔑 API Keys")
+
+    google_key = st.text_input(
+        "Google API Key",
+        value=st.session_state.google_api_key,
+        type="password",
+        help="Enter your Google API key for Gemini access",
+        placeholder="Enter your key here...",
+        key="google_key_input",
     )
-    st.markdown(
-        '<p class="subtitle">// Write. Send. Hope. Repeat. (Now with AI) //</p>',
-        unsafe_allow_html=True,
+
+    if not google_key:
+        st.warning("⚠️ Google API key is required to use the AI agent")
+
+    firecrawl_key = st.text_input(
+        "Firecrawl API Key",
+        value=st.session_state.firecrawl_api_key,
+        type="password",
+        help="Enter your Firecrawl API key for web crawling (optional)",
+        placeholder="Enter your key here...",
+        key="firecrawl_key_input",
     )
 
-    # Sidebar for configuration
-    with st.sidebar:
-        st.markdown("### 🔑 API Keys")
-
-        google_key = st.text_input(
-            "Google API Key",
-            value=st.session_state.google_api_key,
-            type="password",
-            help="Enter your Google API key for Gemini access",
-            placeholder="Enter your key here...",
-            key="google_key_input",
-        )
+    if not firecrawl_key:
+        st.info("ℹ️ Firecrawl API key is optional - needed for web crawling features")
 
-        if not google_key:
-            st.warning("⚠️ Google API key is required to use the AI agent")
-
-        firecrawl_key = st.text_input(
-            "Firecrawl API Key",
-            value=st.session_state.firecrawl_api_key,
-            type="password",
-            help="Enter your Firecrawl API key for web crawling (optional)",
-            placeholder="Enter your key here...",
-            key="firecrawl_key_input",
-        )
+    # Help section for API keys
+    with st.expander("🔑 Where to get API keys?"):
+        st.markdown("""
+        **Google API Key (Required):**
+        - Visit [Google AI Studio](https://aistudio.google.com/)
+        - Sign in with your Google account
+        - Create a new API key
+        - Copy and paste it here
+        
+        **Firecrawl API Key (Optional):**
+        - Visit [Firecrawl](https://firecrawl.dev/)
+        - Sign up for an account
+        - Generate an API key
+        - Copy and paste it here
+        
+        **🔒 Security Note:**
+        - Your API keys are stored locally in your browser session
+        - They are never logged or sent to external servers
+        - Keys are automatically cleared when you close the browser
+        """)
 
-        if not firecrawl_key:
-            st.info(
-                "ℹ️ Firecrawl API key is optional - needed for web crawling features"
-            )
+    # Clear API keys button
+    if google_key or firecrawl_key:
+        if st.button("🗑️ Clear API Keys", type="secondary"):
+            st.session_state.google_api_key = ""
+            st.session_state.firecrawl_api_key = ""
+            os.environ.pop("GOOGLE_API_KEY", None)
+            os.environ.pop("FIRECRAWL_API_KEY", None)
+            clear_agent()
+
+    # Update session state and environment variables when keys change.
+    # The chat area depends on the agent, so a key change reruns the whole app.
+    keys_changed = False
+    if google_key != st.session_state.google_api_key:
+        st.session_state.google_api_key = google_key
+        os.environ["GOOGLE_API_KEY"] = google_key
+        # Reset agent when API key changes
+        session_resources().agent = None
+        keys_changed = True
+
+    if firecrawl_key != st.session_state.firecrawl_api_key:
+        st.session_state.firecrawl_api_key = firecrawl_key
+        os.environ["FIRECRAWL_API_KEY"] = firecrawl_key
+        # Reset agent when API key changes
+        session_resources().agent = None
+        keys_changed = True
+
+    if keys_changed:
+        st.rerun()
+
+    # Evaluated once per sidebar run instead of once per status widget
+    reinit_needed = bool(session_resources().agent) and needs_reinitialization()
+
+    # Show API key status
+    st.markdown("#### 📊 API Key Status")
+    google_status = "✅ Configured" if google_key else "❌ Missing"
+    firecrawl_status = "✅ Configured" if firecrawl_key else "ℹ️ Optional"
+
+    st.caption(f"Google: {google_status}")
+    if google_key:
+        st.caption(f"Key: {mask_api_key(google_key)}")
+
+    st.caption(f"Firecrawl: {firecrawl_status}")
+    if firecrawl_key:
+        st.caption(f"Key: {mask_api_key(firecrawl_key)}")
+
+    # Test API keys
+    if google_key:
+        if st.button("🧪 Test Google API", type="secondary", key="test_google"):
+            with st.spinner("Testing Google API..."):
+                is_valid, message = test_api_connection(google_key, "Google")
+                if is_valid:
+                    st.success(message)
+                else:
+                    st.error(message)
+
+    if firecrawl_key:
+        if st.button("🧪 Test Firecrawl API", type="secondary", key="test_firecrawl"):
+            with st.spinner("Testing Firecrawl API..."):
+                is_valid, message = test_api_connection(firecrawl_key, "Firecrawl")
+                if is_valid:
+                    st.success(message)
+                else:
+                    st.error(message)
+
+    # Test embedding engine
+    if google_key:
+        if st.button(
+            "🧪 Test Embedding Engine", type="secondary", key="test_embedding"
+        ):
+            with st.spinner("Testing embedding engine..."):
+                from model import test_embedding_engine
+
+                is_valid, message = test_embedding_engine(google_key)
+                if is_valid:
+                    st.success(message)
+                else:
+                    st.error(message)
+
+    st.markdown("### Controls")
+
+    # Health check
+    issues, warnings = check_app_health(reinit_needed)
+    if issues or warnings:
+        with st.expander("🔍 App Health Check", expanded=True):
+            if issues:
+                st.error("**Issues Found:**")
+                for issue in issues:
+                    st.error(f"• {issue}")
+
+            if warnings:
+                st.warning("**Warnings:**")
+                for warning in warnings:
+                    st.warning(f"• {warning}")
+
+    # Only show initialize button if Google API key is provided
+    if google_key:
+        if st.button("🤖 Initialize Agent"):
+            with st.spinner("Initializing AI Agent..."):
+                if initialize_agent():
+                    st.success("✅ Agent initialized successfully!")
+                    st.rerun()
+                else:
+                    st.error("❌ Failed to initialize agent")
+    else:
+        st.button(
+            "🤖 Initialize Agent",
+            disabled=True,
+            help="Enter your Google API key first",
+        )
 
-        # Help section for API keys
-        with st.expander("🔑 Where to get API keys?"):
-            st.markdown("""
-            **Google API Key (Required):**
-            - Visit [Google AI Studio](https://aistudio.google.com/)
-            - Sign in with your Google account
-            - Create a new API key
-            - Copy and paste it here
-            
-            **Firecrawl API Key (Optional):**
-            - Visit [Firecrawl](https://firecrawl.dev/)
-            - Sign up for an account
-            - Generate an API key
-            - Copy and paste it here
-            
-            **🔒 Security Note:**
-            - Your API keys are stored locally in your browser session
-            - They are never logged or sent to external servers
-            - Keys are automatically cleared when you close the browser
-            """)
-
-        # Clear API keys button
-        if google_key or firecrawl_key:
-            if st.button("🗑️ Clear API Keys", type="secondary"):
-                st.session_state.google_api_key = ""
-                st.session_state.firecrawl_api_key = ""
-                os.environ.pop("GOOGLE_API_KEY", None)
-                os.environ.pop("FIRECRAWL_API_KEY", None)
-                clear_agent()
-
-        # Update session state and environment variables when keys change
-        if google_key != st.session_state.google_api_key:
-            st.session_state.google_api_key = google_key
-            os.environ["GOOGLE_API_KEY"] = google_key
-            # Reset agent when API key changes
-            st.session_state.agent = None
-
-        if firecrawl_key != st.session_state.firecrawl_api_key:
-            st.session_state.firecrawl_api_key = firecrawl_key
-            os.environ["FIRECRAWL_API_KEY"] = firecrawl_key
-            # Reset agent when API key changes
-            st.session_state.agent = None
-
-        # Show API key status
-        st.markdown("#### 📊 API Key Status")
-        google_status = "✅ Configured" if google_key else "❌ Missing"
-        firecrawl_status = "✅ Configured" if firecrawl_key else "ℹ️ Optional"
-
-        st.caption(f"Google: {google_status}")
-        if google_key:
-            st.caption(f"Key: {mask_api_key(google_key)}")
-
-        st.caption(f"Firecrawl: {firecrawl_status}")
-        if firecrawl_key:
-            st.caption(f"Key: {mask_api_key(firecrawl_key)}")
-
-        # Test API keys
-        if google_key:
-            if st.button("🧪 Test Google API", type="secondary", key="test_google"):
-                with st.spinner("Testing Google API..."):
-                    is_valid, message = test_api_connection(google_key, "Google")
-                    if is_valid:
-                        st.success(message)
-                    else:
-                        st.error(message)
-
-        if firecrawl_key:
-            if st.button(
-                "🧪 Test Firecrawl API", type="secondary", key="test_firecrawl"
-            ):
-                with st.spinner("Testing Firecrawl API..."):
-                    is_valid, message = test_api_connection(firecrawl_key, "Firecrawl")
-                    if is_valid:
-                        st.success(message)
-                    else:
-                        st.error(message)
-
-        # Test embedding engine
-        if google_key:
-            if st.button(
-                "🧪 Test Embedding Engine", type="secondary", key="test_embedding"
-            ):
-                with st.spinner("Testing embedding engine..."):
-                    from model import test_embedding_engine
-
-                    is_valid, message = test_embedding_engine(google_key)
-                    if is_valid:
-                        st.success(message)
-                    else:
-                        st.error(message)
-
-        st.markdown("### Controls")
-
-        # Health check
-        issues, warnings = check_app_health()
-        if issues or warnings:
-            with st.expander("🔍 App Health Check", expanded=True):
-                if issues:
-                    st.error("**Issues Found:**")
-                    for issue in issues:
-                        st.error(f"• {issue}")
-
-                if warnings:
-                    st.warning("**Warnings:**")
-                    for warning in warnings:
-                        st.warning(f"• {warning}")
-
-        # Only show initialize button if Google API key is provided
-        if google_key:
-            if st.button("🤖 Initialize Agent"):
-                with st.spinner("Initializing AI Agent..."):
-                    if initialize_agent():
-                        st.success("✅ Agent initialized successfully!")
-                        st.rerun()
-                    else:
-                        st.error("❌ Failed to initialize agent")
+    # Show reinitialize button if needed
+    if reinit_needed:
+        if st.button("🔄 Reinitialize Agent", type="secondary"):
+            with st.spinner("Reinitializing AI Agent..."):
+                session_resources().agent = None
+                if initialize_agent():
+                    st.success("✅ Agent reinitialized successfully!")
+                    st.rerun()
+                else:
+                    st.error("❌ Failed to reinitialize agent")
+
+    # Show agent status
+    if session_resources().agent:
+        if reinit_needed:
+            st.warning("⚠️ Agent needs reinitialization due to API key changes")
         else:
-            st.button(
-                "🤖 Initialize Agent",
-                disabled=True,
-                help="Enter your Google API key first",
-            )
+            st.success("✅ Agent is ready!")
+    else:
+        st.info("ℹ️ Agent not initialized")
 
-        # Show reinitialize button if needed
-        if st.session_state.agent and needs_reinitialization():
-            if st.button("🔄 Reinitialize Agent", type="secondary"):
-                with st.spinner("Reinitializing AI Agent..."):
-                    st.session_state.agent = None
-                    if initialize_agent():
-                        st.success("✅ Agent reinitialized successfully!")
-                        st.rerun()
-                    else:
-                        st.error("❌ Failed to reinitialize agent")
+    if st.button("🗑️ Clear Chat"):
+        session_resources().messages = []
+        st.session_state.chat_window = CHAT_WINDOW_SIZE
+        st.rerun()
 
-        # Show agent status
-        if st.session_state.agent:
-            if needs_reinitialization():
-                st.warning("⚠️ Agent needs reinitialization due to API key changes")
-            else:
-                st.success("✅ Agent is ready!")
-        else:
-            st.info("ℹ️ Agent not initialized")
+    # Read by the chat fragment through session state
+    st.toggle("Show tool calls", value=True, key="show_tool_calls")
 
-        if st.button("🗑️ Clear Chat"):
-            st.session_state.messages = []
+    st.divider()
+    st.markdown("### 📄 CV")
+
+    if not google_key:
+        st.info("ℹ️ Enter your Google API key first to enable CV processing")
+        uploaded_file = st.file_uploader(
+            "Upload CV (PDF)",
+            type=["pdf"],
+            help="Personalize with your resume",
+            disabled=True,
+        )
+    else:
+        uploaded_file = st.file_uploader(
+            "Upload CV (PDF)", type=["pdf"], help="Personalize with your resume"
+        )
+        job_running = st.session_state.cv_job is not None
+        if uploaded_file is not None and st.button("💾 Load CV", disabled=job_running):
+            if load_cv_from_upload(uploaded_file):
+                st.toast("♻️ This CV was already indexed, reusing it")
             st.rerun()
 
-        show_tool_calls = st.toggle("Show tool calls", value=True)
+    if st.session_state.cv_job is not None:
+        render_cv_progress()
+    elif st.session_state.get("cv_result") is not None:
+        # Outcome of the last job, shown once after it finished
+        job = st.session_state.pop("cv_result")
+        if job.state == "done":
+            st.success(job.describe())
+        else:
+            st.error(job.describe())
+            if "embedding" in job.error.lower() or "genai" in job.error.lower():
+                render_embedding_help()
+
+    cv_status = "✅ Loaded" if st.session_state.cv_loaded else "❌ Not loaded"
+    st.caption(f"CV: {cv_status}")
+    if st.session_state.cv_path:
+        st.caption(f"File: {st.session_state.cv_path}")
+
+
+@st.fragment
+def render_session_panels():
+    """Panels that change with every chat turn.
+
+    Rendered by the chat fragment under the conversation, so they are
+    refreshed with each turn without rerunning the app; as a fragment of
+    their own, exporting usage reruns only them.
+    """
+    render_turn_timings()
+    render_usage()
+    render_backend_health()
+
+
+def render_sidebar_footer():
+    memory = get_session_manager().stats()
+    st.caption(
+        f"🧠 Server: {memory['in_memory']} active / {memory['spilled']} idle "
+        f"sessions · {memory['bytes'] / 1024 / 1024:.1f} MB"
+    )
 
-        st.divider()
-        st.markdown("### 📄 CV")
+    # Footer in sidebar
+    st.markdown("---")
+    st.markdown(
+        """
+        <div style="text-align: left; padding: 0.5rem 0; color: #7d8590; font-size: 0.7rem;">
+            <p style="margin: 0.2rem 0;"><strong>Created by Fahim Muntasir</strong></p>
+            <p style="margin: 0.2rem 0;"><a href="mailto:muntasirfahim.niloy@gmail.com" style="color: #58a6ff;">muntasirfahim.niloy@gmail.com</a></p>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
 
-        if not google_key:
-            st.info("ℹ️ Enter your Google API key first to enable CV processing")
-            uploaded_file = st.file_uploader(
-                "Upload CV (PDF)",
-                type=["pdf"],
-                help="Personalize with your resume",
-                disabled=True,
+
+def render_turn_timings(turns: int = 5):
+    """Per-stage timings of the last turns of this session's conversation"""
+    thread_id = st.session_state.config["configurable"]["thread_id"]
+    traces = tracer.recent(turns, thread_id=thread_id)
+    if not traces:
+        return
+
+    with st.expander("⏱️ Turn Timings"):
+        for spans in traces:
+            ordered = span_tree(spans)
+            root = ordered[0][1]
+            st.markdown(
+                f"**{root.attributes.get('route', 'unknown')}** · "
+                f"{root.duration_ms / 1000:.2f}s"
             )
-        else:
-            uploaded_file = st.file_uploader(
-                "Upload CV (PDF)", type=["pdf"], help="Personalize with your resume"
+            st.code(
+                "\n".join(
+                    f"{'  ' * depth}{stage.name:<{28 - 2 * depth}} "
+                    f"{stage.duration_ms:>9.1f} ms" + (" ✗" if stage.error else "")
+                    for depth, stage in ordered
+                ),
+                language=None,
             )
-            if uploaded_file is not None and st.button("💾 Load CV"):
-                with st.spinner("Processing CV..."):
-                    try:
-                        if load_cv_from_upload(uploaded_file):
-                            st.success("✅ CV loaded!")
-                        else:
-                            st.error("❌ Failed to load CV")
-                    except Exception as e:
-                        safe_msg = safe_error_message(e, "CV processing")
-                        st.error(f"❌ CV loading failed: {safe_msg}")
-                        # Show additional help for common embedding issues
-                        if "embedding" in str(e).lower() or "genai" in str(e).lower():
-                            st.info("💡 **Embedding Issue Detected**")
-                            st.markdown("""
-                            This might be due to:
-                            - Invalid Google API key
-                            - Network connectivity issues
-                            - Google GenAI service availability
-                            
-                            Try:
-                            1. **Verify your Google API key** is correct
-                            2. **Test the embedding engine** using the test button above
-                            3. **Check your internet connection**
-                            4. **Wait a few minutes** and try again
-                            """)
-
-        cv_status = "✅ Loaded" if st.session_state.cv_loaded else "❌ Not loaded"
-        st.caption(f"CV: {cv_status}")
-        if st.session_state.cv_path:
-            st.caption(f"File: {st.session_state.cv_path}")
-
-        # Footer in sidebar
-        st.markdown("---")
-        st.markdown(
-            """
-            <div style="text-align: left; padding: 0.5rem 0; color: #7d8590; font-size: 0.7rem;">
-                <p style="margin: 0.2rem 0;"><strong>Created by Fahim Muntasir</strong></p>
-                <p style="margin: 0.2rem 0;"><a href="mailto:muntasirfahim.niloy@gmail.com" style="color: #58a6ff;">muntasirfahim.niloy@gmail.com</a></p>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
 
-    # Main chat area - minimal and clean like ChatGPT
-    if not st.session_state.agent:
-        st.info("🚀 **Welcome to Draft 'n' Pray!**")
-        st.markdown("""
-        To get started:
-        1. **Enter your Google API key** in the sidebar (required)
-        2. **Enter your Firecrawl API key** if you want web crawling features (optional)
-        3. **Click 'Initialize Agent'** to start the AI assistant
-        4. **Upload your CV** for personalized email writing
-        """)
-        st.warning("⚠️ Please initialize the AI Agent in the sidebar to get started!")
+
+def render_backend_health():
+    """Model call latencies and the circuit breaker state of the backends
+    (hidden until one was used)"""
+    calls = [c for c in call_stats() if c["calls"]]
+    breakers = breaker_stats()
+    if not calls and not breakers:
         return
 
-    # Check if CV is loaded (only show warning if agent is ready)
-    if st.session_state.agent and not st.session_state.cv_loaded:
-        st.info("💡 Upload your CV in the sidebar for personalized emails")
+    degraded = [b for b in breakers if b["state"] != "closed"]
+    with st.expander("🩺 Backend Health", expanded=bool(degraded)):
+        for call in calls:
+            st.caption(
+                f"⏱️ **{call['name']}** · p50 {call['p50'] or 0:.2f}s · "
+                f"p95 {call['p95'] or 0:.2f}s · p99 {call['p99'] or 0:.2f}s · "
+                f"{call['retries']} retries · {call['hedges']} hedged "
+                f"({call['hedge_wins']} won)"
+            )
+        for breaker in breakers:
+            icon = {"closed": "🟢", "open": "🔴", "half-open": "🟡"}[breaker["state"]]
+            st.caption(
+                f"{icon} **{breaker['name']}** · {breaker['calls']} calls, "
+                f"{breaker['failures']} failed, {breaker['rejected']} skipped"
+            )
+            if breaker["state"] == "open":
+                st.caption(
+                    f"Next probe in {breaker['retry_in']:.0f}s · "
+                    f"{breaker['last_error']}"
+                )
 
-    # Check if agent needs reinitialization
-    if st.session_state.agent and needs_reinitialization():
-        st.warning(
-            "⚠️ **Agent needs reinitialization!** Your API keys have changed. Please click 'Reinitialize Agent' in the sidebar."
-        )
+
+def render_usage():
+    """Token usage and estimated cost of this session, with a CSV export"""
+    session_id = st.session_state.config["metadata"]["session_id"]
+    summary = usage_ledger.summarize("session_id", session_id=session_id)
+    if not summary:
         return
 
-    # Show success message when everything is ready
-    if st.session_state.agent and not needs_reinitialization():
-        st.success(
-            "🎉 **Ready to write emails!** Your AI assistant is ready to help you draft professional emails."
+    with st.expander("🪙 Token Usage"):
+        session = summary[0]
+        col1, col2 = st.columns(2)
+        col1.metric("Input tokens", f"{session['input_tokens']:,}")
+        col2.metric("Output tokens", f"{session['output_tokens']:,}")
+        st.caption(
+            f"{session['calls']} model calls · "
+            f"{session['cached_tokens']:,} cached input tokens · "
+            f"~${session['cost_usd']:.4f}"
         )
 
-    # Display chat messages
-    for message in st.session_state.messages:
+        tiers = usage_ledger.summarize("tier", session_id=session_id)
+        if len(tiers) > 1 or tiers[0]["tier"] != "-":
+            st.markdown("**Model tiers**")
+            for tier in tiers:
+                st.caption(
+                    f"{tier['tier']}: {tier['calls']} calls · "
+                    f"{tier['input_tokens']:,} in / {tier['output_tokens']:,} out "
+                    f"(~${tier['cost_usd']:.4f})"
+                )
+
+        by_tool = usage_ledger.by_tool(session_id=session_id)
+        if by_tool:
+            st.markdown("**Prompt tokens from tool results**")
+            for row in by_tool:
+                st.caption(
+                    f"{row['tool']}: {row['input_tokens']:,} tokens "
+                    f"(~${row['cost_usd']:.4f})"
+                )
+
+        st.download_button(
+            "⬇️ Export CSV",
+            data=usage_ledger.to_csv(session_id=session_id),
+            file_name="usage.csv",
+            mime="text/csv",
+        )
+
+
+def render_message_history():
+    """Render the most recent window of the chat transcript.
+
+    Only the last ``chat_window`` messages are sent to the browser, so the cost
+    of a rerun no longer grows with the length of the conversation.
+    """
+    messages = session_resources().messages
+    window = st.session_state.chat_window
+    hidden = len(messages) - window
+
+    if hidden > 0:
+        if st.button(
+            f"⬆️ Load earlier messages ({hidden} hidden)",
+            key="load_earlier_messages",
+            type="secondary",
+        ):
+            st.session_state.chat_window += CHAT_WINDOW_SIZE
+            st.rerun(scope="fragment")
+
+    for message in messages[-window:]:
         with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+            if message.get("variants"):
+                render_variant_columns(message["variants"])
+            else:
+                st.markdown(message["content"])
+            render_message_details(message)
+
+
+def render_message_details(message: dict):
+    """The cache note and tool calls kept with an answer"""
+    if message.get("note"):
+        st.caption(message["note"])
+    if message.get("tool_calls"):
+        with st.expander("🔧 Tool Calls", expanded=False):
+            for tool_call in message["tool_calls"]:
+                st.json(tool_call)
+
+
+def render_variant_columns(variants: list) -> list:
+    """Show (label, draft) pairs side by side; returns a placeholder per draft"""
+    placeholders = []
+    for number, (column, (label, draft)) in enumerate(
+        zip(st.columns(len(variants)), variants), start=1
+    ):
+        with column:
+            st.markdown(f"**{number}. {label}**")
+            placeholders.append(st.empty())
+            placeholders[-1].markdown(draft or "✍️ ...")
+    return placeholders
+
+
+def run_variant_turn(resources, turn, thread_id: str):
+    """Answer a request for email variants with drafts streamed side by side"""
+    with resources.lock, st.chat_message("assistant"), span(
+        "turn", thread_id=thread_id, ui="streamlit"
+    ) as turn_span:
+        turn_span.set(route="variants")
+        try:
+            status = st.empty()
+            status.caption(
+                f"✍️ Drafting {len(turn.styles)} variants from one shared context..."
+            )
+            placeholders = render_variant_columns(list(zip(turn.labels, turn.drafts)))
+            for index, _ in turn.stream():
+                placeholders[index].markdown(turn.drafts[index])
+            status.empty()
+            resources.messages.append(
+                {
+                    "role": "assistant",
+                    "content": turn.text(),
+                    "variants": list(zip(turn.labels, turn.drafts)),
+                }
+            )
+        except Exception as e:
+            safe_msg = safe_error_message(e, "drafting variants")
+            error_message = f"❌ Error: {safe_msg}"
+            st.error(error_message)
+            resources.messages.append({"role": "assistant", "content": error_message})
+
+
+@st.fragment
+def render_chat():
+    """Chat history and input.
+
+    Runs as a fragment so sending a message reruns only the conversation and
+    leaves the sidebar untouched.
+    """
+    render_message_history()
+
+    resources = session_resources()
+    show_tool_calls = st.session_state.get("show_tool_calls", True)
 
     # Chat input
     if prompt := st.chat_input("Message Draft 'n' Pray...", key="chat_input"):
         # Add user message
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        resources.messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Generate AI response
-        with st.chat_message("assistant"):
+        thread_id = st.session_state.config["configurable"]["thread_id"]
+        variant_turn = None
+        if resources.variants is not None:
+            variant_turn = resources.variants.plan(
+                prompt, resources.agent, st.session_state.config
+            )
+        if variant_turn is not None:
+            # Several drafts from one shared context instead of the agent
+            run_variant_turn(resources, variant_turn, thread_id)
+            finish_turn(resources)
+            return
+
+        # Generate AI response; holding the lock keeps the session from being
+        # spilled to disk while the turn runs
+        with resources.lock, st.chat_message("assistant"), span(
+            "turn", thread_id=thread_id, ui="streamlit"
+        ) as turn_span:
             try:
 
+                tools_used = set()
+                tool_calls = []
+
                 def _stream():
-                    tool_calls = []
                     tool_call_detected = False
 
-                    for token, metadata in st.session_state.agent.stream(
-                        {"messages": [{"role": "user", "content": prompt}]},
-                        st.session_state.config,
-                        stream_mode="messages",
-                    ):
+                    fast_path = resources.fast_path
+                    if fast_path is not None and fast_path.matches(prompt):
+                        # Crawl, CV lookup and drafting without agent steps
+                        turn_span.set(route="fast_path")
+                        tools_used.update(FAST_PATH_TOOLS)
+                        token_stream = fast_path.stream(
+                            prompt, resources.agent, st.session_state.config
+                        )
+                    else:
+                        turn_span.set(route="agent")
+                        token_stream = resources.agent.stream(
+                            {"messages": [{"role": "user", "content": prompt}]},
+                            st.session_state.config,
+                            stream_mode="messages",
+                        )
+
+                    for token, metadata in token_stream:
+                        if getattr(token, "type", None) == "tool":
+                            tools_used.add(token.name)
                         if token:
                             # Check if this token is part of a tool call
                             if hasattr(token, "tool_calls") and token.tool_calls:
@@ -611,24 +900,130 @@ def main():
                                 if not tool_call_detected:
                                     yield token
 
-                    # Display tool calls in expander if enabled
-                    if show_tool_calls and tool_calls:
-                        with st.expander("🔧 Tool Calls", expanded=False):
-                            for tool_call in tool_calls:
-                                st.json(tool_call)
-
-                final_text = st.write_stream(_stream())
-                st.session_state.messages.append(
-                    {"role": "assistant", "content": final_text}
+                turn_cache = TurnCache(
+                    CHAT_MODEL,
+                    CHAT_TEMPERATURE,
+                    system_prompt,
+                    get_cv_index_hash(resources.cv),
+                    resources.messages,
+                    api_key=resources.agent._google_api_key,
                 )
+                cached = turn_cache.lookup()
+
+                def _cached_stream():
+                    if cached is not None:
+                        turn_span.set(route=f"{turn_cache.source}_cache")
+                        yield from replay(cached)
+                        return
+
+                    # Start crawling any pasted URL while the model plans
+                    firecrawl_key = resources.agent._firecrawl_api_key
+                    if firecrawl_key:
+                        get_crawler(firecrawl_key).prefetch_from_text(
+                            prompt, skip=has_fresh_profile
+                        )
+
+                    chunks = []
+                    for chunk in _stream():
+                        chunks.append(chunk)
+                        yield chunk
+                    turn_cache.store(chunks, tools_used)
+
+                final_text = st.write_stream(_cached_stream())
+                answer = {"role": "assistant", "content": final_text}
+                if cached is not None:
+                    remember_exchange(
+                        resources.agent,
+                        st.session_state.config,
+                        prompt,
+                        "".join(cached),
+                    )
+                    if turn_cache.source == "semantic":
+                        answer["note"] = (
+                            f"⚡ Answered from cache (similar to: "
+                            f"“{turn_cache.matched_query}”)"
+                        )
+                    else:
+                        answer["note"] = "⚡ Answered from cache"
+                if tool_calls:
+                    answer["tool_calls"] = [
+                        call for token in tool_calls for call in token.tool_calls
+                    ]
+                resources.messages.append(answer)
+                render_message_details(answer)
             except Exception as e:
                 safe_msg = safe_error_message(e, "chat generation")
                 error_message = f"❌ Error: {safe_msg}"
                 st.error(error_message)
-                st.session_state.messages.append(
+                resources.messages.append(
                     {"role": "assistant", "content": error_message}
                 )
 
+        finish_turn(resources)
+    else:
+        render_session_panels()
+
+
+def finish_turn(resources):
+    """Enforce the session's memory cap and show the per-turn panels under
+    the answer"""
+    get_session_manager().enforce_cap(resources)
+    render_session_panels()
+
+
+def main():
+    # Check if API keys are provided
+    is_valid, message = validate_api_keys()
+    if not is_valid:
+        render_setup_guide(message)
+        st.stop()
+
+    # Minimal header like ChatGPT
+    st.markdown(
+        "<h1 class='main-header'>🧾 Draft 'n' Pray</h1>",
+        unsafe_allow_html=True,
+    )
+    st.markdown(
+        '<p class="subtitle">// Write. Send. Hope. Repeat. (Now with AI) //</p>',
+        unsafe_allow_html=True,
+    )
+
+    # Sidebar for configuration
+    with st.sidebar:
+        render_sidebar()
+        render_sidebar_footer()
+
+    # Main chat area - minimal and clean like ChatGPT
+    if not session_resources().agent:
+        st.info("🚀 **Welcome to Draft 'n' Pray!**")
+        st.markdown("""
+        To get started:
+        1. **Enter your Google API key** in the sidebar (required)
+        2. **Enter your Firecrawl API key** if you want web crawling features (optional)
+        3. **Click 'Initialize Agent'** to start the AI assistant
+        4. **Upload your CV** for personalized email writing
+        """)
+        st.warning("⚠️ Please initialize the AI Agent in the sidebar to get started!")
+        return
+
+    # Check if CV is loaded (only show warning if agent is ready)
+    if not st.session_state.cv_loaded:
+        st.info("💡 Upload your CV in the sidebar for personalized emails")
+
+    # Check if agent needs reinitialization
+    if needs_reinitialization():
+        st.warning(
+            "⚠️ **Agent needs reinitialization!** Your API keys have changed. Please click 'Reinitialize Agent' in the sidebar."
+        )
+        return
+
+    # Show success message when everything is ready
+    st.success(
+        "🎉 **Ready to write emails!** Your AI assistant is ready to help you draft professional emails."
+    )
+
+    render_chat()
+
 
 if __name__ == "__main__":
     main()
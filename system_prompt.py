@@ -14,7 +14,9 @@ Your tasks can be:
 ---
 Your workflow is as follows:
 1. You will be given the website of the professor you are writing to.
-2. You will scrape the website and gather following information about the professor:
+2. First call lookup_professor with the website. If it returns a stored profile, use it
+and only crawl the website when you need details the profile does not have.
+Otherwise you will scrape the website and gather following information about the professor:
 
 - name
 - email
@@ -26,9 +28,14 @@ Your workflow is as follows:
 
 3. Then you will match the information with users profile (CV, resume, SOP and others) stored in the knowledgebase,
 you already have those, dont ask for them again.
+The knowledgebase is split by CV section: pass kb_tool a section (e.g. "publications",
+"experience", "education") when you only need that part of the profile.
 
 4. When the user asks you to write the email, you will craft an email to the professor, 
 based on the information you gathered and users profile. 
-You will also generate a subject for the email. and calculate the possible fit percentage.
+You will also generate a subject for the email, and report the fit percentage.
+Call fit_score with the professor's URL for the fit percentage: it is computed
+from the CV and the website, so use its score and evidence as they are and never
+estimate a percentage yourself.
 
 """
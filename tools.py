@@ -1,12 +1,29 @@
 import os
+import hashlib
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
 from pathlib import Path
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_core.vectorstores import InMemoryVectorStore
+from langchain_community.document_loaders.parsers import PyPDFParser
+from langchain_core.documents.base import Blob
 from langchain.tools import tool
-from firecrawl import Firecrawl
-from model import get_langchain_embedding_engine
+from crawler import crawl_result_to_text, get_crawler
+from cv_chunker import CHUNKER_VERSION, sections_of, split_cv
+from model import (
+    embedding_backend_id,
+    engine_backend_id,
+    get_langchain_embedding_engine,
+)
+from fit_score import score_topics
+from profile_store import (
+    get_profile_store,
+    lookup_profile,
+    remember_profile,
+    url_domain,
+)
+from profiles import extract_profile, profile_topics
+from tracing import TracedEmbeddings, span
+from vectorstore import VECTOR_STORE_DTYPE, QuantizedVectorStore
 from rich.console import Console
 from rich.panel import Panel
 from rich.text import Text
@@ -16,134 +33,460 @@ load_dotenv()
 # Rich console for beautiful output
 console = Console()
 
-# Global vector store that persists across tool calls
-vectorstore = None
 embedding_engine = None
+# Guards the cache of recently built indexes
+_swap_lock = threading.Lock()
+
+# CV chunks kb_tool returns per search; see `python -m bench.retrieval`
+KB_SEARCH_K = int(os.getenv("KB_SEARCH_K", "10"))
+# Chunks embedded per request while indexing a CV
+CV_EMBED_BATCH_SIZE = int(os.getenv("CV_EMBED_BATCH_SIZE", "32"))
+# Indexes of recently loaded CVs kept for instant reuse, by upload fingerprint
+CV_INDEX_CACHE_SIZE = int(os.getenv("CV_INDEX_CACHE_SIZE", "4"))
+
+# fingerprint -> (store, chunk hash, pages, chunks, sections), least recently
+# used first
+_cv_indexes = OrderedDict()
+
+
+class CVKnowledgeBase:
+    """The CV index searched by one user's tools.
+
+    The CLI has a single one for the process (``default_kb``). Every
+    Streamlit session has its own (SessionResources.cv), so sessions never
+    search each other's CV, and an idle session's index is spilled to disk
+    with the rest of the session.
+
+    Attributes:
+        store: QuantizedVectorStore of the CV chunks (None until one is loaded)
+        index_hash: Fingerprint of the indexed chunks, scoping cached responses
+        fingerprint: Upload fingerprint of the indexed CV
+        sections: Sections (from cv_chunker) present in the CV
+    """
 
+    def __init__(self):
+        self.store = None
+        self.index_hash = None
+        self.fingerprint = None
+        self.sections = []
+        # Swaps a new index in together with its fingerprints
+        self._lock = threading.Lock()
+
+    def activate(self, fingerprint: str, store, chunk_hash: str, sections: list):
+        """Swap an index in; searches running meanwhile keep the previous one"""
+        with self._lock:
+            self.store = store
+            self.index_hash = chunk_hash
+            self.fingerprint = fingerprint
+            self.sections = sections
+
+    def memory_bytes(self) -> int:
+        """Approximate memory of the index: vectors and chunk text"""
+        store = self.store
+        if store is None:
+            return 0
+        return store.memory_bytes() + sum(
+            len(doc.page_content) for doc in store.documents
+        )
 
-def get_or_create_vectorstore(api_key: str = None):
-    """Get existing vector store or create a new one"""
-    global vectorstore, embedding_engine
+    def restore_engine(self, api_key: str = None):
+        """Give an index restored from disk its embedding engine back. An
+        index built with another backend than the current engine is dropped,
+        and the CV has to be loaded again."""
+        store = self.store
+        if store is None or store.embedding is not None:
+            return
+        engine = _get_embedding_engine(api_key)
+        if engine_backend_id(engine) != store.backend:
+            self.activate(None, None, None, [])
+            return
+        store.embedding = TracedEmbeddings(engine)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+# The CLI's knowledge base
+default_kb = CVKnowledgeBase()
 
-    if vectorstore is None:
-        try:
-            if embedding_engine is None or api_key:
-                console.print("🔧 Creating embedding engine...", style="blue")
-                embedding_engine = get_langchain_embedding_engine(api_key)
-                console.print("✅ Embedding engine created successfully", style="green")
 
-            vectorstore = InMemoryVectorStore(embedding_engine)
+def get_cv_index_hash(kb: CVKnowledgeBase = None) -> str:
+    """Return the fingerprint of the loaded CV index ("" when none is loaded)"""
+    return (kb or default_kb).index_hash or ""
+
+
+def _hash_chunks(chunks) -> str:
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk.page_content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _get_embedding_engine(api_key: str = None):
+    """Return the shared embedding engine, creating it for a new API key"""
+    global embedding_engine
+
+    if embedding_engine is None or api_key:
+        console.print("🔧 Creating embedding engine...", style="blue")
+        embedding_engine = get_langchain_embedding_engine(api_key)
+        console.print(
+            f"✅ Embedding engine created ({engine_backend_id(embedding_engine)})",
+            style="green",
+        )
+    return embedding_engine
+
+
+def get_or_create_vectorstore(api_key: str = None):
+    """Get the CLI's vector store or create a new one"""
+    if default_kb.store is None:
+        try:
+            engine = _get_embedding_engine(api_key)
+            default_kb.store = QuantizedVectorStore(
+                TracedEmbeddings(engine), backend=engine_backend_id(engine)
+            )
             console.print("🆕 Created new vector store instance", style="blue")
         except Exception as e:
             console.print(f"❌ Error creating vector store: {str(e)}", style="red")
             raise e
 
-    return vectorstore
+    return default_kb.store
+
+
+def cv_fingerprint(data: bytes, engine=None) -> str:
+    """Hash of a CV's bytes and of the settings its index is built with
+
+    Args:
+        data: The PDF file content
+        engine: Embedding engine the index is built with (the shared engine by
+            default, or the configured backend's id before one exists)
+    """
+    engine = engine or embedding_engine
+    backend = (
+        engine_backend_id(engine) if engine is not None else embedding_backend_id()
+    )
+    digest = hashlib.sha256(data)
+    config = f"{backend}|{VECTOR_STORE_DTYPE}|{CHUNKER_VERSION}"
+    digest.update(config.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _cached_cv_index(fingerprint: str, progress=None):
+    """Return the cached index of an already loaded CV, if there is one, as
+    (fingerprint, store, chunk hash, sections)"""
+    with _swap_lock:
+        entry = _cv_indexes.get(fingerprint)
+        if entry is None:
+            return None
+        _cv_indexes.move_to_end(fingerprint)
+
+    store, chunk_hash, pages, chunks, sections = entry
+    console.print(
+        f"♻️  Reusing the index of an identical CV ({chunks} chunks)", style="green"
+    )
+    if progress is not None:
+        progress("done", pages=pages, chunks=chunks)
+    return fingerprint, store, chunk_hash, sections
+
+
+def reuse_cv_index(fingerprint: str, progress=None, kb: CVKnowledgeBase = None) -> bool:
+    """Activate the cached index of an already loaded CV, if there is one"""
+    index = _cached_cv_index(fingerprint, progress)
+    if index is None:
+        return False
+    (kb or default_kb).activate(*index)
+    return True
+
 
+def clear_cv_index_cache():
+    """Forget the indexes kept for reuse (the active one stays loaded)"""
+    with _swap_lock:
+        _cv_indexes.clear()
 
-def initialize_vectorstore_with_cv(cv_path: str, api_key: str = None):
-    """Initialize the global vector store with CV content"""
-    global vectorstore
 
+def initialize_vectorstore_with_cv(
+    cv_path: str, api_key: str = None, progress=None, kb: CVKnowledgeBase = None
+):
+    """Initialize a knowledge base (the CLI's by default) with CV content.
+
+    Args:
+        cv_path: Path of the CV PDF
+        api_key: Google API key for the embedding engine
+        progress: Optional callback, see ``load_cv_bytes``
+        kb: Knowledge base to load the CV into
+    """
     try:
-        # Check if file exists
-        if not Path(cv_path).exists():
-            console.print(f"❌ Error: CV file '{cv_path}' not found.", style="red")
-            return False
+        data = Path(cv_path).read_bytes()
+    except OSError:
+        message = f"Error: CV file '{cv_path}' not found."
+        console.print(f"❌ {message}", style="red")
+        if progress is not None:
+            progress("failed", error=message)
+        return False
+    return load_cv_bytes(data, Path(cv_path).name, api_key, progress, kb)
+
+
+def load_cv_bytes(
+    data: bytes,
+    name: str,
+    api_key: str = None,
+    progress=None,
+    kb: CVKnowledgeBase = None,
+):
+    """Index a CV PDF held in memory and make it the active index of a
+    knowledge base.
+
+    Args:
+        data: The PDF file content
+        name: File name, kept as the chunks' source
+        api_key: Google API key for the embedding engine
+        progress: Optional callback, see ``build_cv_index``
+        kb: Knowledge base to load the CV into (the CLI's by default)
+    """
+    index = build_cv_index(data, name, api_key, progress)
+    if index is None:
+        return False
+    (kb or default_kb).activate(*index)
+    return True
+
 
-        console.print(f"📖 Loading CV: {cv_path}", style="blue")
+def build_cv_index(data: bytes, name: str, api_key: str = None, progress=None):
+    """Index a CV PDF held in memory without activating it anywhere.
 
-        # Load PDF
-        loader = PyPDFLoader(cv_path)
-        documents = loader.load()
+    A CV whose bytes (and index settings) match one loaded recently reuses
+    that index without parsing or embedding. Otherwise a new index is built;
+    the caller swaps it in once it is complete (``CVKnowledgeBase.activate``),
+    so searches running meanwhile keep using the previous CV.
+
+    Args:
+        data: The PDF file content
+        name: File name, kept as the chunks' source
+        api_key: Google API key for the embedding engine
+        progress: Optional callback ``progress(stage, **counts)`` called with
+            "parsing" (pages), "embedding" (chunks, embedded), "done" and
+            "failed" (error)
+
+    Returns:
+        (fingerprint, store, chunk hash, sections), or None on failure
+    """
+    with span("cv.ingest", path=name) as ingest_span:
+        fingerprint = cv_fingerprint(data)
+        index = _cached_cv_index(fingerprint, progress)
+        reused = index is not None
+        if index is None:
+            index = _build_cv_index(data, name, fingerprint, api_key, progress)
+        ingest_span.set(success=index is not None, reused=reused)
+        return index
+
+
+def _build_cv_index(data, name, fingerprint, api_key=None, progress=None):
+    def report(stage: str, **counts):
+        if progress is not None:
+            progress(stage, **counts)
+
+    def fail(message: str):
+        console.print(f"❌ {message}", style="red")
+        report("failed", error=message)
+        return None
+
+    try:
+        console.print(f"📖 Loading CV: {name}", style="blue")
+
+        # Parse the PDF from memory page by page so progress can be reported
+        documents = []
+        with span("cv.load_pdf"):
+            blob = Blob.from_data(data, path=name, mime_type="application/pdf")
+            for page in PyPDFParser().lazy_parse(blob):
+                documents.append(page)
+                report("parsing", pages=len(documents))
 
         if not documents:
-            console.print("❌ Error: No content found in CV.", style="red")
-            return False
+            return fail("Error: No content found in CV.")
 
         console.print(f"📄 Found {len(documents)} pages", style="green")
 
-        # Split documents into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=200
+        # Split into one chunk per CV entry, tagged with its section
+        with span("cv.split", pages=len(documents)):
+            chunks = split_cv(documents)
+        sections = sections_of(chunks)
+        console.print(
+            f"✂️  Split into {len(chunks)} chunks ({', '.join(sections)})",
+            style="green",
         )
-        chunks = text_splitter.split_documents(documents)
-        console.print(f"✂️  Split into {len(chunks)} chunks", style="green")
 
-        # Get or create vector store and add documents
+        # Build the new index next to the current one
         console.print("🧠 Creating embeddings...", style="yellow")
         try:
-            vs = get_or_create_vectorstore(api_key)
+            engine = _get_embedding_engine(api_key)
+            # Tag the index so vectors of another backend never join it
+            vs = QuantizedVectorStore(
+                TracedEmbeddings(engine), backend=engine_backend_id(engine)
+            )
+            # Cached under the engine actually used, which may have fallen
+            # back to another backend than the configured one
+            fingerprint = cv_fingerprint(data, engine)
         except Exception as e:
-            console.print(f"❌ Failed to create vector store: {str(e)}", style="red")
-            return False
-
-        # Clear existing documents by creating a new instance
-        if vectorstore is not None:
-            console.print("🗑️  Clearing existing documents...", style="yellow")
-            # Create a fresh vector store instance
-            try:
-                vectorstore = InMemoryVectorStore(embedding_engine)
-                vs = vectorstore
-            except Exception as e:
-                console.print(
-                    f"❌ Failed to recreate vector store: {str(e)}", style="red"
-                )
-                return False
+            return fail(f"Failed to create vector store: {str(e)}")
 
-        # Add all chunks to the vector store
+        # Add the chunks in batches, reporting progress after each one
         console.print(
             f"📝 Adding {len(chunks)} chunks to vector store...", style="blue"
         )
         try:
-            vs.add_documents(chunks)
+            with span("cv.index", chunks=len(chunks)):
+                report("embedding", chunks=len(chunks), embedded=0)
+                for start in range(0, len(chunks), CV_EMBED_BATCH_SIZE):
+                    vs.add_documents(chunks[start : start + CV_EMBED_BATCH_SIZE])
+                    report(
+                        "embedding",
+                        chunks=len(chunks),
+                        embedded=min(start + CV_EMBED_BATCH_SIZE, len(chunks)),
+                    )
             console.print("✅ Documents added successfully", style="green")
         except Exception as e:
-            console.print(f"❌ Failed to add documents: {str(e)}", style="red")
-            return False
+            return fail(f"Failed to add documents: {str(e)}")
+
+        chunk_hash = _hash_chunks(chunks)
+        with _swap_lock:
+            _cv_indexes[fingerprint] = (
+                vs,
+                chunk_hash,
+                len(documents),
+                len(chunks),
+                sections,
+            )
+            while len(_cv_indexes) > CV_INDEX_CACHE_SIZE:
+                _cv_indexes.popitem(last=False)
+        report("done", pages=len(documents), chunks=len(chunks))
+        return fingerprint, vs, chunk_hash, sections
+
+    except Exception as e:
+        return fail(f"Error loading CV: {str(e)}")
+
+
+def search_cv(query: str, k: int = 10, section: str = None, kb: CVKnowledgeBase = None):
+    """Return the CV chunks most similar to a query ([] when no CV is loaded)
+
+    Args:
+        query: Search text
+        k: Number of chunks
+        section: Only search this CV section, e.g. "publications"
+        kb: Knowledge base to search (the CLI's by default)
+    """
+    # Read the store once: a background ingestion may swap it meanwhile
+    store = (kb or default_kb).store
+    if store is None:
+        return []
+    search_filter = {"section": section.strip().lower()} if section else None
+    with span("kb.search", k=k, section=section or ""):
+        return store.similarity_search(query, k=k, filter=search_filter)
+
+
+def _kb_search(query: str, section: str, kb: CVKnowledgeBase):
+    """kb_tool's search: relevant chunks or a message for the model"""
+    if kb.store is None:
+        return "❌ CV knowledge base not initialized. Please initialize with your CV first."
+
+    # Search for relevant content in CV
+    try:
+        relevant_docs = search_cv(query, k=KB_SEARCH_K, section=section or None, kb=kb)
 
-        return True
+        if not relevant_docs:
+            if section:
+                return (
+                    f"No content found in the '{section}' section of your CV. "
+                    f"Sections in this CV: {', '.join(kb.sections)}"
+                )
+            return "No relevant content found in your CV for this query."
+
+        return relevant_docs
 
     except Exception as e:
-        console.print(f"❌ Error loading CV: {str(e)}", style="red")
-        return False
+        return f"## ❌ Error\n\nError searching CV: {str(e)}"
 
 
-def create_tools_with_api_keys(google_api_key: str, firecrawl_api_key: str):
-    """Create tools with the provided API keys"""
+def fit_for_website(text: str, url: str = None, kb: CVKnowledgeBase = None):
+    """(FitScore, profile) of the professor on a crawled page against the
+    loaded CV, or None when no CV is loaded. A stored profile of the URL is
+    used instead of the page when there is one.
+
+    Args:
+        text: Crawled website text
+        url: The crawled URL
+        kb: Knowledge base holding the CV (the CLI's by default)
+    """
+    # Read the store once: a background ingestion may swap it meanwhile
+    store = (kb or default_kb).store
+    if store is None:
+        return None
+    stored = lookup_profile(url) if url else None
+    if stored is not None:
+        profile, topics = stored.profile, stored.topics
+    else:
+        profile = extract_profile(text, url)
+        topics = profile_topics(profile, text)
+    with span("fit.score", url=url or "", stored=stored is not None):
+        return score_topics(topics, store), profile
+
+
+def _lookup_professor(url: str, firecrawl_api_key: str = None) -> str:
+    """lookup_professor's result: the stored profile(s) or a message"""
+    try:
+        stored = lookup_profile(url, firecrawl_api_key)
+        if stored is not None:
+            console.print(f"📇 Using stored profile: {stored.url}", style="yellow")
+            if not stored.page:
+                return stored.to_markdown()
+            # The page text carries what the heuristic profile misses
+            return f"{stored.to_markdown()}\n\n---\n\n{stored.page}"
+
+        # An unknown page on a known site: list the professors stored for it
+        profile_store = get_profile_store()
+        domain = url_domain(url)
+        known = profile_store.for_domain(domain) if profile_store else []
+        if known:
+            return (
+                f"No stored profile for {url}. Profiles stored for {domain}:\n\n"
+                + "\n\n---\n\n".join(profile.to_markdown() for profile in known)
+            )
+        return f"No stored profile for {url}. Crawl it with crawl_website."
+    except Exception as e:
+        return f"## ❌ Error\n\nError looking up profile: {str(e)}"
+
+
+def create_tools_with_api_keys(
+    google_api_key: str, firecrawl_api_key: str, kb: CVKnowledgeBase = None
+):
+    """Create tools with the provided API keys, searching ``kb`` (the CLI's
+    knowledge base by default)"""
+    kb = kb or default_kb
 
     @tool
-    def kb_tool(query: str):
+    def kb_tool(query: str, section: str = ""):
         """
         Search the knowledgebase (CV) for relevant content.
 
         Args:
             query: The search query to find relevant content in your CV
+            section: Optional CV section to search, e.g. "education",
+                "experience", "publications", "projects", "skills", "awards"
+                or "research" (empty searches the whole CV)
 
         Returns:
             Relevant content from your CV that matches the query
         """
-        global vectorstore
-
-        if vectorstore is None:
-            return "❌ CV knowledge base not initialized. Please initialize with your CV first."
-
-        # Search for relevant content in CV
-        try:
-            relevant_docs = vectorstore.similarity_search(query, k=10)
-
-            if not relevant_docs:
-                return "No relevant content found in your CV for this query."
-
-            return relevant_docs
-
-        except Exception as e:
-            return f"## ❌ Error\n\nError searching CV: {str(e)}"
+        return _kb_search(query, section, kb)
 
     @tool
     def load_pdf_and_create_embeddings(pdf_path: str):
         """Load PDF and create embeddings in memory"""
-        return initialize_vectorstore_with_cv(pdf_path, google_api_key)
+        return initialize_vectorstore_with_cv(pdf_path, google_api_key, kb=kb)
 
     @tool
     def crawl_website(url: str):
@@ -159,13 +502,18 @@ def create_tools_with_api_keys(google_api_key: str, firecrawl_api_key: str):
         if not firecrawl_api_key:
             return "❌ Firecrawl API key is required for web crawling."
 
-        firecrawl = Firecrawl(api_key=firecrawl_api_key)
+        crawler = get_crawler(firecrawl_api_key)
 
         try:
-            console.print(f"🔥 Crawling website: {url}", style="yellow")
-            docs = firecrawl.crawl(url=url, limit=10)
+            if crawler.is_pending_or_cached(url):
+                console.print(f"⚡ Using prefetched crawl: {url}", style="yellow")
+            else:
+                console.print(f"🔥 Crawling website: {url}", style="yellow")
+            docs = crawler.crawl(url)
 
             if docs:
+                # Keep the professor's profile for later sessions
+                remember_profile(url, crawl_result_to_text(docs))
                 return docs
             else:
                 return "## 🌐 Website Crawl Results\n\nNo content found on the website."
@@ -173,37 +521,79 @@ def create_tools_with_api_keys(google_api_key: str, firecrawl_api_key: str):
         except Exception as e:
             return f"## ❌ Error\n\nError crawling website: {str(e)}"
 
-    return [kb_tool, load_pdf_and_create_embeddings, crawl_website]
+    @tool
+    def lookup_professor(url: str):
+        """
+        Look up the stored profile of a professor before crawling their website.
+
+        Args:
+            url: The URL of the professor's website
+
+        Returns:
+            The stored profile (name, email, position, university, research
+            interests, publications), or a note to crawl the website instead
+        """
+        return _lookup_professor(url, firecrawl_api_key)
+
+    @tool
+    def fit_score(url: str):
+        """
+        Compute the fit score between a professor and the user's CV.
+
+        Args:
+            url: The URL of the professor's website
+
+        Returns:
+            The fit percentage with the best matching research topics and CV
+            excerpts
+        """
+        if kb.store is None:
+            return "❌ CV knowledge base not initialized. Please initialize with your CV first."
+
+        try:
+            if lookup_profile(url, firecrawl_api_key) is not None:
+                # Scored from the stored profile, without a crawl
+                text = ""
+            elif not firecrawl_api_key:
+                return "❌ Firecrawl API key is required for web crawling."
+            else:
+                # Served from the crawl cache when the website was crawled already
+                text = crawl_result_to_text(get_crawler(firecrawl_api_key).crawl(url))
+                if not text:
+                    return "## 🎯 Fit score unavailable\n\nNo content found on the website."
+                remember_profile(url, text)
+            fit, profile = fit_for_website(text, url, kb)
+            console.print(f"🎯 Fit score for {url}: {fit.score}%", style="green")
+            return fit.to_markdown(profile.get("name"))
+
+        except Exception as e:
+            return f"## ❌ Error\n\nError computing fit score: {str(e)}"
+
+    return [
+        kb_tool,
+        load_pdf_and_create_embeddings,
+        lookup_professor,
+        crawl_website,
+        fit_score,
+    ]
 
 
 # Legacy tools for backward compatibility
 @tool
-def kb_tool(query: str):
+def kb_tool(query: str, section: str = ""):
     """
     Search the knowledgebase (CV) for relevant content.
 
     Args:
         query: The search query to find relevant content in your CV
+        section: Optional CV section to search, e.g. "education",
+            "experience", "publications", "projects", "skills", "awards"
+            or "research" (empty searches the whole CV)
 
     Returns:
         Relevant content from your CV that matches the query
     """
-    global vectorstore
-
-    if vectorstore is None:
-        return "❌ CV knowledge base not initialized. Please initialize with your CV first."
-
-    # Search for relevant content in CV
-    try:
-        relevant_docs = vectorstore.similarity_search(query, k=10)
-
-        if not relevant_docs:
-            return "No relevant content found in your CV for this query."
-
-        return relevant_docs
-
-    except Exception as e:
-        return f"## ❌ Error\n\nError searching CV: {str(e)}"
+    return _kb_search(query, section, default_kb)
 
 
 @tool
@@ -223,11 +613,11 @@ def crawl_website(url: str, api_key: str):
     Returns:
         The content of the website
     """
-    firecrawl = Firecrawl(api_key=api_key)
+    crawler = get_crawler(api_key)
 
     try:
         console.print(f"🔥 Crawling website: {url}", style="yellow")
-        docs = firecrawl.crawl(url=url, limit=10)
+        docs = crawler.crawl(url)
 
         if docs:
             return docs
@@ -0,0 +1,202 @@
+"""
+Timing spans for finding out where a turn spends its time.
+
+Stages are wrapped in ``span("name")`` blocks. Spans opened inside another
+span become its children, also across the thread pools that run tools and
+crawls (the context is copied into each submitted task). Finished turns are
+kept in a ring buffer for the CLI ``stats`` command and the Streamlit
+sidebar. With TRACE_EXPORT_PATH set, each span is also appended to a JSON
+lines file in the OpenTelemetry span shape (traceId, spanId, parentSpanId,
+startTimeUnixNano, ...).
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from langchain_core.embeddings import Embeddings
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Number of turns (root spans) kept in memory
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "50"))
+# Optional JSON lines file receiving every finished span
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed stage of a turn"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: str, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def set(self, **attributes):
+        """Attach attributes to the span while it is open"""
+        self.attributes.update(attributes)
+
+    def to_otel(self) -> dict:
+        """The span as an OpenTelemetry-compatible JSON object"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}}
+                for key, value in self.attributes.items()
+            ],
+            "status": (
+                {"code": "STATUS_CODE_ERROR", "message": self.error}
+                if self.error
+                else {"code": "STATUS_CODE_OK"}
+            ),
+        }
+
+
+class Tracer:
+    """Collects spans per trace and keeps the last ``buffer_size`` traces.
+
+    Args:
+        buffer_size: Number of traces kept in memory
+        export_path: JSON lines file every finished span is appended to
+    """
+
+    def __init__(
+        self, buffer_size: int = TRACE_BUFFER_SIZE, export_path: str = TRACE_EXPORT_PATH
+    ):
+        self.buffer_size = buffer_size
+        self.export_path = export_path
+        self._lock = threading.Lock()
+        # Keeps exported lines whole without holding up the span buffer
+        self._export_lock = threading.Lock()
+        # trace id -> finished spans, oldest trace first
+        self._traces = OrderedDict()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time a block as a child of the current span (or as a new trace)"""
+        parent = _current_span.get()
+        span = Span(
+            name,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {str(e)[:200]}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            self._finish(span)
+
+    def _finish(self, span: Span):
+        with self._lock:
+            if span.trace_id not in self._traces:
+                self._traces[span.trace_id] = []
+                while len(self._traces) > self.buffer_size:
+                    self._traces.popitem(last=False)
+            # Spans finishing after their trace was evicted are dropped
+            if span.trace_id in self._traces:
+                self._traces[span.trace_id].append(span)
+            record = span.to_otel() if self.export_path else None
+
+        if record is not None:
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+            with self._export_lock, open(self.export_path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def recent(self, n: int = 5, **root_attributes) -> list[list[Span]]:
+        """The spans of the last ``n`` finished turns, newest first.
+
+        Keyword arguments filter on attributes of the root span, e.g.
+        ``recent(5, thread_id=...)`` for one conversation.
+        """
+        with self._lock:
+            traces = [list(spans) for spans in self._traces.values()]
+
+        finished = []
+        for spans in reversed(traces):
+            root = next((s for s in spans if s.parent_id is None), None)
+            if root is None:
+                continue
+            if any(root.attributes.get(k) != v for k, v in root_attributes.items()):
+                continue
+            finished.append(spans)
+            if len(finished) == n:
+                break
+        return finished
+
+
+def current_trace_id():
+    """Trace id of the innermost open span, or None outside any span"""
+    current = _current_span.get()
+    return current.trace_id if current else None
+
+
+def span_tree(spans: list[Span]) -> list[tuple[int, Span]]:
+    """Order a trace's spans depth-first as (depth, span) pairs"""
+    children = {}
+    for span in spans:
+        children.setdefault(span.parent_id, []).append(span)
+    for siblings in children.values():
+        siblings.sort(key=lambda s: s.start_ns)
+
+    ordered = []
+
+    def visit(parent_id, depth):
+        for span in children.get(parent_id, []):
+            ordered.append((depth, span))
+            visit(span.span_id, depth + 1)
+
+    visit(None, 0)
+    return ordered
+
+
+class TracedEmbeddings(Embeddings):
+    """Embedding engine wrapper that records a span per embedding call"""
+
+    def __init__(self, engine: Embeddings):
+        self.engine = engine
+
+    @property
+    def backend_id(self):
+        """Id of the wrapped engine's vectors (see model.engine_backend_id)"""
+        return getattr(self.engine, "backend_id", None)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with tracer.span("embedding.documents", texts=len(texts)):
+            return self.engine.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        with tracer.span("embedding.query"):
+            return self.engine.embed_query(text)
+
+
+tracer = Tracer()
+span = tracer.span
@@ -0,0 +1,238 @@
+"""
+Token and cost ledger for chat model calls.
+
+``usage_callback`` is attached to the chat model and records the usage
+metadata of every call. Each record carries the session and thread it
+belongs to (from the run metadata) and the turn (the current trace). The
+input tokens are split across the tool results that were part of the
+prompt, so a record shows how much of its context came from each tool.
+"""
+
+import csv
+import io
+import os
+import threading
+import time
+from collections import deque
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import ToolMessage
+from tracing import current_trace_id
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Records kept in memory (oldest are dropped first)
+USAGE_MAX_RECORDS = int(os.getenv("USAGE_MAX_RECORDS", "10000"))
+
+# USD per million tokens: (input, cached input, output)
+MODEL_PRICES = {
+    "gemini-2.5-flash": (0.30, 0.075, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.025, 0.40),
+    "gemini-2.5-pro": (1.25, 0.31, 10.00),
+}
+
+CSV_FIELDS = [
+    "timestamp",
+    "session_id",
+    "thread_id",
+    "turn_id",
+    "node",
+    "model",
+    "tier",
+    "input_tokens",
+    "cached_tokens",
+    "output_tokens",
+    "cost_usd",
+    "tool_tokens",
+]
+
+
+def approx_tokens(text) -> int:
+    """Rough token count of a text (about four characters per token)"""
+    return max(1, len(str(text)) // 4)
+
+
+def model_prices(model: str) -> tuple[float, float, float]:
+    """Prices for a model, overridable with USAGE_PRICE_INPUT/CACHED/OUTPUT"""
+    # Versioned names like "models/gemini-2.5-flash-001" use the base price
+    name = (model or "").removeprefix("models/")
+    prices = next(
+        (
+            MODEL_PRICES[known]
+            for known in sorted(MODEL_PRICES, key=len, reverse=True)
+            if name.startswith(known)
+        ),
+        (0.0, 0.0, 0.0),
+    )
+    return tuple(
+        float(os.getenv(f"USAGE_PRICE_{kind}", default))
+        for kind, default in zip(["INPUT", "CACHED", "OUTPUT"], prices)
+    )
+
+
+def estimate_cost(model: str, input_tokens: int, cached: int, output: int) -> float:
+    """Cost in USD; cached tokens are part of ``input_tokens``"""
+    input_price, cached_price, output_price = model_prices(model)
+    return (
+        (input_tokens - cached) * input_price
+        + cached * cached_price
+        + output * output_price
+    ) / 1_000_000
+
+
+def tool_context(messages: list) -> dict:
+    """Approximate prompt tokens per tool from the tool results in a prompt"""
+    tokens = {"_total": 0}
+    for message in messages:
+        size = approx_tokens(message.content)
+        tokens["_total"] += size
+        if isinstance(message, ToolMessage):
+            name = message.name or "tool"
+            tokens[name] = tokens.get(name, 0) + size
+    return tokens
+
+
+class UsageLedger:
+    """Thread-safe in-memory list of per-call usage records.
+
+    Args:
+        max_records: Number of records kept
+    """
+
+    def __init__(self, max_records: int = USAGE_MAX_RECORDS):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=max_records)
+
+    def add(self, record: dict):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self, **filters) -> list[dict]:
+        """Records matching all keyword filters, e.g. ``thread_id=...``"""
+        with self._lock:
+            records = list(self._records)
+        return [r for r in records if all(r.get(k) == v for k, v in filters.items())]
+
+    def summarize(self, group_by: str, **filters) -> list[dict]:
+        """Token and cost totals per value of ``group_by``, biggest spend first"""
+        groups = {}
+        for record in self.records(**filters):
+            key = record.get(group_by) or "-"
+            total = groups.setdefault(
+                key,
+                {
+                    group_by: key,
+                    "calls": 0,
+                    "input_tokens": 0,
+                    "cached_tokens": 0,
+                    "output_tokens": 0,
+                    "cost_usd": 0.0,
+                },
+            )
+            total["calls"] += 1
+            for field in ["input_tokens", "cached_tokens", "output_tokens", "cost_usd"]:
+                total[field] += record[field]
+        return sorted(groups.values(), key=lambda g: g["cost_usd"], reverse=True)
+
+    def by_tool(self, **filters) -> list[dict]:
+        """Input tokens and input cost attributed to each tool's results"""
+        tools = {}
+        for record in self.records(**filters):
+            input_price = model_prices(record["model"])[0]
+            for name, tokens in record["tool_tokens"].items():
+                total = tools.setdefault(
+                    name, {"tool": name, "calls": 0, "input_tokens": 0, "cost_usd": 0.0}
+                )
+                total["calls"] += 1
+                total["input_tokens"] += tokens
+                total["cost_usd"] += tokens * input_price / 1_000_000
+        return sorted(tools.values(), key=lambda t: t["input_tokens"], reverse=True)
+
+    def to_csv(self, **filters) -> str:
+        """The matching records as CSV text"""
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for record in self.records(**filters):
+            row = {field: record.get(field) for field in CSV_FIELDS}
+            row["tool_tokens"] = ";".join(
+                f"{name}={tokens}" for name, tokens in record["tool_tokens"].items()
+            )
+            writer.writerow(row)
+        return out.getvalue()
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Records the token usage of each chat model call into a ledger"""
+
+    def __init__(self, ledger: UsageLedger):
+        self.ledger = ledger
+        self._pending = {}
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, metadata=None, **kwargs
+    ):
+        metadata = metadata or {}
+        context = tool_context(messages[0] if messages else [])
+        # Callers that inline tool output into a prompt report its size here
+        for name, tokens in metadata.get("tool_context", {}).items():
+            context[name] = context.get(name, 0) + tokens
+        self._pending[run_id] = {
+            "session_id": metadata.get("session_id"),
+            "thread_id": metadata.get("thread_id"),
+            "node": metadata.get("langgraph_node"),
+            "model": metadata.get("ls_model_name"),
+            "tier": metadata.get("model_tier"),
+            "turn_id": current_trace_id(),
+            "context": context,
+        }
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._pending.pop(run_id, None)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        pending = self._pending.pop(run_id, None)
+        if pending is None:
+            return
+
+        usage = None
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is not None and message.usage_metadata:
+                    usage = message.usage_metadata
+                    pending["model"] = (
+                        message.response_metadata.get("model_name") or pending["model"]
+                    )
+        if usage is None:
+            return
+
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        cached = usage.get("input_token_details", {}).get("cache_read", 0) or 0
+
+        # Scale the character-based estimates to the reported input tokens
+        context = pending.pop("context")
+        estimated_total = context.pop("_total") or 1
+        tool_tokens = {
+            name: round(tokens / estimated_total * input_tokens)
+            for name, tokens in context.items()
+        }
+
+        self.ledger.add(
+            {
+                **pending,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "input_tokens": input_tokens,
+                "cached_tokens": cached,
+                "output_tokens": output_tokens,
+                "cost_usd": estimate_cost(
+                    pending["model"], input_tokens, cached, output_tokens
+                ),
+                "tool_tokens": tool_tokens,
+            }
+        )
+
+
+usage_ledger = UsageLedger()
+usage_callback = UsageCallbackHandler(usage_ledger)
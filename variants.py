@@ -0,0 +1,404 @@
+"""
+Several drafts of one email in different styles, written concurrently.
+
+"A more formal version" or "a shorter one" used to send the whole request
+back through the ReAct agent, one variant at a time. Here the context is
+assembled once, either by crawling the URL in the message and searching the
+CV concurrently, or by reusing the crawl and CV results already in the
+conversation. One drafting call per variant then runs in parallel on that
+shared context, so four drafts take about as long as one.
+
+The variants are recorded in the agent's thread as a single answer, so a
+follow-up like "send me the second one with a P.S." still works.
+"""
+
+import contextvars
+import os
+import queue
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables.config import merge_configs
+from agent_graph import append_to_thread, thread_messages
+from crawler import URL_PATTERN, find_urls
+from model import is_email_draft
+from pipeline import CV_CONTEXT_K, cv_context, crawl_text, text_history
+from system_prompt import system_prompt
+from tracing import span
+from usage import approx_tokens
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DRAFT_VARIANTS_ENABLED = os.getenv("DRAFT_VARIANTS_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Styles drafted when a message asks for variants without naming any
+DRAFT_VARIANTS = [
+    style.strip()
+    for style in os.getenv("DRAFT_VARIANTS", "formal,concise,warm,research").split(",")
+    if style.strip()
+]
+# Most drafts written for one message
+DRAFT_VARIANTS_MAX = int(os.getenv("DRAFT_VARIANTS_MAX", "4"))
+
+# Style -> (label, instruction for the drafting call)
+VARIANT_STYLES = {
+    "formal": ("Formal", "Use a formal, respectful academic tone."),
+    "concise": (
+        "Concise",
+        "Keep the email under 150 words and make only the strongest points.",
+    ),
+    "warm": (
+        "Warm",
+        "Use a warm, personable tone while staying professional.",
+    ),
+    "research": (
+        "Research fit",
+        "Lead with the overlap between the user's research and the professor's "
+        "recent work and publications.",
+    ),
+    "experience": (
+        "Experience",
+        "Lead with the user's hands-on experience, projects and technical skills.",
+    ),
+    "detailed": (
+        "Detailed",
+        "Write a fuller email of 250 to 350 words covering research fit, "
+        "experience and a concrete next step.",
+    ),
+}
+
+# Words that pick a style when a message asks for variants
+_STYLE_KEYWORDS = {
+    "formal": r"formal|professional|polite",
+    "concise": r"short(er)?|concise|brief(er)?|succinct",
+    "warm": r"warm(er)?|friendl(y|ier)|casual|personal",
+    "research": r"research|publications?|papers?",
+    "experience": r"experience|skills|projects?|technical",
+    "detailed": r"long(er)?|detailed|elaborate",
+}
+
+_NUMBERS = {"two": 2, "three": 3, "four": 4, "five": 5, "six": 6}
+_COUNT = re.compile(
+    r"\b(\d|two|three|four|five|six)\s+(?:\w+\s+)?"
+    r"(?:variants?|versions?|drafts?|options|alternatives?|emails)\b",
+    re.IGNORECASE,
+)
+_STYLE_WORDS = "|".join(_STYLE_KEYWORDS.values())
+_VARIANT_CUE = re.compile(
+    rf"\b(variants?|versions?|alternatives?|rewrite|rephrase|redo|"
+    rf"(more|less)\s+({_STYLE_WORDS})|shorter|longer|warmer|friendlier)\b",
+    re.IGNORECASE,
+)
+_PLURAL_CUE = re.compile(r"\b(variants|versions|alternatives|drafts)\b", re.I)
+# The message is about an email ("a shorter version of the email")
+_EMAIL_CUE = re.compile(r"\b(e-?mails?|drafts?|subject lines?)\b", re.IGNORECASE)
+# Other documents are written by the agent, not as email variants
+_OTHER_DOCUMENT = re.compile(
+    r"\b(sop|statement|motivation letter|cover letter|essay|cv|resume|r[ée]sum[ée])\b",
+    re.IGNORECASE,
+)
+# Questions ("what version of ...", "which paper has more research impact")
+_QUESTION = re.compile(
+    r"^\W*(what|which|who|whom|whose|where|when|why|"
+    r"how\s+(many|much|do|does|did|is|are|can|could))\b",
+    re.IGNORECASE,
+)
+# "Version of PyTorch", "alternatives to this lab": not about a draft
+_NOT_A_DRAFT = re.compile(
+    r"\b(versions?|alternatives?|options?)\s+(of|to|for)\s+"
+    r"(?!(\w+\s+){0,2}(e-?mails?|drafts?|ones?)\b)",
+    re.IGNORECASE,
+)
+
+VARIANT_INSTRUCTIONS = """
+---
+The professor's website has already been crawled and the most relevant parts of
+the user's CV have already been retrieved; both are included in the request.
+Do not ask for them again.
+You are writing one of several alternative drafts. Write only this draft: a
+subject line, then the email. No commentary before or after it.
+"""
+
+
+def variant_request(message: str, after_draft: bool = False):
+    """Styles to draft if a message asks for variants of an email, otherwise
+    None.
+
+    Args:
+        message: The user's message
+        after_draft: Whether the previous answer was an email draft, so
+            "a shorter one" refers to it without naming the email
+    """
+    text = URL_PATTERN.sub(" ", message)
+    if (
+        not _VARIANT_CUE.search(text)
+        or _OTHER_DOCUMENT.search(text)
+        or _QUESTION.search(text)
+        or _NOT_A_DRAFT.search(text)
+    ):
+        return None
+    if not (_EMAIL_CUE.search(text) or after_draft):
+        return None
+
+    styles = [
+        style
+        for style, pattern in _STYLE_KEYWORDS.items()
+        if re.search(rf"\b({pattern})\b", text, re.IGNORECASE)
+    ]
+    count_match = _COUNT.search(text)
+    if count_match:
+        word = count_match.group(1).lower()
+        count = _NUMBERS.get(word) or int(word)
+    elif styles:
+        count = len(styles)
+    else:
+        # "Some alternatives" gets the default styles, "rewrite it" one draft
+        count = len(DRAFT_VARIANTS) if _PLURAL_CUE.search(text) else 1
+    count = max(1, min(count, DRAFT_VARIANTS_MAX))
+
+    # Fill up with the default styles, then with any other style
+    for style in DRAFT_VARIANTS + list(VARIANT_STYLES):
+        if len(styles) >= count:
+            break
+        if style in VARIANT_STYLES and style not in styles:
+            styles.append(style)
+    return styles[:count]
+
+
+def _thread_context(agent, config: dict):
+    """(url, website, CV context, last draft) of the latest crawl in the
+    agent's thread, or None if the thread has no crawl"""
+    if agent is None:
+        return None
+    messages = thread_messages(agent, config)
+    website = cv_text = draft = url = None
+    crawl_call_id = None
+    for message in reversed(messages):
+        if message.type == "ai" and message.content and not message.tool_calls:
+            draft = draft or message.content
+        elif message.type == "tool" and message.name == "kb_tool":
+            cv_text = cv_text or str(message.content)
+        elif message.type == "tool" and message.name == "crawl_website":
+            website, crawl_call_id = str(message.content), message.tool_call_id
+            break
+    if website is None:
+        return None
+
+    for message in messages:
+        for call in getattr(message, "tool_calls", None) or []:
+            if call["id"] == crawl_call_id:
+                url = call["args"].get("url")
+    return url, website, cv_text or "No CV context was retrieved.", draft
+
+
+class VariantTurn:
+    """One message's variants: context, concurrent drafts and their text.
+
+    Args:
+        drafter: The VariantDrafter that planned the turn
+        message: The user's message
+        styles: Style keys, one draft each
+        agent: Agent whose thread provides history and records the drafts
+        config: The agent's run config
+        context: (url, website, CV context, last draft) reused from the
+            thread, or None to crawl the URL in the message
+    """
+
+    def __init__(self, drafter, message, styles, agent, config, context=None):
+        self.drafter = drafter
+        self.message = message
+        self.styles = styles
+        self.agent = agent
+        self.config = config
+        self.context = context
+        self.drafts = ["" for _ in styles]
+
+    @property
+    def labels(self) -> list[str]:
+        return [VARIANT_STYLES[style][0] for style in self.styles]
+
+    def _assemble(self):
+        """Crawl and search the CV concurrently (only for a message with a URL)"""
+        if self.context is not None:
+            return self.context
+        url = find_urls(self.message)[0]
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            website = pool.submit(
+                contextvars.copy_context().run,
+                crawl_text,
+                self.drafter.firecrawl_api_key,
+                url,
+            )
+            cv_text = pool.submit(
+                contextvars.copy_context().run,
+                cv_context,
+                self.message,
+                self.drafter.k,
+                self.drafter.kb,
+            )
+            return url, website.result(), cv_text.result(), None
+
+    def _messages(self, style: str, history: list) -> list:
+        url, website, cv_text, draft = self.context
+        request = (
+            f"{self.message}\n\n"
+            f"## Professor's website ({url or 'crawled earlier'})\n\n{website}\n\n"
+            f"## Relevant parts of my CV\n\n{cv_text}"
+        )
+        if draft:
+            request += f"\n\n## Previous draft\n\n{draft}"
+        request += f"\n\n## Style of this draft\n\n{VARIANT_STYLES[style][1]}"
+        return [self.drafter.system_message] + history + [HumanMessage(content=request)]
+
+    def _draft(self, index: int, history: list, events: queue.Queue):
+        style = self.styles[index]
+        url, website, cv_text, _ = self.context
+        # Each draft carries the shared context; attribute it like the fast path
+        config = merge_configs(
+            self.config,
+            {
+                "metadata": {
+                    "variant": style,
+                    "tool_context": {
+                        "crawl_website": approx_tokens(website),
+                        "kb_tool": approx_tokens(cv_text),
+                    },
+                }
+            },
+        )
+        try:
+            messages = self._messages(style, history)
+            with span("llm.call", node="variant", style=style):
+                for chunk in self.drafter.llm.stream(messages, config):
+                    if chunk.content:
+                        events.put((index, chunk.content))
+        except Exception as e:
+            events.put((index, f"\n\n❌ Error: {str(e)}"))
+        finally:
+            events.put((index, None))
+
+    def stream(self):
+        """Draft all variants concurrently, yielding (variant index, text)
+        pieces as they arrive"""
+        with span("pipeline.variants", variants=len(self.styles)):
+            fresh = self.context is None
+            self.context = self._assemble()
+            history = text_history(self.agent, self.config)
+
+            events = queue.Queue()
+            with ThreadPoolExecutor(
+                max_workers=len(self.styles), thread_name_prefix="draft-variant"
+            ) as pool:
+                for index in range(len(self.styles)):
+                    pool.submit(
+                        contextvars.copy_context().run,
+                        self._draft,
+                        index,
+                        history,
+                        events,
+                    )
+                running = len(self.styles)
+                while running:
+                    index, text = events.get()
+                    if text is None:
+                        running -= 1
+                        continue
+                    self.drafts[index] += text
+                    yield index, text
+
+        if self.agent is not None:
+            self._record(fresh)
+
+    def text(self) -> str:
+        """All drafts as one markdown answer"""
+        return "\n\n---\n\n".join(
+            f"### {number}. {label}\n\n{draft.strip()}"
+            for number, (label, draft) in enumerate(
+                zip(self.labels, self.drafts), start=1
+            )
+        )
+
+    def _record(self, fresh: bool):
+        messages = [HumanMessage(content=self.message)]
+        if fresh:
+            # Record the crawl and CV search so later turns can reuse them
+            url, website, cv_text, _ = self.context
+            crawl_id = f"call_{uuid.uuid4().hex[:12]}"
+            kb_id = f"call_{uuid.uuid4().hex[:12]}"
+            messages += [
+                AIMessage(
+                    content="",
+                    tool_calls=[
+                        {"name": "crawl_website", "args": {"url": url}, "id": crawl_id},
+                        {
+                            "name": "kb_tool",
+                            "args": {"query": self.message},
+                            "id": kb_id,
+                        },
+                    ],
+                ),
+                ToolMessage(
+                    content=website, name="crawl_website", tool_call_id=crawl_id
+                ),
+                ToolMessage(content=cv_text, name="kb_tool", tool_call_id=kb_id),
+            ]
+        messages.append(AIMessage(content=self.text()))
+        append_to_thread(self.agent, self.config, messages)
+
+
+class VariantDrafter:
+    """Plans and writes email variants from a shared context.
+
+    Args:
+        llm: Chat model used for the drafting calls
+        firecrawl_api_key: Firecrawl API key for messages with a new URL
+        prompt: System prompt the drafting calls run with
+        k: Number of CV chunks retrieved as context
+        kb: Knowledge base holding the CV (the CLI's by default)
+    """
+
+    def __init__(
+        self,
+        llm,
+        firecrawl_api_key: str,
+        prompt: str = system_prompt,
+        k: int = CV_CONTEXT_K,
+        kb=None,
+    ):
+        self.llm = llm
+        self.firecrawl_api_key = firecrawl_api_key
+        self.system_message = SystemMessage(content=prompt + VARIANT_INSTRUCTIONS)
+        self.k = k
+        self.kb = kb
+
+    def plan(self, message: str, agent, config: dict):
+        """A VariantTurn if the message asks for email variants and their
+        context is available, otherwise None (the agent handles it)"""
+        urls = find_urls(message)
+        if len(urls) == 1 and self.firecrawl_api_key:
+            # A new site: the message itself has to ask for emails
+            styles = variant_request(message)
+            return VariantTurn(self, message, styles, agent, config) if styles else None
+        if urls:
+            return None
+        context = _thread_context(agent, config)
+        if context is None:
+            return None
+        styles = variant_request(
+            message, after_draft=is_email_draft(str(context[3] or ""))
+        )
+        if not styles:
+            return None
+        return VariantTurn(self, message, styles, agent, config, context)
+
+
+def build_variant_drafter(llm, firecrawl_api_key: str, kb=None):
+    """Return the variant drafter, or None when it is disabled"""
+    if not DRAFT_VARIANTS_ENABLED:
+        return None
+    return VariantDrafter(llm, firecrawl_api_key, kb=kb)
@@ -0,0 +1,494 @@
+"""
+Compact in-memory vector store for the CV knowledge base.
+
+LangChain's InMemoryVectorStore keeps every embedding as a Python list of
+floats. Each of those floats is a full object, so a vector takes about ten
+times the space of its raw numbers. QuantizedVectorStore keeps all vectors
+in one contiguous numpy array instead. The array is float32, float16, or
+int8 with a float32 scale per vector. Vectors are L2-normalised on insert,
+so a dot product is the cosine similarity.
+
+Pick the precision per deployment with VECTOR_STORE_DTYPE. Large knowledge
+bases (ANN_MIN_CHUNKS vectors and up) are searched through an IVF index
+instead of scoring every vector. To see the recall either one costs, run
+``python -m bench.recall``.
+"""
+
+import os
+import uuid
+from typing import Any, Iterable, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Storage precision of the knowledge base vectors: float32, float16 or int8
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32").lower()
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# Approximate search switches on once the store holds this many vectors
+ANN_MIN_CHUNKS = int(os.getenv("ANN_MIN_CHUNKS", "20000"))
+# Index lists; 0 picks about 2 * sqrt(number of vectors)
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))
+# Lists scanned per query: the recall/speed knob
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+# k-means iterations and rows sampled per list when training the index
+ANN_TRAIN_ITERATIONS = 10
+ANN_TRAIN_SAMPLES_PER_LIST = 32
+
+# Rows widened at a time when scoring float16 or int8 vectors
+_SCORE_BLOCK_ROWS = 4096
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_int8(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Quantize rows to int8 with one scale per row (``row ≈ q * scale``)"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.rint(vectors / scales[:, None]).clip(-127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+class IVFIndex:
+    """Inverted-file index over normalised vectors.
+
+    Spherical k-means splits the vectors into ``nlist`` lists. A query only
+    scans the lists whose centroids are closest to it. New vectors go into
+    the list of their nearest centroid, without retraining.
+
+    Args:
+        nlist: Number of lists (0 picks about 2 * sqrt(size) at training)
+        nprobe: Default number of lists scanned per query
+        seed: Seed for the k-means initialisation
+    """
+
+    def __init__(self, nlist: int = 0, nprobe: int = ANN_NPROBE, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids = None
+        self.trained_size = 0
+        self.size = 0
+        self._lists: list[list[int]] = []
+        self._arrays: dict[int, np.ndarray] = {}
+
+    def train(self, vectors: np.ndarray):
+        """Fit the centroids on (a sample of) ``vectors``"""
+        nlist = self.nlist or int(2 * np.sqrt(len(vectors)))
+        nlist = max(1, min(nlist, len(vectors)))
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(vectors), nlist * ANN_TRAIN_SAMPLES_PER_LIST)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(ANN_TRAIN_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            # Sum the members of each list (sorted by list, summed per run)
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=nlist)
+            filled = counts > 0
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+            # Lists that received no vectors keep their old centroid
+            sums = centroids.copy()
+            sums[filled] = np.add.reduceat(sample[order], starts, axis=0)
+            centroids = _normalize(sums)
+
+        self.centroids = centroids
+        self.trained_size = len(vectors)
+        self.size = 0
+        self._lists = [[] for _ in range(nlist)]
+        self._arrays = {}
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        """Add store rows ``rows`` (holding ``vectors``) to their lists"""
+        labels = np.argmax(vectors @ self.centroids.T, axis=1)
+        for row, label in zip(rows.tolist(), labels.tolist()):
+            self._lists[label].append(row)
+            self._arrays.pop(label, None)
+        self.size += len(rows)
+
+    def candidates(self, query: list[float], nprobe: Optional[int] = None):
+        """Sorted store rows in the lists closest to ``query``"""
+        nprobe = min(nprobe or self.nprobe, len(self._lists))
+        closest = self.centroids @ np.asarray(query, dtype=np.float32)
+        probed = np.argpartition(-closest, nprobe - 1)[:nprobe]
+        arrays = []
+        for label in probed.tolist():
+            if label not in self._arrays:
+                self._arrays[label] = np.asarray(self._lists[label], dtype=np.intp)
+            arrays.append(self._arrays[label])
+        return np.sort(np.concatenate(arrays))
+
+
+class QuantizedVectorStore(VectorStore):
+    """Vector store with contiguous float32, float16 or int8 embeddings.
+
+    Above ``ann_min_chunks`` vectors, searches go through an IVF index and
+    only score the vectors in the ``ann_nprobe`` closest lists.
+
+    Args:
+        embedding: Engine used to embed documents and queries
+        dtype: Storage precision, one of "float32", "float16" or "int8"
+        ann_min_chunks: Store size at which the ANN index switches on
+        ann_nlist: Number of index lists (0 picks about 2 * sqrt(size))
+        ann_nprobe: Lists scanned per query; higher is slower but more exact
+        backend: Id of the embedding backend the vectors come from (see
+            model.engine_backend_id); vectors tagged with another backend
+            are refused
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        dtype: str = VECTOR_STORE_DTYPE,
+        ann_min_chunks: int = ANN_MIN_CHUNKS,
+        ann_nlist: int = ANN_NLIST,
+        ann_nprobe: int = ANN_NPROBE,
+        backend: Optional[str] = None,
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(
+                f"Unknown vector dtype {dtype!r}; use one of {', '.join(DTYPES)}"
+            )
+        self.embedding = embedding
+        self.dtype = dtype
+        self.backend = backend
+        self._vectors = None  # (capacity, dimension), first _size rows in use
+        self._scales = None  # int8 only: per-row scale
+        self._size = 0
+        self._documents: list[Document] = []
+        self._ids: list[str] = []
+        self.ann_min_chunks = ann_min_chunks
+        self.ann_nlist = ann_nlist
+        self.ann_nprobe = ann_nprobe
+        self._index = None
+
+    def __getstate__(self):
+        # Engines hold API clients; a restored store gets its engine back
+        # from the caller (see tools.CVKnowledgeBase.restore_engine)
+        state = self.__dict__.copy()
+        state["embedding"] = None
+        return state
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def documents(self) -> list[Document]:
+        """The stored documents, in row order"""
+        return list(self._documents)
+
+    @property
+    def ann_index(self) -> Optional["IVFIndex"]:
+        """The ANN index, or None while the store is searched exhaustively"""
+        return self._index
+
+    def memory_bytes(self) -> int:
+        """Bytes used by the stored vectors (and their int8 scales)"""
+        if self._vectors is None:
+            return 0
+        row_bytes = self._vectors.itemsize * self._vectors.shape[1]
+        scale_bytes = self._scales.itemsize if self._scales is not None else 0
+        return self._size * (row_bytes + scale_bytes)
+
+    def _reserve(self, rows: int, dimension: int):
+        """Grow the arrays (by doubling) so ``rows`` more vectors fit"""
+        if self._vectors is None:
+            capacity = max(rows, 16)
+            self._vectors = np.empty((capacity, dimension), dtype=DTYPES[self.dtype])
+            if self.dtype == "int8":
+                self._scales = np.empty(capacity, dtype=np.float32)
+            return
+
+        if dimension != self._vectors.shape[1]:
+            raise ValueError(
+                f"Embedding dimension {dimension} does not match the store's "
+                f"{self._vectors.shape[1]}"
+            )
+        needed = self._size + rows
+        if needed <= len(self._vectors):
+            return
+        capacity = max(needed, 2 * len(self._vectors))
+        vectors = np.empty((capacity, dimension), dtype=self._vectors.dtype)
+        vectors[: self._size] = self._vectors[: self._size]
+        self._vectors = vectors
+        if self._scales is not None:
+            scales = np.empty(capacity, dtype=np.float32)
+            scales[: self._size] = self._scales[: self._size]
+            self._scales = scales
+
+    def add_embeddings(
+        self,
+        embeddings: list[list[float]],
+        documents: list[Document],
+        ids: Optional[list[str]] = None,
+        backend: Optional[str] = None,
+    ) -> list[str]:
+        """Store precomputed embeddings for ``documents``.
+
+        Args:
+            embeddings: One vector per document
+            documents: The documents the vectors belong to
+            ids: Document ids (random ones by default)
+            backend: Embedding backend the vectors come from; must match the
+                store's when both are known
+        """
+        if backend and self.backend and backend != self.backend:
+            raise ValueError(
+                f"Vectors from embedding backend {backend!r} cannot be added to "
+                f"an index built with {self.backend!r}"
+            )
+        if not documents:
+            return []
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in documents]
+
+        self._reserve(len(documents), vectors.shape[1])
+        rows = slice(self._size, self._size + len(documents))
+        if self.dtype == "int8":
+            self._vectors[rows], self._scales[rows] = quantize_int8(vectors)
+        else:
+            self._vectors[rows] = vectors
+        self._size += len(documents)
+
+        for doc_id, document in zip(ids, documents):
+            self._documents.append(
+                Document(
+                    id=doc_id,
+                    page_content=document.page_content,
+                    metadata=document.metadata,
+                )
+            )
+            self._ids.append(doc_id)
+        self._update_index()
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[list[dict]] = None,
+        *,
+        ids: Optional[list[str]] = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        documents = [
+            Document(page_content=text, metadata=metadata)
+            for text, metadata in zip(texts, metadatas)
+        ]
+        embeddings = self.embedding.embed_documents(texts)
+        # Tagged with the engine that embedded them, not the store's own tag
+        backend = getattr(self.embedding, "backend_id", None)
+        return self.add_embeddings(embeddings, documents, ids, backend)
+
+    def add_documents(self, documents: list[Document], **kwargs: Any) -> list[str]:
+        ids = kwargs.pop("ids", None) or [doc.id for doc in documents]
+        return self.add_texts(
+            [doc.page_content for doc in documents],
+            [doc.metadata for doc in documents],
+            ids=ids if all(ids) else None,
+        )
+
+    def delete(self, ids: Optional[list[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return None
+        removed = set(ids)
+        keep = [i for i, doc_id in enumerate(self._ids) if doc_id not in removed]
+        if len(keep) == self._size:
+            return False
+
+        self._vectors[: len(keep)] = self._vectors[keep]
+        if self._scales is not None:
+            self._scales[: len(keep)] = self._scales[keep]
+        self._documents = [self._documents[i] for i in keep]
+        self._ids = [self._ids[i] for i in keep]
+        self._size = len(keep)
+        # Row numbers shifted, so the index is rebuilt from scratch
+        self._index = None
+        self._update_index()
+        return True
+
+    def get_by_ids(self, ids: list[str], /) -> list[Document]:
+        positions = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        return [self._documents[positions[i]] for i in ids if i in positions]
+
+    def _dequantize(self, rows) -> np.ndarray:
+        """Stored vectors at ``rows`` as float32"""
+        vectors = self._vectors[rows].astype(np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    def _score(self, vectors: np.ndarray, scales, query: np.ndarray) -> np.ndarray:
+        """Dot products of a normalised float32 query with stored rows"""
+        if self.dtype == "float32":
+            return vectors @ query
+
+        # Widen one block at a time to bound the temporary copy
+        blocks = range(0, len(vectors), _SCORE_BLOCK_ROWS)
+        if self.dtype == "float16":
+            return np.concatenate(
+                [
+                    vectors[start : start + _SCORE_BLOCK_ROWS].astype(np.float32)
+                    @ query
+                    for start in blocks
+                ]
+            )
+
+        # int8: integer dot products (exact in int32), rescaled afterwards
+        [query_q], [query_scale] = quantize_int8(query[None, :])
+        query_q = query_q.astype(np.int32)
+        raw = np.concatenate(
+            [
+                vectors[start : start + _SCORE_BLOCK_ROWS].astype(np.int32) @ query_q
+                for start in blocks
+            ]
+        )
+        return raw * scales * query_scale
+
+    def scores(self, query_vector: list[float]) -> np.ndarray:
+        """Cosine similarity of the query to every stored vector"""
+        if self._size == 0:
+            return np.empty(0, dtype=np.float32)
+        query = _normalize(np.asarray([query_vector], dtype=np.float32))[0]
+        scales = self._scales[: self._size] if self._scales is not None else None
+        return self._score(self._vectors[: self._size], scales, query)
+
+    def score_matrix(self, query_vectors) -> np.ndarray:
+        """Cosine similarity of each query (row) to every stored vector, in one
+        batched product"""
+        queries = _normalize(np.atleast_2d(np.asarray(query_vectors, np.float32)))
+        if self._size == 0:
+            return np.empty((len(queries), 0), dtype=np.float32)
+        blocks = []
+        for start in range(0, self._size, _SCORE_BLOCK_ROWS):
+            stop = min(start + _SCORE_BLOCK_ROWS, self._size)
+            block = self._vectors[start:stop].astype(np.float32)
+            if self._scales is not None:
+                block *= self._scales[start:stop, None]
+            blocks.append(block @ queries.T)
+        return np.concatenate(blocks).T
+
+    def _update_index(self):
+        """Build, extend or retrain the ANN index as the store grows"""
+        if self._size < self.ann_min_chunks:
+            self._index = None
+            return
+        if self._index is None or self._size >= 2 * self._index.trained_size:
+            self._index = IVFIndex(nlist=self.ann_nlist, nprobe=self.ann_nprobe)
+            self._index.train(self._dequantize(slice(0, self._size)))
+        if self._index.size < self._size:
+            rows = np.arange(self._index.size, self._size)
+            self._index.add(rows, self._dequantize(rows))
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        nprobe: Optional[int] = None,
+        exact: bool = False,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> list[tuple[Document, float]]:
+        """Top ``k`` documents by cosine similarity.
+
+        Args:
+            embedding: Query vector
+            k: Number of results
+            nprobe: Index lists to scan (overrides ANN_NPROBE)
+            exact: Score every vector even when the ANN index is active
+            filter: Only return documents whose metadata has these values
+        """
+        allowed = self._matching_rows(filter) if filter else None
+        available = self._size if allowed is None else len(allowed)
+        if available == 0:
+            return []
+        k = min(k, available)
+
+        rows = None
+        if self._index is not None and not exact:
+            rows = self._index.candidates(embedding, nprobe)
+            if allowed is not None:
+                rows = np.intersect1d(rows, allowed, assume_unique=True)
+            # Too few candidates to fill k results: fall back to a full scan
+            if len(rows) < k:
+                rows = None
+        if rows is None and allowed is not None:
+            rows = allowed
+
+        if rows is None:
+            scores = self.scores(embedding)
+        else:
+            query = _normalize(np.asarray([embedding], dtype=np.float32))[0]
+            scales = self._scales[rows] if self._scales is not None else None
+            scores = self._score(self._vectors[rows], scales, query)
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        positions = top if rows is None else rows[top]
+        return [
+            (self._documents[i], float(score))
+            for i, score in zip(positions, scores[top])
+        ]
+
+    def _matching_rows(self, filter: dict) -> np.ndarray:
+        """Positions of the documents whose metadata matches ``filter``"""
+        return np.fromiter(
+            (
+                i
+                for i, doc in enumerate(self._documents)
+                if all(doc.metadata.get(key) == value for key, value in filter.items())
+            ),
+            dtype=np.int64,
+        )
+
+    def similarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score_by_vector(
+                embedding, k, **kwargs
+            )
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self.embedding.embed_query(query), k, **kwargs
+        )
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: Optional[list[dict]] = None,
+        *,
+        ids: Optional[list[str]] = None,
+        dtype: str = VECTOR_STORE_DTYPE,
+        **kwargs: Any,
+    ) -> "QuantizedVectorStore":
+        store = cls(embedding, dtype=dtype, backend=kwargs.get("backend"))
+        store.add_texts(texts, metadatas, ids=ids)
+        return store